@@ -1,8 +1,13 @@
+import time
+
+# Timed from the very top so the readout covers the whole rerun
+run_started = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
-from anthropic import Anthropic
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from src.metrics import start_trace
 
 # Load our secret API key
 load_dotenv()
@@ -10,6 +15,156 @@ load_dotenv()
 # Set up the page
 st.set_page_config(page_title="Holiday Pricing Optimizer", page_icon="🏠")
 
+# ============================================
+# CACHING AND TIMING
+# ============================================
+# Streamlit reruns this whole script on every interaction. The competitor
+# data, its index and the Claude client live in module-level caches in
+# src/, which survive reruns; heavy libraries (anthropic, plotly) are only
+# imported when a feature needs them.
+
+timings = {}
+
+# Stage timings from src/ (data load, filtering, stats, chart, Claude) for the debug panel
+trace = start_trace()
+
+@contextmanager
+def timed(label):
+    """
+    Record how long a block takes for the timing readout
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[label] = (time.perf_counter() - started) * 1000
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_competitor_summary(data_version):
+    """
+    Overview of the competitor data, worked out once per version of the data
+    """
+    from src.data_handler import get_competitor_source
+    
+    df = get_competitor_source().read()
+    return {
+        'rows': len(df),
+        'avg_price': df['nightly_rate'].mean(),
+        'locations': df['location'].nunique(),
+        'preview': df.head(20)
+    }
+
+def price_distribution_chart(summary, price, title, colour):
+    """
+    Histogram of the whole competitor segment with a box plot and
+    representative listings underneath, and a line at your price
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25], vertical_spacing=0.04)
+    
+    histogram = summary['histogram']
+    fig.add_trace(go.Bar(
+        x=(histogram['bin_start'] + histogram['bin_end']) / 2,
+        y=histogram['count'],
+        width=histogram['bin_end'] - histogram['bin_start'],
+        customdata=histogram[['bin_start', 'bin_end']],
+        hovertemplate="£%{customdata[0]:.0f} - £%{customdata[1]:.0f}: %{y} listings<extra></extra>",
+        marker_color='#4ECDC4',
+        name='Competitors'
+    ), row=1, col=1)
+    
+    box = summary['box']
+    fig.add_trace(go.Box(
+        y=['Market'], q1=[box['q1']], median=[box['median']], q3=[box['q3']],
+        lowerfence=[box['lower_whisker']], upperfence=[box['upper_whisker']],
+        orientation='h', marker_color='#4ECDC4', name='Middle 50%', showlegend=False
+    ), row=2, col=1)
+    
+    competitors = summary['points'][summary['points']['Type'] == 'Competitor']
+    fig.add_trace(go.Scatter(
+        x=competitors['Price'], y=['Market'] * len(competitors),
+        mode='markers', marker=dict(color='#2A9D8F', size=8),
+        text=competitors['Property'] + ' - ' + competitors['Details'],
+        hovertemplate="%{text}: £%{x:.2f}<extra></extra>",
+        name='Typical listings'
+    ), row=2, col=1)
+    
+    fig.add_vline(x=price, line_color=colour, line_width=3, annotation_text=f"You: £{price:.0f}")
+    
+    fig.update_layout(
+        title=title,
+        showlegend=True,
+        height=450,
+        bargap=0.05
+    )
+    fig.update_yaxes(title_text="Listings", row=1, col=1)
+    fig.update_xaxes(title_text="Nightly Rate (£)", row=2, col=1)
+    
+    return fig
+
+def calendar_chart(chart_data, colour):
+    """
+    A year of recommended nightly prices against the market rate
+    """
+    import plotly.graph_objects as go
+    
+    fig = go.Figure()
+    for kind, line in [('Market Rate', dict(color='#4ECDC4', dash='dot')), ('Recommended', dict(color=colour))]:
+        rows = chart_data[chart_data['Type'] == kind]
+        fig.add_trace(go.Scatter(
+            x=rows['Date'], y=rows['Price'], text=rows['Details'],
+            mode='lines', line=line, name=kind,
+            hovertemplate="%{x|%a %d %b}: £%{y:.0f} (%{text})<extra></extra>"
+        ))
+    
+    fig.update_layout(
+        title='Nightly Prices for the Year Ahead',
+        showlegend=True,
+        height=400,
+        yaxis_title="Nightly Rate (£)"
+    )
+    
+    return fig
+
+def chart_caption(summary):
+    """
+    Caption saying how many listings the chart covers
+    """
+    if summary['summarised'] < summary['rows']:
+        return f"All {summary['rows']:,} competitor listings (estimated from a sample of {summary['summarised']:,})"
+    return f"All {summary['rows']:,} competitor listings"
+
+POSITIONING_EMOJI = {
+    'budget': '🟢',
+    'mid-range': '🟡',
+    'premium': '🔵'
+}
+
+def show_partial_insights(insights):
+    """
+    What Claude has said so far, while the rest of the reply streams in
+    """
+    if 'recommended_price' not in insights and 'positioning' not in insights:
+        st.info("🤖 Claude is analyzing your property...")
+        return
+    
+    col1, col2 = st.columns(2)
+    if 'recommended_price' in insights:
+        col1.metric("🎯 AI Recommended Price", f"£{insights['recommended_price']:.2f}")
+    if 'positioning' in insights:
+        positioning_emoji = POSITIONING_EMOJI.get(insights['positioning'].lower(), '⚪')
+        col2.metric("📍 Market Positioning", f"{positioning_emoji} {insights['positioning'].title()}")
+    
+    if 'reasoning' in insights:
+        st.write("### 💡 Strategic Reasoning")
+        st.write(insights['reasoning'])
+    if 'tips' in insights:
+        st.write("### 🚀 Revenue Optimization Tips")
+        for i, tip in enumerate(insights['tips'], 1):
+            st.write(f"{i}. {tip}")
+
 st.title("🏠 Holiday Let Pricing Optimizer")
 st.write("**AI-powered dynamic pricing for short-term rentals**")
 st.write("---")
@@ -17,18 +172,24 @@ st.write("---")
 # Test 1: Can we load the data?
 st.subheader("📊 Test 1: Load Competitor Data")
 try:
-    df = pd.read_csv('data/competitors.csv')
-    st.success(f"✅ Successfully loaded {len(df)} competitor properties!")
+    with timed("Load data"):
+        from src.data_handler import get_competitor_source
+        
+        # The version is the data file's content hash, so the summary is
+        # only recomputed when the file changes
+        summary = load_competitor_summary(get_competitor_source().version)
+    
+    st.success(f"✅ Successfully loaded {summary['rows']} competitor properties!")
     
     with st.expander("👀 Click to see the data"):
-        st.dataframe(df.head(20))
+        st.dataframe(summary['preview'])
         
         # Show some quick stats
         st.write("**Quick Statistics:**")
         col1, col2, col3 = st.columns(3)
-        col1.metric("Total Properties", len(df))
-        col2.metric("Avg Price", f"£{df['nightly_rate'].mean():.2f}")
-        col3.metric("Locations", df['location'].nunique())
+        col1.metric("Total Properties", summary['rows'])
+        col2.metric("Avg Price", f"£{summary['avg_price']:.2f}")
+        col3.metric("Locations", summary['locations'])
         
 except FileNotFoundError:
     st.error("⚠️ Data file not found! Did you run create_sample_data.py?")
@@ -44,9 +205,11 @@ if st.button("Test Claude API Connection"):
             st.error("❌ No API key found! Check your .env file")
         else:
             with st.spinner("Connecting to Claude..."):
-                client = Anthropic(api_key=api_key)
+                from src.llm_analyzer import get_client, MODEL
+                
+                client = get_client(api_key)
                 message = client.messages.create(
-                    model="claude-sonnet-4-20250514",
+                    model=MODEL,
                     max_tokens=100,
                     messages=[
                         {"role": "user", "content": "Say 'API connection successful! I'm ready to help with pricing analysis.' if you can read this."}
@@ -117,7 +280,16 @@ if analyze_button:
     # Import our pricing engine
     from src.pricing_engine import get_competitor_data, calculate_price_stats, generate_base_recommendation
     
-    with st.spinner("Analyzing competitor data..."):
+    property_details = {
+        'location': location,
+        'property_type': property_type,
+        'bedrooms': bedrooms,
+        'has_parking': has_parking,
+        'has_wifi': has_wifi,
+        'pet_friendly': pet_friendly
+    }
+    
+    with st.spinner("Analyzing competitor data..."), timed("Pricing analysis"):
         # Get competitor data
         exact_matches, similar = get_competitor_data(location, property_type, bedrooms)
         
@@ -161,10 +333,9 @@ if analyze_button:
             # Add price comparison chart
             st.write("### 📊 Price Comparison")
             
-            from src.pricing_engine import prepare_chart_data
-            import plotly.express as px
+            from src.pricing_engine import prepare_chart_summary
             
-            chart_df = prepare_chart_data(
+            chart_summary = prepare_chart_summary(
                 exact_matches, 
                 similar, 
                 recommendation['price'],
@@ -175,40 +346,15 @@ if analyze_button:
                 }
             )
             
-            if len(chart_df) > 0:
-                # Create color mapping
-                colors = ['#FF6B6B' if t == 'Your Property' else '#4ECDC4' 
-                         for t in chart_df['Type']]
-                
-                fig = px.bar(
-                    chart_df,
-                    x='Property',
-                    y='Price',
-                    color='Type',
-                    color_discrete_map={
-                        'Your Property': '#FF6B6B',
-                        'Competitor': '#4ECDC4'
-                    },
-                    title='Your Price vs. Competitors',
-                    labels={'Price': 'Nightly Rate (£)'},
-                    hover_data=['Details']
-                )
-                
-                fig.update_layout(
-                    xaxis_title="",
-                    yaxis_title="Nightly Rate (£)",
-                    showlegend=True,
-                    height=400,
-                    hovermode='x unified'
+            if chart_summary['rows'] > 0:
+                fig = price_distribution_chart(
+                    chart_summary, recommendation['price'], 'Your Price vs. Competitors', '#FF6B6B'
                 )
-                
-                # Rotate x-axis labels for readability
-                fig.update_xaxes(tickangle=-45)
-                
                 st.plotly_chart(fig, use_container_width=True)
+                st.caption(chart_caption(chart_summary))
                 
                 # Add insight below chart
-                avg_competitor = chart_df[chart_df['Type'] == 'Competitor']['Price'].mean()
+                avg_competitor = stats['exact_avg'] if stats['exact_count'] > 0 else stats['similar_avg']
                 difference = recommendation['price'] - avg_competitor
                 
                 if difference > 0:
@@ -218,6 +364,52 @@ if analyze_button:
                 else:
                     st.info(f"💡 Your price matches the average competitor price - middle market positioning.")
             
+            # Year-ahead calendar - the base price adjusted night by night
+            st.write("### 📅 Year-Ahead Price Calendar")
+            
+            import pandas as pd
+            from src.calendar_pricing import (DEFAULT_ELASTICITY, DEFAULT_OCCUPANCY, get_calendar_model,
+                                              prepare_calendar_chart_data, price_calendar)
+            
+            calendar_model = get_calendar_model()
+            if not calendar_model.learned:
+                # Every night would just be the base price
+                st.info("📅 The competitor data has no `date` or `month` column, so there are no seasonal, "
+                        "weekday or event prices to learn - the recommended price above applies all year.")
+            else:
+                with timed("Price calendar"):
+                    calendar = price_calendar(
+                        pd.DataFrame([{'location': location, 'property_type': property_type, 'bedrooms': bedrooms}]),
+                        prices=[recommendation['price']],
+                        model=calendar_model
+                    )
+                calendar_summary = calendar['summary'].iloc[0]
+                assumed = (f"an assumed demand curve - {DEFAULT_OCCUPANCY:.0%} occupancy at the market rate, "
+                           f"elasticity {DEFAULT_ELASTICITY}")
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric(
+                    "📆 Average Nightly Price",
+                    f"£{calendar_summary['avg_price']:.2f}",
+                    help=f"Market rates follow the {', '.join(calendar_model.learned)} pattern in competitor "
+                         f"prices; each night's price is then picked against {assumed}"
+                )
+                col2.metric(
+                    "🛏️ Expected Occupancy (illustrative)",
+                    f"{calendar_summary['occupancy']:.0%}",
+                    help=f"From {assumed}, not your bookings"
+                )
+                col3.metric(
+                    "💰 Expected Revenue (illustrative)",
+                    f"£{calendar_summary['revenue']:,.0f}",
+                    delta=f"{calendar_summary['uplift']:+.1%} vs base price every night",
+                    help=f"Over the next 365 nights, from {assumed}, not your bookings"
+                )
+                st.plotly_chart(calendar_chart(prepare_calendar_chart_data(calendar), '#FF6B6B'),
+                                use_container_width=True)
+                st.caption(f"⚠️ Occupancy and revenue are illustrative: they use {assumed}. "
+                           "Use your own booking curves with `python3 -m src.calendar_pricing --curves`.")
+            
             # Show competitor details
             if stats['exact_count'] > 0:
                 st.write("**Exact matches found:**")
@@ -231,24 +423,56 @@ if analyze_button:
                 st.dataframe(similar[['location', 'property_type', 'bedrooms', 'nightly_rate']].head(10))
                 
                 st.write(f"**Price range:** £{stats['similar_min']:.2f} - £{stats['similar_max']:.2f}")
+            
+            # The listings most like this one, amenities included
+            from src.pricing_engine import get_comparable_competitors
+            
+            with timed("Comparable listings"):
+                comparables, _ = get_comparable_competitors(property_details)
+            
+            if len(comparables) > 0:
+                st.write("### 🎯 Most Comparable Listings")
+                comparable_avg = comparables['nightly_rate'].mean()
+                st.metric(
+                    "🏡 Comparable Average",
+                    f"£{comparable_avg:.2f}",
+                    delta=f"£{comparable_avg - recommendation['price']:.2f} vs base price",
+                    help=f"Average of the {len(comparables)} listings nearest yours on bedrooms, type and amenities"
+                )
+                st.dataframe(comparables[['property_type', 'bedrooms', 'has_parking', 'has_wifi', 'pet_friendly',
+                                          'nightly_rate', 'distance']])
         
         with tab2:
             # Get AI insights
-            from src.llm_analyzer import get_ai_pricing_insights
+            from src.llm_analyzer import AI_STREAM, get_ai_pricing_insights, stream_ai_pricing_insights
             
-            with st.spinner("🤖 Claude is analyzing your property..."):
-                property_details = {
-                    'location': location,
-                    'property_type': property_type,
-                    'bedrooms': bedrooms,
-                    'has_parking': has_parking,
-                    'has_wifi': has_wifi,
-                    'pet_friendly': pet_friendly
-                }
-                
-                ai_insights = get_ai_pricing_insights(property_details, stats, recommendation)
+            if AI_STREAM:
+                # Show the price and positioning as soon as Claude has written them
+                live = st.empty()
+                live.info("🤖 Claude is analyzing your property...")
+                ai_insights = None
+                with timed("AI insights"):
+                    started = time.perf_counter()
+                    for ai_insights in stream_ai_pricing_insights(property_details, stats, recommendation):
+                        if 'AI first field' not in timings and not ai_insights.get('fallback'):
+                            timings["AI first field"] = (time.perf_counter() - started) * 1000
+                        with live.container():
+                            show_partial_insights(ai_insights)
+                live.empty()
+            else:
+                with st.spinner("🤖 Claude is analyzing your property..."), timed("AI insights"):
+                    ai_insights = get_ai_pricing_insights(property_details, stats, recommendation)
             
-            if ai_insights:
+            if ai_insights and ai_insights.get('fallback'):
+                # Claude couldn't answer in time - fall back to the basic recommendation
+                st.warning(f"⏱️ {ai_insights['reasoning']}")
+                st.metric(
+                    "💰 Recommended Price",
+                    f"£{ai_insights['recommended_price']:.2f}",
+                    help="From the Basic Analysis - try again shortly for Claude's view"
+                )
+            
+            elif ai_insights:
                 # Display AI recommendation
                 st.success("✨ AI Analysis Complete!")
                 
@@ -264,12 +488,7 @@ if analyze_button:
                 
                 with col2:
                     # Positioning with color
-                    positioning_colors = {
-                        'budget': '🟢',
-                        'mid-range': '🟡',
-                        'premium': '🔵'
-                    }
-                    positioning_emoji = positioning_colors.get(ai_insights['positioning'].lower(), '⚪')
+                    positioning_emoji = POSITIONING_EMOJI.get(ai_insights['positioning'].lower(), '⚪')
                     
                     st.metric(
                         "📍 Market Positioning",
@@ -280,10 +499,9 @@ if analyze_button:
                 # Add price comparison chart for AI recommendation
                 st.write("### 📊 AI-Enhanced Price Positioning")
                 
-                from src.pricing_engine import prepare_chart_data
-                import plotly.express as px
+                from src.pricing_engine import prepare_chart_summary
                 
-                chart_df = prepare_chart_data(
+                chart_summary = prepare_chart_summary(
                     exact_matches, 
                     similar, 
                     ai_insights['recommended_price'],
@@ -294,31 +512,12 @@ if analyze_button:
                     }
                 )
                 
-                if len(chart_df) > 0:
-                    fig = px.bar(
-                        chart_df,
-                        x='Property',
-                        y='Price',
-                        color='Type',
-                        color_discrete_map={
-                            'Your Property': '#9D4EDD',
-                            'Competitor': '#4ECDC4'
-                        },
-                        title='AI-Recommended Price vs. Market',
-                        labels={'Price': 'Nightly Rate (£)'},
-                        hover_data=['Details']
-                    )
-                    
-                    fig.update_layout(
-                        xaxis_title="",
-                        yaxis_title="Nightly Rate (£)",
-                        showlegend=True,
-                        height=400
+                if chart_summary['rows'] > 0:
+                    fig = price_distribution_chart(
+                        chart_summary, ai_insights['recommended_price'], 'AI-Recommended Price vs. Market', '#9D4EDD'
                     )
-                    
-                    fig.update_xaxes(tickangle=-45)
-                    
                     st.plotly_chart(fig, use_container_width=True)
+                    st.caption(chart_caption(chart_summary))
                 
                 # Show reasoning
                 st.write("### 💡 Strategic Reasoning")
@@ -344,3 +543,51 @@ if analyze_button:
     
     else:
         st.error("❌ Not enough competitor data to generate a recommendation")
+
+# ============================================
+# TIMING READOUT
+# ============================================
+
+timings["Total rerun"] = (time.perf_counter() - run_started) * 1000
+
+with st.sidebar.expander("⏱️ Performance", expanded=False):
+    for label, ms in timings.items():
+        st.write(f"**{label}:** {ms:.0f} ms")
+
+# Debug panel - run with PRICING_DEBUG=1 or open the app with ?debug=1
+if os.getenv('PRICING_DEBUG') or st.query_params.get('debug'):
+    from src.llm_analyzer import AI_STREAM
+    from src.metrics import (INSIGHT_CACHE_LOOKUPS, LLM_CIRCUIT_OPENED, LLM_FALLBACKS, LLM_FIRST_FIELD_SECONDS,
+                             LLM_REQUESTS, LLM_REQUEST_SECONDS, LLM_RETRIES, LLM_TOKENS, render_prometheus)
+    
+    # The app's Claude calls are either streamed or blocking
+    operation = 'stream' if AI_STREAM else 'single'
+    
+    with st.sidebar.expander("🐞 Debug", expanded=True):
+        st.write("**Stages this run:**")
+        if trace:
+            st.table([{'Stage': stage, 'ms': f"{ms:.2f}"} for stage, ms in trace])
+        else:
+            st.write("Nothing timed yet")
+        
+        st.write("**Claude (since start-up):**")
+        outcomes = {name: LLM_REQUESTS.value(operation=operation, outcome=name)
+                    for name in ['ok', 'api_error', 'parse_error']}
+        latency = LLM_REQUEST_SECONDS.summary(operation=operation, outcome='ok')
+        first_field = LLM_FIRST_FIELD_SECONDS.summary(mode='stream' if AI_STREAM else 'blocking')
+        st.write(f"Calls: {outcomes['ok']} ok, {outcomes['api_error']} API errors, "
+                 f"{outcomes['parse_error']} parse failures")
+        if latency['mean'] is not None:
+            st.write(f"Average latency: {latency['mean']:.2f}s")
+        if first_field['mean'] is not None:
+            st.write(f"Average time to first field: {first_field['mean']:.2f}s")
+        fallbacks = sum(value for _, _, value in LLM_FALLBACKS.samples())
+        st.write(f"Retries: {LLM_RETRIES.value(operation=operation)}, fallbacks to the basic price: {fallbacks}, "
+                 f"circuit opened: {LLM_CIRCUIT_OPENED.value()} times")
+        st.write(f"Tokens: {LLM_TOKENS.value(operation=operation, direction='input')} in, "
+                 f"{LLM_TOKENS.value(operation=operation, direction='output')} out")
+        st.write(f"Insight cache: {INSIGHT_CACHE_LOOKUPS.value(result='hit')} hits, "
+                 f"{INSIGHT_CACHE_LOOKUPS.value(result='miss')} misses")
+        
+        st.download_button("Download metrics (Prometheus)", render_prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
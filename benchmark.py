@@ -0,0 +1,403 @@
+"""
+Benchmarks for the pricing engine at realistic data sizes.
+
+    python3 benchmark.py                                  # all sizes
+    python3 benchmark.py --sizes sample,100k              # just these
+    python3 benchmark.py --compare benchmarks/old.json benchmarks/new.json
+
+Each size runs in its own process, in a scratch directory holding a
+generated data/competitors.csv ('sample' uses the repo's own data file).
+Every case reports wall time per call and the peak memory allocated
+while it runs (tracemalloc), and the results are saved as JSON
+(benchmarks/<commit>.json by default) so runs on different commits can be
+compared with --compare. load_competitor_data also reports the bytes the
+compact index holds, next to the frame read_csv gives for the same file.
+Claude is never called - the prompt case uses a fake client. The stats cube is built from the columnar store on one
+process and on a pool, and the pool case reports its speedup.
+
+The cold_load cases open the data in a brand new process and make one
+lookup - from the CSV with read_csv, and from the columnar store - and
+report the time and how much the process's resident memory grew (Linux
+only). The OS page cache stays warm, so this is a cold process, not a
+cold disk.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from create_sample_data import LOCATIONS, PROPERTY_TYPES, sample_config, write_csv
+from src.calendar_pricing import price_calendar
+from src.data_handler import DATA_PATH, STORE_PATH, ColumnarStore, CompetitorIndex, build_columnar_store
+from src.pricing_engine import (calculate_price_stats, generate_base_recommendation, get_competitor_data,
+                                prepare_chart_data)
+from src.segment_stats import parallel_segment_stats
+
+SIZES = {'sample': None, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Properties looked up in each case - every segment, plus one with no competitors
+QUERIES = [
+    {'location': location, 'property_type': property_type, 'bedrooms': bedrooms,
+     'has_parking': True, 'has_wifi': True, 'pet_friendly': False}
+    for location in LOCATIONS for property_type in PROPERTY_TYPES for bedrooms in [1, 2, 3]
+] + [{'location': 'Leeds', 'property_type': 'Flat', 'bedrooms': 2,
+      'has_parking': False, 'has_wifi': True, 'pet_friendly': False}]
+
+# Fresh processes started for each cold_load case
+COLD_LOAD_ROUNDS = 3
+
+# Portfolio priced night by night for a year in the calendar case
+CALENDAR_PROPERTIES = 5000
+
+FAKE_REPLY = json.dumps({
+    'recommended_price': 150,
+    'positioning': 'mid-range',
+    'reasoning': 'Benchmark reply.',
+    'tips': ['Tip 1', 'Tip 2']
+})
+
+
+def peak_memory(fn):
+    """
+    Peak bytes allocated while fn runs once
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def resident_memory():
+    """
+    Resident memory of this process in bytes, or None where the OS
+    doesn't report it (only Linux's /proc is read)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def cold_load(source, data_dir):
+    """
+    Open the data and make one lookup, in a fresh process. Returns the
+    seconds taken and how much resident memory grew.
+    """
+    os.chdir(data_dir)
+    query = QUERIES[0]
+    before = resident_memory()
+    started = time.perf_counter()
+
+    if source == 'csv':
+        data = pd.read_csv(DATA_PATH)
+        in_area = (data['location'] == query['location']) & (data['bedrooms'] == query['bedrooms'])
+        found = data[in_area & (data['property_type'] == query['property_type'])], data[in_area]
+    else:
+        data = ColumnarStore(STORE_PATH)
+        found = data.lookup(query['location'], query['property_type'], query['bedrooms'])
+
+    seconds = time.perf_counter() - started
+    # Both still held, so their memory is counted
+    after = resident_memory()
+    del data, found
+    return seconds, None if before is None else after - before
+
+
+def measure_cold_load(source, data_dir):
+    """
+    cold_load in a new process each round
+    """
+    rounds, rss = [], []
+    for _ in range(COLD_LOAD_ROUNDS):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            seconds, grown = pool.submit(cold_load, source, data_dir).result()
+        rounds.append(seconds)
+        rss.append(grown)
+
+    return {
+        'case': f'cold_load[{source}]',
+        'calls_per_round': 1,
+        'rounds': len(rounds),
+        'mean_s': float(np.mean(rounds)),
+        'median_s': float(np.median(rounds)),
+        'min_s': float(np.min(rounds)),
+        'max_s': float(np.max(rounds)),
+        'peak_memory_bytes': None,
+        'rss_bytes': None if None in rss else int(np.median(rss))
+    }
+
+
+def measure(name, fn, warmup=True, repeat=5, min_round_time=0.2, max_calls=1000):
+    """
+    Time fn (seconds per call) over `repeat` rounds, each long enough to be
+    measurable, then run it once more under tracemalloc for peak memory.
+    Set warmup=False for one-off work like loading the data.
+    """
+    if warmup:
+        # Loads the data and fills caches, so they aren't part of the timing
+        fn()
+
+    started = time.perf_counter()
+    fn()
+    first_call = time.perf_counter() - started
+
+    calls = int(min(max(min_round_time / max(first_call, 1e-9), 1), max_calls))
+    if first_call > min_round_time * repeat:
+        # Too slow to repeat - the first call is the measurement
+        rounds = [first_call]
+    else:
+        rounds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(calls):
+                fn()
+            rounds.append((time.perf_counter() - started) / calls)
+
+    return {
+        'case': name,
+        'calls_per_round': calls if len(rounds) > 1 else 1,
+        'rounds': len(rounds),
+        'mean_s': float(np.mean(rounds)),
+        'median_s': float(np.median(rounds)),
+        'min_s': float(np.min(rounds)),
+        'max_s': float(np.max(rounds)),
+        'peak_memory_bytes': peak_memory(fn)
+    }
+
+
+class FakeClient:
+    """
+    Stands in for the Anthropic client - returns a canned reply instantly
+    """
+
+    def __init__(self):
+        self.messages = self
+        self.prompt_chars = 0
+
+    def with_options(self, **options):
+        return self
+
+    def create(self, model, max_tokens, messages, **options):
+        self.prompt_chars = len(messages[0]['content'])
+        return SimpleNamespace(content=[SimpleNamespace(text=FAKE_REPLY)],
+                               usage=SimpleNamespace(input_tokens=self.prompt_chars // 4, output_tokens=50))
+
+
+def run_size(size, data_dir):
+    """
+    Run every case against one data size (in a fresh process, from data_dir)
+    """
+    from src.llm_analyzer import get_ai_pricing_insights
+
+    os.chdir(data_dir)
+    rows = len(pd.read_csv(DATA_PATH, usecols=['nightly_rate']))
+    results = []
+
+    def next_query(queries=itertools.cycle(QUERIES)):
+        return next(queries)
+
+    def lookup():
+        query = next_query()
+        return get_competitor_data(query['location'], query['property_type'], query['bedrooms'])
+
+    def load_index():
+        index = CompetitorIndex(DATA_PATH)
+        index.load()
+        return index
+
+    # Lookups and the functions that consume them, from the in-memory index
+    results.append(measure('load_competitor_data', load_index, warmup=False))
+    # What the compact index holds, against the frame read_csv gives
+    results[-1]['index_bytes'] = load_index().memory_usage()
+    results[-1]['frame_bytes'] = int(pd.read_csv(DATA_PATH).memory_usage(deep=True).sum())
+    results.append(measure('get_competitor_data[index]', lookup))
+
+    segments = [(query, *lookup()) for query in QUERIES]
+    stats = [calculate_price_stats(exact, similar) for _, exact, similar in segments]
+    recommendations = [generate_base_recommendation(item) for item in stats]
+    cases = itertools.cycle(zip(segments, stats, recommendations))
+
+    def price_stats():
+        (_, exact, similar), _, _ = next(cases)
+        calculate_price_stats(exact, similar)
+
+    def recommendation():
+        _, item, _ = next(cases)
+        generate_base_recommendation(item)
+
+    def chart_data():
+        (query, exact, similar), _, item = next(cases)
+        prepare_chart_data(exact, similar, item['price'], query)
+
+    fake_client = FakeClient()
+
+    def ai_insights():
+        (query, _, _), item, rec = next(cases)
+        while rec['price'] is None:
+            (query, _, _), item, rec = next(cases)
+        get_ai_pricing_insights(query, item, rec, use_cache=False)
+
+    portfolio = pd.DataFrame([QUERIES[position % len(QUERIES)] for position in range(CALENDAR_PROPERTIES)])
+
+    def calendar():
+        price_calendar(portfolio, start='2026-01-01')
+
+    results.append(measure('calculate_price_stats', price_stats))
+    results.append(measure('generate_base_recommendation', recommendation))
+    results.append(measure('prepare_chart_data', chart_data))
+    with mock.patch('src.llm_analyzer.get_client', return_value=fake_client), \
+            mock.patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'benchmark'}):
+        results.append(measure('get_ai_pricing_insights[fake client]', ai_insights))
+    results.append(measure(f'price_calendar[{CALENDAR_PROPERTIES} x 365 nights]', calendar))
+
+    # The same lookups once the columnar store has been built
+    results.append(measure('build_columnar_store', build_columnar_store, warmup=False))
+    results.append(measure('get_competitor_data[store]', lookup))
+
+    # Building the stats cube from the store on one core and on a pool, with
+    # the same shards so only the number of processes differs
+    workers = max(os.cpu_count() or 1, 2)
+    serial = measure('parallel_segment_stats[1 worker]', lambda: parallel_segment_stats(workers=1, shards=workers))
+    parallel = measure(f'parallel_segment_stats[{workers} workers]', lambda: parallel_segment_stats(workers=workers))
+    parallel['speedup'] = serial['median_s'] / parallel['median_s']
+    results.extend([serial, parallel])
+
+    return {'size': size, 'rows': rows, 'cases': results}
+
+
+def prepare_data(size, data_dir):
+    """
+    Put the competitor data for a size into data_dir/data/competitors.csv
+    """
+    os.makedirs(os.path.join(data_dir, 'data'))
+    target = os.path.join(data_dir, DATA_PATH)
+    if SIZES[size] is None:
+        shutil.copy(DATA_PATH, target)
+    else:
+        write_csv(sample_config(rows=SIZES[size]), target)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(sizes):
+    """
+    Run the benchmarks for each size and return the results document
+    """
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+        'sizes': []
+    }
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            print(f"📦 {size}: preparing data...")
+            started = time.perf_counter()
+            prepare_data(size, data_dir)
+            print(f"   ready in {time.perf_counter() - started:.1f}s")
+
+            # A fresh process per size, so caches and memory don't carry over
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                result = pool.submit(run_size, size, data_dir).result()
+
+            # run_size left the columnar store built, next to the CSV
+            result['cases'].extend(measure_cold_load(source, data_dir) for source in ['csv', 'store'])
+
+        for case in result['cases']:
+            memory = case['peak_memory_bytes'] if case['peak_memory_bytes'] is not None else case['rss_bytes']
+            memory = f"{memory / 1e6:>10.1f} MB" if memory is not None else f"{'-':>13}"
+            if 'rss_bytes' in case:
+                memory += ' RSS'
+            speedup = f" {case['speedup']:>6.2f}x speedup" if 'speedup' in case else ''
+            print(f"   {case['case']:<40} {case['median_s'] * 1000:>10.3f} ms {memory}{speedup}")
+            if 'index_bytes' in case:
+                print(f"   {'  index holds':<40} {case['index_bytes'] / 1e6:>10.1f} MB "
+                      f"(read_csv frame {case['frame_bytes'] / 1e6:.1f} MB)")
+        report['sizes'].append(result)
+
+    return report
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """
+    Print the change in median time per case between two result files
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    old_cases = {(item['size'], case['case']): case for item in old['sizes'] for case in item['cases']}
+    print(f"{old['commit']} -> {new['commit']}")
+
+    regressions = 0
+    for item in new['sizes']:
+        for case in item['cases']:
+            before = old_cases.get((item['size'], case['case']))
+            if before is None:
+                continue
+            ratio = case['median_s'] / before['median_s'] if before['median_s'] else float('inf')
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  ⚠️ slower'
+                regressions += 1
+            elif ratio < 1 - threshold:
+                flag = '  faster'
+            print(f"{item['size']:>7} {case['case']:<40} {before['median_s'] * 1000:>10.3f} ms -> "
+                  f"{case['median_s'] * 1000:>10.3f} ms ({ratio:.2f}x){flag}")
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pricing engine')
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"Comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument('--output', help='Where to write the JSON results (default benchmarks/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Slowdown reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    report = run_benchmarks(sizes)
+
+    output = args.output or os.path.join('benchmarks', f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
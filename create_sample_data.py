@@ -1,43 +1,408 @@
-import pandas as pd
+"""
+Generate synthetic competitor data.
+
+    python3 create_sample_data.py                   # 135 rows, shaped like data/competitors.csv
+    python3 create_sample_data.py --rows 10000000 --output /tmp/competitors_10m.csv
+    python3 create_sample_data.py --rows 10000000 --format columnar --seasonality 0.3 --outlier-rate 0.01
+    python3 create_sample_data.py --rows 1000000 --seasonality 0.3 --dated   # nightly rates through a year
+
+Listings are laid out segment by segment (location x property type x
+bedrooms), `--listings-per-segment` of each, or enough to make `--rows`.
+Everything is generated with NumPy a million rows at a time and written
+as it goes, so 10M rows take seconds. The same seed and options always
+give the same data.
+
+The defaults give the same segments, row count and price model as the
+data/competitors.csv the app ships with, but not the same rows: that file
+came from an earlier generator with its own random draws. Without
+--output, the CSV is written over that file.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
 import numpy as np
+import pandas as pd
+
+from src.data_handler import (
+    DATA_PATH, ROW_ID, STORE_PATH, finish_columnar_store, start_columnar_store, write_columnar_store
+)
+
+# Base nightly price for each location
+LOCATIONS = {'London': 150, 'Edinburgh': 100, 'Cornwall': 120}
+
+# Price multiplier for each property type
+PROPERTY_TYPES = {'Flat': 0.9, 'House': 1.1, 'Cottage': 1.0}
+
+BEDROOM_PRICE = 30      # added per bedroom
+PRICE_NOISE = 20        # +/- random variation in £
+PEAK_MONTH = 8          # seasonal prices peak in August
+SAMPLE_YEAR = 2025      # the year --dated rates are spread over
+WEEKEND_UPLIFT = 0.15   # Friday and Saturday nights cost this much more
+
+# Events that push prices up: (first night, nights, uplift) for each location
+EVENTS = {
+    'London': [('12-31', 1, 0.6)],                          # New Year's Eve
+    'Edinburgh': [('08-01', 25, 0.5), ('12-31', 1, 0.8)],   # the Festival Fringe, Hogmanay
+    'Cornwall': [('08-06', 5, 0.3)]                         # surf festival week
+}
+CHUNK_ROWS = 1_000_000  # rows generated and written at a time
+
+COLUMNS = ['location', 'property_type', 'bedrooms', 'nightly_rate', 'has_parking', 'has_wifi', 'pet_friendly']
+FLAGS = ['has_parking', 'has_wifi', 'pet_friendly']
+
+
+def sample_config(rows=None, listings_per_segment=5, locations=None, bedrooms=(1, 3), seasonality=0.0,
+                  outlier_rate=0.0, seed=42, dated=False):
+    """
+    Generator options - the defaults give the 135-row sample
+    """
+    return {
+        'rows': rows,
+        'listings_per_segment': listings_per_segment,
+        'locations': dict(locations or LOCATIONS),
+        'bedrooms': list(bedrooms),
+        'seasonality': seasonality,
+        'outlier_rate': outlier_rate,
+        'seed': seed,
+        'dated': dated
+    }
+
+
+def segment_count(config):
+    bedrooms_min, bedrooms_max = config['bedrooms']
+    return len(config['locations']) * len(PROPERTY_TYPES) * (bedrooms_max - bedrooms_min + 1)
+
+
+def total_rows(config):
+    if config['rows'] is not None:
+        return config['rows']
+    return segment_count(config) * config['listings_per_segment']
+
+
+def generate_chunk(rng, start, stop, config):
+    """
+    Columns for rows [start, stop), as NumPy arrays. Locations and property
+    types are integer codes into config['locations'] and PROPERTY_TYPES.
+    """
+    bedrooms_min, bedrooms_max = config['bedrooms']
+    bedroom_options = bedrooms_max - bedrooms_min + 1
+    listings = math.ceil(total_rows(config) / segment_count(config))
+    n = stop - start
+
+    # Which segment each row is in, location outermost and bedrooms innermost
+    segment = np.arange(start, stop) // listings
+    location = (segment // (len(PROPERTY_TYPES) * bedroom_options)).astype(np.int8)
+    property_type = (segment // bedroom_options % len(PROPERTY_TYPES)).astype(np.int8)
+    bedrooms = (bedrooms_min + segment % bedroom_options).astype(np.int8)
+
+    base_price = np.array(list(config['locations'].values()), dtype=np.float64)[location]
+    type_multiplier = np.array(list(PROPERTY_TYPES.values()))[property_type]
+    nightly_rate = (base_price * type_multiplier + bedrooms.astype(np.float64) * BEDROOM_PRICE
+                    + rng.integers(-PRICE_NOISE, PRICE_NOISE, n))
+
+    columns = {}
+    if config['dated']:
+        # Each listing's rate was for a random night of the year
+        day = rng.integers(0, len(year_dates()), n).astype(np.int16)
+        nightly_rate *= night_multipliers(config)[location, day]
+        columns['date'] = day
+    elif config['seasonality']:
+        # Each listing's rate was seen in a random month of the year
+        month = rng.integers(1, 13, n).astype(np.int8)
+        nightly_rate *= 1 + config['seasonality'] * np.cos(2 * np.pi * (month - PEAK_MONTH) / 12)
+        columns['month'] = month
+
+    if config['outlier_rate']:
+        # Mispriced listings - half far too expensive, half far too cheap
+        outliers = np.flatnonzero(rng.random(n) < config['outlier_rate'])
+        high = rng.random(len(outliers)) < 0.5
+        nightly_rate[outliers] *= np.where(high, rng.uniform(2.5, 5, len(outliers)),
+                                           rng.uniform(0.2, 0.5, len(outliers)))
+
+    columns.update(
+        location=location,
+        property_type=property_type,
+        bedrooms=bedrooms,
+        nightly_rate=nightly_rate.round(2),
+        has_parking=rng.random(n) < 0.5,
+        has_wifi=np.ones(n, dtype=bool),
+        pet_friendly=rng.random(n) < 0.5
+    )
+    return columns
+
+
+def year_dates():
+    return pd.date_range(f'{SAMPLE_YEAR}-01-01', f'{SAMPLE_YEAR}-12-31')
+
+
+def night_multipliers(config):
+    """
+    Price multiplier for each location (rows) and night of the year
+    (columns) - season, weekends and events
+    """
+    dates = year_dates()
+    month = dates.month.to_numpy()
+    night = (1 + config['seasonality'] * np.cos(2 * np.pi * (month - PEAK_MONTH) / 12)) \
+        * np.where(dates.dayofweek.isin([4, 5]), 1 + WEEKEND_UPLIFT, 1)
+
+    multipliers = np.tile(night, (len(config['locations']), 1))
+    for row, location in enumerate(config['locations']):
+        for first, nights, uplift in EVENTS.get(location, []):
+            start = dates.get_loc(pd.Timestamp(f'{SAMPLE_YEAR}-{first}'))
+            multipliers[row, start:start + nights] *= 1 + uplift
+    return multipliers
+
+
+def generate_chunks(config):
+    """
+    Yield the data a chunk at a time
+    """
+    rng = np.random.default_rng(config['seed'])
+    rows = total_rows(config)
+    for start in range(0, rows, CHUNK_ROWS):
+        yield generate_chunk(rng, start, min(start + CHUNK_ROWS, rows), config)
+
+
+def chunk_to_frame(columns, config):
+    """
+    A generated chunk as a DataFrame, with locations and types as Categoricals
+    """
+    frame = pd.DataFrame({name: columns[name] for name in column_names(config)})
+    frame['location'] = pd.Categorical.from_codes(columns['location'], list(config['locations']))
+    frame['property_type'] = pd.Categorical.from_codes(columns['property_type'], list(PROPERTY_TYPES))
+    if config['dated']:
+        frame['date'] = pd.Categorical.from_codes(columns['date'], year_dates().strftime('%Y-%m-%d'))
+    return frame
+
+
+def column_names(config):
+    if config['dated']:
+        return COLUMNS + ['date']
+    return COLUMNS + (['month'] if config['seasonality'] else [])
+
+
+def format_csv_chunk(columns, config):
+    """
+    CSV text for a chunk, in the same format pandas writes.
+
+    Every column except the rate has only a handful of values, so each row
+    is put together from three lookup tables (segment prefix, rate, flags
+    suffix) instead of formatting every field.
+    """
+    locations = list(config['locations'])
+    types = list(PROPERTY_TYPES)
+    bedrooms_min, bedrooms_max = config['bedrooms']
+
+    # "location,property_type,bedrooms," for every segment
+    prefixes = np.array([
+        f"{location},{property_type},{bedrooms},"
+        for location in locations for property_type in types for bedrooms in range(bedrooms_min, bedrooms_max + 1)
+    ], dtype=object)
+    segment = (columns['location'].astype(np.int64) * len(types) + columns['property_type']) \
+        * (bedrooms_max - bedrooms_min + 1) + (columns['bedrooms'] - bedrooms_min)
+
+    # Rates are whole pence, so one string per distinct rate covers the lot
+    pence = np.rint(columns['nightly_rate'] * 100).astype(np.int64)
+    lowest = pence.min()
+    rates = np.array([repr(value / 100) for value in range(lowest, pence.max() + 1)], dtype=object)
+
+    # ",has_parking,has_wifi,pet_friendly[,month or date]" for every combination
+    flags = sum(columns[flag].astype(np.int64) << bit for bit, flag in enumerate(FLAGS))
+    if config['dated']:
+        extras = year_dates().strftime('%Y-%m-%d').tolist()
+        flags = flags * len(extras) + columns['date']
+    elif config['seasonality']:
+        extras = list(range(1, 13))
+        flags = flags * 12 + columns['month'] - 1
+    else:
+        extras = [None]
+    suffixes = np.array([
+        ''.join(f",{bool(combination >> bit & 1)}" for bit in range(len(FLAGS)))
+        + (f",{extra}" if extra else '')
+        for combination in range(2 ** len(FLAGS)) for extra in extras
+    ], dtype=object)
+
+    lines = prefixes[segment] + rates[pence - lowest]
+    lines += suffixes[flags]
+    return '\n'.join(lines.tolist()) + '\n'
+
+
+def write_csv(config, path, progress=None):
+    """
+    Write the data to a CSV, a chunk at a time
+    """
+    # Written next to the target then swapped in, so readers never see half a file
+    tmp_path = path + '.tmp'
+    rows = 0
+    with open(tmp_path, 'w') as f:
+        f.write(','.join(column_names(config)) + '\n')
+        for columns in generate_chunks(config):
+            f.write(format_csv_chunk(columns, config))
+            rows += len(columns['nightly_rate'])
+            if progress:
+                progress(rows)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def write_columnar(config, store_path, progress=None):
+    """
+    Write the data straight to a columnar store, without a CSV.
+
+    The store keeps rows sorted by location, bedrooms and property type.
+    Every segment's size is known up front, so each chunk's rows go
+    straight to their final place in preallocated column files and only
+    one chunk is ever in memory.
+    """
+    rows = total_rows(config)
+    # The data is fully determined by the options, so they make a good version
+    version = hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+    if not rows:
+        write_columnar_store(pd.DataFrame(columns=column_names(config)), store_path, source_hash=version)
+        return 0
+
+    locations = list(config['locations'])
+    types = list(PROPERTY_TYPES)
+    bedrooms_min, bedrooms_max = config['bedrooms']
+    bedroom_options = bedrooms_max - bedrooms_min + 1
+    listings = math.ceil(rows / segment_count(config))
+
+    # Generated segments in order, with their row counts (the last few can be short or empty)
+    segments = [(location, property_type, bedrooms_min + bedrooms)
+                for location in range(len(locations)) for property_type in range(len(types))
+                for bedrooms in range(bedroom_options)]
+    counts = np.clip(rows - np.arange(len(segments)) * listings, 0, listings)
+
+    # The generated codes index straight into these, as in chunk_to_frame
+    categories = {'location': locations, 'property_type': types}
+    if config['dated']:
+        categories['date'] = year_dates().strftime('%Y-%m-%d').tolist()
+
+    # Where each generated segment starts in the store's order
+    store_order = sorted((segment for segment in range(len(segments)) if counts[segment]),
+                         key=lambda segment: [segments[segment][key] for key in (0, 2, 1)])
+    offsets = np.zeros(len(segments), dtype=np.int64)
+    meta_segments = []
+    position = 0
+    for segment in store_order:
+        location, property_type, bedrooms = segments[segment]
+        offsets[segment] = position
+        meta_segments.append([location, bedrooms, property_type, position, position + int(counts[segment])])
+        position += int(counts[segment])
+
+    tmp_path = start_columnar_store(store_path)
+    files = {}
+    written = 0
+    for columns in generate_chunks(config):
+        n = len(columns['nightly_rate'])
+        row = np.arange(written, written + n)
+        segment = row // listings
+        values = {name: columns[name] for name in column_names(config)}
+        for name in categories:
+            values[name] = columns[name].astype(np.int32)
+        values[ROW_ID] = row
+
+        if not files:
+            files = {
+                name: np.lib.format.open_memmap(os.path.join(tmp_path, f'{name}.npy'), mode='w+',
+                                                dtype=column.dtype, shape=(rows,))
+                for name, column in values.items()
+            }
+        target = offsets[segment] + row - segment * listings
+        for name, column in values.items():
+            files[name][target] = column
+
+        written += n
+        if progress:
+            progress(written)
+
+    for column in files.values():
+        column.flush()
+    del files
+
+    meta = {
+        'source_hash': version,
+        'source_stamp': None,
+        'rows': rows,
+        'columns': column_names(config),
+        'categories': categories,
+        'segments': meta_segments,
+    }
+    finish_columnar_store(tmp_path, store_path, meta)
+    return rows
+
+
+def parse_locations(text):
+    """
+    'London=150,Leeds=90' -> {'London': 150.0, 'Leeds': 90.0}
+    """
+    locations = {}
+    for item in text.split(','):
+        name, _, price = item.partition('=')
+        if not name.strip() or not price.strip():
+            raise argparse.ArgumentTypeError(f"Expected name=base_price, got '{item}'")
+        locations[name.strip()] = float(price)
+    return locations
+
+
+def parse_bedrooms(text):
+    """
+    '1-3' -> (1, 3), '2' -> (2, 2)
+    """
+    low, _, high = text.partition('-')
+    bedrooms = (int(low), int(high or low))
+    if bedrooms[0] < 0 or bedrooms[1] < bedrooms[0]:
+        raise argparse.ArgumentTypeError(f"Bad bedroom range '{text}'")
+    return bedrooms
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic competitor data')
+    parser.add_argument('--rows', type=int, help='Total rows (overrides --listings-per-segment)')
+    parser.add_argument('--listings-per-segment', type=int, default=5)
+    parser.add_argument('--locations', type=parse_locations,
+                        default=','.join(f"{name}={price}" for name, price in LOCATIONS.items()),
+                        help='Locations and base prices, e.g. London=150,Leeds=90')
+    parser.add_argument('--bedrooms', type=parse_bedrooms, default='1-3', help='Bedroom range, e.g. 1-5')
+    parser.add_argument('--seasonality', type=float, default=0.0,
+                        help='Seasonal price swing, e.g. 0.3 for +/-30%% (adds a month column)')
+    parser.add_argument('--dated', action='store_true',
+                        help='Rates for nights through the year, with weekend and event premiums (adds a date column)')
+    parser.add_argument('--outlier-rate', type=float, default=0.0, help='Share of wildly mispriced listings')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['csv', 'columnar'], default='csv')
+    parser.add_argument('--output', help=f'Defaults to {DATA_PATH} or {STORE_PATH}')
+    args = parser.parse_args()
+
+    if not 0 <= args.seasonality < 1:
+        parser.error('--seasonality must be between 0 and 1')
+    if not 0 <= args.outlier_rate <= 1:
+        parser.error('--outlier-rate must be between 0 and 1')
+
+    config = sample_config(args.rows, args.listings_per_segment, args.locations, args.bedrooms,
+                           args.seasonality, args.outlier_rate, args.seed, args.dated)
+
+    def show_progress(rows):
+        print(f"\r  {rows:,} rows", end='', flush=True)
+
+    started = time.perf_counter()
+    if args.format == 'csv':
+        output = args.output or DATA_PATH
+        rows = write_csv(config, output, progress=show_progress)
+    else:
+        output = args.output or STORE_PATH
+        rows = write_columnar(config, output, progress=show_progress)
+    elapsed = time.perf_counter() - started
+
+    print(f"\r✅ Sample data created successfully!")
+    print(f"📊 Created {rows:,} competitor properties in {output} ({elapsed:.1f}s)")
+
+    if args.format == 'columnar' and output == STORE_PATH and os.path.exists(DATA_PATH):
+        print(f"ℹ️  {DATA_PATH} also exists - the app uses the store only once that CSV is removed")
 
-# Set random seed for consistent results
-np.random.seed(42)
-
-locations = ['London', 'Edinburgh', 'Cornwall']
-property_types = ['Flat', 'House', 'Cottage']
-data = []
-
-for location in locations:
-    # Different base prices for different locations
-    base_price = {'London': 150, 'Edinburgh': 100, 'Cornwall': 120}[location]
-    
-    for prop_type in property_types:
-        for bedrooms in [1, 2, 3]:
-            # Create 5 properties for each combination
-            for i in range(5):
-                # Adjust price based on property type
-                type_multiplier = {'Flat': 0.9, 'House': 1.1, 'Cottage': 1.0}[prop_type]
-                bedroom_add = bedrooms * 30
-                
-                # Calculate price with some randomness
-                nightly_rate = base_price * type_multiplier + bedroom_add + np.random.randint(-20, 20)
-                
-                data.append({
-                    'location': location,
-                    'property_type': prop_type,
-                    'bedrooms': bedrooms,
-                    'nightly_rate': round(nightly_rate, 2),
-                    'has_parking': np.random.choice([True, False]),
-                    'has_wifi': True,
-                    'pet_friendly': np.random.choice([True, False])
-                })
-
-# Create DataFrame and save to CSV
-df = pd.DataFrame(data)
-df.to_csv('data/competitors.csv', index=False)
-
-print("✅ Sample data created successfully!")
-print(f"📊 Created {len(df)} competitor properties")
-print("\nFirst few rows:")
-print(df.head(10))
+    print("\nFirst few rows:")
+    print(chunk_to_frame(next(generate_chunks(config)), config).head(10))
@@ -0,0 +1,119 @@
+"""
+Load test for the pricing service (src/pricing_service.py).
+
+    python3 -m src.pricing_service --port 8000 &
+    python3 load_test.py --url http://127.0.0.1:8000 --requests 5000 --concurrency 16
+
+Reports p50/p90/p99 latency and requests per second for the requests that
+succeeded; failures are counted separately.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+LOCATIONS = ['London', 'Edinburgh', 'Cornwall']
+PROPERTY_TYPES = ['Flat', 'House', 'Cottage']
+
+
+def random_property(rng):
+    return {
+        'location': rng.choice(LOCATIONS),
+        'property_type': rng.choice(PROPERTY_TYPES),
+        'bedrooms': rng.randint(1, 3),
+        'has_parking': rng.random() < 0.5,
+        'has_wifi': True,
+        'pet_friendly': rng.random() < 0.5
+    }
+
+
+def run_worker(url, path, count, batch_size, latencies, errors, seed):
+    """
+    Send `count` requests over one keep-alive connection
+    """
+    rng = random.Random(seed)
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+    headers = {'Content-Type': 'application/json'}
+
+    for _ in range(count):
+        if batch_size:
+            body = {'properties': [random_property(rng) for _ in range(batch_size)]}
+        else:
+            body = random_property(rng)
+
+        started = time.perf_counter()
+        try:
+            conn.request('POST', path, json.dumps(body), headers)
+            response = conn.getresponse()
+            if response.status == 200:
+                response.read()
+                latencies.append(time.perf_counter() - started)
+                continue
+            # Failures aren't timed - a fast error isn't a fast price
+            errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+        # The unread reply (or a broken connection) means starting a new one
+        conn.close()
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+
+    conn.close()
+
+
+def run_load_test(url, requests=2000, concurrency=8, batch_size=0):
+    """
+    Fire requests at the service from `concurrency` threads and summarise latency
+    """
+    path = '/price/batch' if batch_size else '/price'
+    latencies = []
+    errors = []
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [
+        threading.Thread(target=run_worker, args=(url, path, count, batch_size, latencies, errors, i))
+        for i, count in enumerate(per_worker)
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(ms, 50)) if len(ms) else None,
+        'p90_ms': float(np.percentile(ms, 90)) if len(ms) else None,
+        'p99_ms': float(np.percentile(ms, 99)) if len(ms) else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the pricing service')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=0, help='Use /price/batch with this many properties')
+    args = parser.parse_args()
+
+    print(f"🚀 Sending {args.requests} requests with {args.concurrency} connections...")
+    result = run_load_test(args.url, args.requests, args.concurrency, args.batch_size)
+
+    print(f"✅ {result['requests']} ok, {result['errors']} errors in {result['seconds']:.2f}s")
+    print(f"📈 {result['rps']:.0f} requests/sec")
+    if result['p50_ms'] is None:
+        # Every request failed, so there are no latencies to report
+        print(f"⚠️  No responses to time - all {result['errors']} requests failed")
+    else:
+        print(f"⏱️  p50 {result['p50_ms']:.2f} ms | p90 {result['p90_ms']:.2f} ms | p99 {result['p99_ms']:.2f} ms")
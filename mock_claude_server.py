@@ -0,0 +1,275 @@
+"""
+Local stand-in for the Claude Messages API, for testing without an API key.
+
+Run it and point the app (or the bulk insight functions) at it:
+
+    python3 mock_claude_server.py --port 8787
+    ANTHROPIC_API_KEY=test ANTHROPIC_BASE_URL=http://127.0.0.1:8787 streamlit run app.py
+
+Faults can be injected to exercise timeouts, retries and fallbacks:
+
+    python3 mock_claude_server.py --error-rate 0.2 --error-status 529   # 20% overloaded
+    python3 mock_claude_server.py --slow-rate 0.05 --slow-latency 10    # a slow tail
+    python3 mock_claude_server.py --fail-first 3                        # an outage, then recovery
+
+Streaming requests ("stream": true) get server-sent events like the real
+API. --token-delay paces the reply like a model writing it, for streamed
+and whole replies alike:
+
+    python3 mock_claude_server.py --latency 0.5 --token-delay 0.02     # ~50 tokens a second
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PRICE_PATTERN = re.compile(r'Suggested price: £([0-9.]+)')
+PACKED_ID_PATTERN = re.compile(r'^- id (\S+?):', re.MULTILINE)
+
+# Characters per streamed text delta - roughly one token
+TOKEN_CHARS = 4
+
+# Error type the real API uses for each injectable status
+ERROR_TYPES = {429: 'rate_limit_error', 500: 'api_error', 503: 'api_error', 529: 'overloaded_error'}
+
+
+def fake_insights(prompt):
+    """
+    Make up a plausible pricing reply based on the prompt's baseline price
+    """
+    match = PRICE_PATTERN.search(prompt)
+    base_price = float(match.group(1)) if match else 100.0
+    return {
+        'recommended_price': round(base_price * 1.05, 2),
+        'positioning': 'mid-range',
+        'reasoning': ('Mock response priced slightly above the market average. Comparable listings '
+                      'in the area support a small premium for the amenities on offer.'),
+        'tips': ['Mock tip 1: offer a discount for week-long stays',
+                 'Mock tip 2: raise weekend rates in the summer',
+                 'Mock tip 3: highlight parking and WiFi in the listing']
+    }
+
+
+def message_response(text, model, input_tokens):
+    return {
+        'id': f'msg_mock_{uuid.uuid4().hex[:12]}',
+        'type': 'message',
+        'role': 'assistant',
+        'model': model,
+        'content': [{'type': 'text', 'text': text}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': {'input_tokens': input_tokens, 'output_tokens': len(text) // 4}
+    }
+
+
+def stream_events(text, model, input_tokens):
+    """
+    (event, data) pairs streaming a reply the way the Messages API does,
+    one text delta per token
+    """
+    message = message_response('', model, input_tokens)
+    message['stop_reason'] = None
+    message['usage']['output_tokens'] = 1
+    yield 'message_start', {'type': 'message_start', 'message': message}
+    yield 'content_block_start', {'type': 'content_block_start', 'index': 0,
+                                  'content_block': {'type': 'text', 'text': ''}}
+    for start in range(0, len(text), TOKEN_CHARS):
+        yield 'content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                      'delta': {'type': 'text_delta', 'text': text[start:start + TOKEN_CHARS]}}
+    yield 'content_block_stop', {'type': 'content_block_stop', 'index': 0}
+    yield 'message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                            'usage': {'output_tokens': len(text) // 4}}
+    yield 'message_stop', {'type': 'message_stop'}
+
+
+def fake_reply(prompt):
+    """
+    Reply text for a prompt - a JSON array for packed multi-property prompts
+    """
+    insights = fake_insights(prompt)
+    property_ids = PACKED_ID_PATTERN.findall(prompt)
+    if not property_ids:
+        return json.dumps(insights)
+    return json.dumps([dict(insights, id=property_id) for property_id in property_ids])
+
+
+class FaultInjector:
+    """
+    Decides which requests misbehave. Seeded, so a run can be repeated.
+    """
+
+    def __init__(self, error_rate=0.0, error_status=529, slow_rate=0.0, slow_latency=10.0, malformed_rate=0.0,
+                 fail_first=0, seed=0):
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.malformed_rate = malformed_rate
+        self.fail_first = fail_first
+        self.counts = {'error': 0, 'slow': 0, 'malformed': 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pick(self, request_number):
+        """
+        'error', 'slow', 'malformed' or None for the n-th request (from 1)
+        """
+        with self._lock:
+            fault = 'error' if request_number <= self.fail_first else None
+            roll = self._rng.random()
+            if fault is None:
+                for name, rate in (('error', self.error_rate), ('slow', self.slow_rate),
+                                   ('malformed', self.malformed_rate)):
+                    if roll < rate:
+                        fault = name
+                        break
+                    roll -= rate
+            if fault:
+                self.counts[fault] += 1
+            return fault
+
+
+class MockClaudeHandler(BaseHTTPRequestHandler):
+    """
+    Handles POST /v1/messages with a canned pricing reply
+    """
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting (e.g. a slow reply past its deadline)
+            pass
+
+    def _send_stream(self, events):
+        """
+        Send server-sent events, paced by the token delay
+        """
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            for event, data in events:
+                if event == 'content_block_delta' and self.server.token_delay:
+                    time.sleep(self.server.token_delay)
+                self.wfile.write(f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/v1/messages':
+            self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': 'Not found'}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        prompt = ''.join(
+            message['content'] if isinstance(message['content'], str)
+            else ''.join(block.get('text', '') for block in message['content'])
+            for message in request.get('messages', [])
+        )
+
+        with self.server.lock:
+            self.server.request_count += 1
+            request_number = self.server.request_count
+            self.server.in_flight += 1
+            self.server.peak_in_flight = max(self.server.peak_in_flight, self.server.in_flight)
+        try:
+            self._reply(request, prompt, request_number)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def _reply(self, request, prompt, request_number):
+        """
+        Answer a messages request, misbehaving if the fault injector says so
+        """
+        fault = self.server.faults.pick(request_number)
+        if fault == 'error':
+            status = self.server.faults.error_status
+            error_type = ERROR_TYPES.get(status, 'api_error')
+            self._send_json(status, {'type': 'error', 'error': {'type': error_type, 'message': 'Injected fault'}})
+            return
+
+        latency = self.server.faults.slow_latency if fault == 'slow' else self.server.latency
+        if latency:
+            time.sleep(latency)
+
+        text = fake_reply(prompt) if fault != 'malformed' else 'Sorry, I had trouble formatting that {"recommended'
+        model = request.get('model', 'mock')
+        if request.get('stream'):
+            self._send_stream(stream_events(text, model, len(prompt) // 4))
+            return
+
+        # The whole reply has to be written before any of it is sent
+        if self.server.token_delay:
+            time.sleep(self.server.token_delay * -(-len(text) // TOKEN_CHARS))
+        self._send_json(200, message_response(text, model, len(prompt) // 4))
+
+
+def start_mock_server(port=0, latency=0.0, verbose=False, faults=None, token_delay=0.0):
+    """
+    Start the mock server on a background thread. Returns (server, base_url).
+    `faults` is a FaultInjector; server.faults.counts says what was injected
+    and server.peak_in_flight the most requests handled at once.
+    `latency` is the wait before a reply starts, `token_delay` the time
+    taken to write each token of it.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockClaudeHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.token_delay = token_delay
+    server.faults = faults or FaultInjector()
+    server.verbose = verbose
+    server.request_count = 0
+    # Requests being answered right now, and the most there have been at once
+    server.in_flight = 0
+    server.peak_in_flight = 0
+    server.lock = threading.Lock()
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock Claude Messages API')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each reply')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds to write each token of a reply')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests that get an error')
+    parser.add_argument('--error-status', type=int, default=529, help='Status code for injected errors')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Share of requests answered slowly')
+    parser.add_argument('--slow-latency', type=float, default=10.0, help='Seconds a slow request takes')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Share of replies that are not JSON')
+    parser.add_argument('--fail-first', type=int, default=0, help='Fail this many requests before anything else')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    faults = FaultInjector(args.error_rate, args.error_status, args.slow_rate, args.slow_latency,
+                           args.malformed_rate, args.fail_first, args.seed)
+    server, url = start_mock_server(args.port, args.latency, verbose=True, faults=faults,
+                                    token_delay=args.token_delay)
+    print(f"🤖 Mock Claude API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
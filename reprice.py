@@ -0,0 +1,269 @@
+"""
+Batch repricer - prices every property in a CSV or JSONL file and streams
+the results to an output file, without the Streamlit app.
+
+    python3 reprice.py properties.csv priced.csv
+    python3 reprice.py properties.jsonl priced.jsonl --workers 4 --with-ai
+    python3 reprice.py properties.csv priced.csv --resume    # after a crash
+
+Input rows need location, property_type and bedrooms; has_parking,
+has_wifi and pet_friendly are optional. Rows are read, priced and written
+a chunk at a time, so memory use doesn't grow with the input. After each
+chunk is written, a checkpoint file (<output>.checkpoint) records how far
+we got, and --resume carries on from there.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.data_handler import is_flag_set
+from src.pricing_engine import get_portfolio_stats, get_segment_stats, price_portfolio
+from src.segment_stats import get_stats_cube
+
+AMENITY_DEFAULTS = {'has_parking': False, 'has_wifi': True, 'pet_friendly': False}
+RESULT_FIELDS = ['price', 'confidence', 'reasoning', 'exact_count', 'similar_count']
+AI_FIELDS = ['ai_recommended_price', 'ai_positioning', 'ai_reasoning', 'ai_tips']
+
+
+def is_jsonl(path):
+    return path.endswith('.jsonl') or path.endswith('.ndjson')
+
+
+def read_chunks(path, chunk_size, skip=0):
+    """
+    Yield lists of input records, skipping the first `skip` rows
+    """
+    with open(path, newline='') as f:
+        records = (json.loads(line) for line in f if line.strip()) if is_jsonl(path) else csv.DictReader(f)
+
+        chunk = []
+        for position, record in enumerate(records):
+            if position < skip:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def property_details(record):
+    """
+    Property details in the shape the pricing engine expects
+    """
+    details = {
+        'location': record['location'],
+        'property_type': record['property_type'],
+        'bedrooms': int(float(record['bedrooms']))
+    }
+    for amenity, default in AMENITY_DEFAULTS.items():
+        value = record.get(amenity)
+        details[amenity] = default if value in (None, '') else is_flag_set(value)
+    return details
+
+
+def price_chunk(records, with_ai=False, ai_concurrency=8):
+    """
+    Price a chunk of records with the engine (runs in a worker process)
+    """
+    results = []
+    valid = []
+
+    for record in records:
+        row = dict(record)
+        try:
+            details = property_details(record)
+        except (KeyError, ValueError) as e:
+            row.update(price=None, confidence='Low', reasoning=f"Invalid input: {e}",
+                       exact_count=0, similar_count=0)
+            results.append(row)
+            continue
+        results.append(row)
+        valid.append((len(results) - 1, details))
+
+    # The whole chunk in one go, rather than a stats lookup per row
+    ai_requests = []
+    properties = pd.DataFrame([details for _, details in valid], columns=['location', 'property_type', 'bedrooms'])
+    priced = price_portfolio(properties)
+    for (position, details), recommendation in zip(valid, priced.to_dict('records')):
+        if pd.isna(recommendation['price']):
+            recommendation['price'] = None
+        results[position].update(recommendation)
+
+        if with_ai and recommendation['price'] is not None:
+            ai_requests.append((position, details, recommendation))
+
+    if with_ai:
+        from src.llm_analyzer import get_bulk_ai_pricing_insights
+
+        requests = [
+            (details, get_segment_stats(details['location'], details['property_type'], details['bedrooms']),
+             {key: recommendation[key] for key in ('price', 'confidence', 'reasoning')})
+            for _, details, recommendation in ai_requests
+        ]
+        insights = get_bulk_ai_pricing_insights(requests, concurrency=ai_concurrency)
+        for (position, _, _), ai_insights in zip(ai_requests, insights):
+            if ai_insights:
+                results[position].update(
+                    ai_recommended_price=ai_insights.get('recommended_price'),
+                    ai_positioning=ai_insights.get('positioning'),
+                    ai_reasoning=ai_insights.get('reasoning'),
+                    ai_tips=ai_insights.get('tips')
+                )
+
+    return results
+
+
+def priced_chunks(chunks, workers, with_ai, ai_concurrency):
+    """
+    Price chunks in order, with at most a couple of chunks per worker in flight
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield price_chunk(chunk, with_ai, ai_concurrency)
+        return
+
+    # Aggregate the competitor data once, here, rather than in every worker:
+    # forked workers inherit it, and others load the saved stats cube
+    get_portfolio_stats()
+    if with_ai:
+        get_stats_cube()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(price_chunk, chunk, with_ai, ai_concurrency))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+class ResultWriter:
+    """
+    Appends priced rows to a CSV or JSONL file
+    """
+
+    def __init__(self, path, fieldnames, append):
+        self.path = path
+        self.jsonl = is_jsonl(path)
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.csv = None
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.file, fieldnames=fieldnames, extrasaction='ignore')
+            if not append or self.file.tell() == 0:
+                self.csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self.file.write(json.dumps(row) + '\n')
+            else:
+                self.csv.writerow({
+                    key: json.dumps(value) if isinstance(value, list) else value
+                    for key, value in row.items()
+                })
+        # Make sure the rows are on disk before the checkpoint says so
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def input_fieldnames(path):
+    """
+    Column names of the input, for the CSV output header
+    """
+    if is_jsonl(path):
+        for chunk in read_chunks(path, 1):
+            return list(chunk[0])
+        return []
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def reprice(input_path, output_path, workers=1, with_ai=False, resume=False, chunk_size=1000,
+            ai_concurrency=8, progress=None):
+    """
+    Price every property in input_path and stream the results to output_path
+    """
+    checkpoint_path = output_path + '.checkpoint'
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+    if checkpoint and checkpoint.get('input') != os.path.abspath(input_path):
+        raise ValueError(f"Checkpoint {checkpoint_path} is for a different input file")
+
+    rows_done = checkpoint['rows_done'] if checkpoint else 0
+    if checkpoint:
+        # Drop anything written after the last checkpoint
+        with open(output_path, 'r+b') as f:
+            f.truncate(checkpoint['output_bytes'])
+
+    fieldnames = input_fieldnames(input_path) + RESULT_FIELDS + (AI_FIELDS if with_ai else [])
+    writer = ResultWriter(output_path, fieldnames, append=bool(checkpoint))
+
+    started = time.perf_counter()
+    rows_this_run = 0
+    try:
+        chunks = read_chunks(input_path, chunk_size, skip=rows_done)
+        for rows in priced_chunks(chunks, workers, with_ai, ai_concurrency):
+            output_bytes = writer.write(rows)
+            rows_done += len(rows)
+            rows_this_run += len(rows)
+            save_checkpoint(checkpoint_path, {
+                'input': os.path.abspath(input_path),
+                'rows_done': rows_done,
+                'output_bytes': output_bytes
+            })
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(rows_done, rows_this_run / elapsed if elapsed else 0.0)
+    finally:
+        writer.close()
+
+    # Finished - the checkpoint is no longer needed
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return rows_done
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reprice a file of properties')
+    parser.add_argument('input', help='CSV or JSONL of properties')
+    parser.add_argument('output', help='CSV or JSONL file to write results to')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+    parser.add_argument('--with-ai', action='store_true', help='Add Claude pricing insights')
+    parser.add_argument('--resume', action='store_true', help='Carry on from the last checkpoint')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per chunk')
+    parser.add_argument('--ai-concurrency', type=int, default=8, help='Claude calls in flight per worker')
+    args = parser.parse_args()
+
+    def show_progress(rows_done, rows_per_sec):
+        print(f"\r  {rows_done:,} rows priced ({rows_per_sec:,.0f} rows/sec)", end='', file=sys.stderr)
+
+    total = reprice(args.input, args.output, workers=args.workers, with_ai=args.with_ai, resume=args.resume,
+                    chunk_size=args.chunk_size, ai_concurrency=args.ai_concurrency, progress=show_progress)
+    print(f"\n✅ Priced {total:,} properties into {args.output}", file=sys.stderr)
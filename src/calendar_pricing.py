@@ -0,0 +1,405 @@
+"""
+Year-ahead nightly price calendars, chosen to maximise expected revenue.
+
+    python3 -m src.calendar_pricing properties.csv calendar.csv --start 2026-01-01
+
+Seasonal, weekday and event multipliers are learned from the competitor
+rates (CalendarModel) and turn each property's base price into a market
+rate for every night. price_calendar then scores a grid of candidate
+prices for every property and night against an occupancy curve for its
+segment and keeps the one with the highest expected revenue - as NumPy
+arrays over properties x nights x candidates, so a whole portfolio is
+priced in one pass rather than a night at a time.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_handler import EXACT_KEYS, get_competitor_source
+from src.metrics import span
+from src.pricing_engine import generate_base_recommendation, get_segment_stats
+
+NIGHTS = 365
+
+# Candidate prices for each night, as multiples of that night's market rate
+PRICE_STEPS = np.round(np.arange(0.6, 1.6001, 0.025), 3)
+
+# Occupancy curve for segments without their own: the share of nights
+# booked at the market rate, and how bookings respond to price around it
+# (-1.2: 10% dearer, 12% fewer bookings)
+DEFAULT_OCCUPANCY = 0.7
+DEFAULT_ELASTICITY = -1.2
+
+# Months, weekdays and dates seen for only a few listings are pulled
+# towards 1, as if this many more listings had been priced at the average
+SHRINKAGE = 50
+
+# A date is an event if it is priced this much above what its month and
+# weekday explain, across at least this many listings
+EVENT_MIN_UPLIFT = 0.1
+EVENT_MIN_LISTINGS = 10
+
+# Rounds of fitting season, weekday and events in turn, so long events
+# (a month-long festival) aren't mistaken for the season
+FIT_PASSES = 4
+
+# With dates to learn events from, the season is a smooth yearly cycle -
+# this many harmonics - and anything sharper is left for the events
+SEASON_HARMONICS = 2
+
+# Properties priced at a time - bounds the properties x nights x candidates arrays
+CHUNK_PROPERTIES = 256
+
+# First day of each month in a leap year, so every date has a slot that
+# lines up from one year to the next
+LEAP_MONTH_STARTS = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+def leap_day_of_year(dates):
+    """
+    Day of the year (0-365) counting 29 February in every year
+    """
+    return LEAP_MONTH_STARTS[dates.month.to_numpy() - 1] + dates.day.to_numpy() - 1
+
+
+def _shrunk_ratios(keys, values, size):
+    """
+    Average of values for each key, shrunk towards 1, and how many there were
+    """
+    sums = np.bincount(keys, weights=values, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    return (sums + SHRINKAGE) / (counts + SHRINKAGE), counts
+
+
+def _smooth_season(season, harmonics=SEASON_HARMONICS):
+    """
+    Least-squares fit of each row of monthly multipliers to a smooth
+    yearly cycle (in logs, so it stays positive)
+    """
+    angle = 2 * np.pi * np.arange(12) / 12
+    design = np.column_stack([np.ones(12)] + [
+        wave(k * angle) for k in range(1, harmonics + 1) for wave in (np.cos, np.sin)
+    ])
+    coefficients, *_ = np.linalg.lstsq(design, np.log(season).T, rcond=None)
+    return np.exp(design @ coefficients).T
+
+
+class CalendarModel:
+    """
+    Seasonal, weekday and event price multipliers for each location,
+    learned from competitor rates.
+
+    Each rate is compared with its segment's average, so the mix of
+    segments doesn't matter. Month multipliers need a `month` (1-12) or
+    `date` (YYYY-MM-DD) column; weekday and event multipliers need
+    `date`. Without them the multipliers are all 1. Events are dates
+    priced well above what their month and weekday explain, and recur on
+    the same day each year.
+
+    Row 0 of each multiplier table is for locations with no competitor
+    data, and is all 1.
+    """
+
+    def __init__(self):
+        self.locations = pd.Index([])
+        self.season = np.ones((1, 12))
+        self.weekday = np.ones((1, 7))
+        self.events = np.ones((1, 366))
+        # Which of 'season', 'weekday' and 'events' the data could support
+        self.learned = []
+
+    def fit(self, competitors):
+        """
+        Learn the multipliers from a competitor frame
+        """
+        if 'date' in competitors:
+            date_codes, unique_dates = pd.factorize(competitors['date'])
+            known = date_codes >= 0
+            # Only the distinct dates are parsed, however many rows there are
+            parsed = pd.DatetimeIndex(pd.to_datetime(unique_dates))
+            date_codes = date_codes[known]
+            month = parsed.month.to_numpy()[date_codes] - 1
+            weekday = parsed.dayofweek.to_numpy()[date_codes]
+            day = leap_day_of_year(parsed)[date_codes]
+            self.learned = ['season', 'weekday', 'events']
+        elif 'month' in competitors:
+            month = pd.to_numeric(competitors['month'], errors='coerce').to_numpy(dtype=np.float64)
+            known = ~np.isnan(month)
+            month = month[known].astype(np.int64) - 1
+            weekday = day = None
+            self.learned = ['season']
+        else:
+            self.learned = []
+            return self
+
+        rates = competitors['nightly_rate'].to_numpy(dtype=np.float64)
+        segment_avg = competitors.groupby(EXACT_KEYS, sort=False, observed=True)['nightly_rate'] \
+            .transform('mean').to_numpy(dtype=np.float64)
+        relative = (rates / segment_avg)[known]
+
+        location_codes, self.locations = pd.factorize(competitors['location'])
+        location = location_codes[known] + 1
+        rows = len(self.locations) + 1
+
+        season = np.ones((rows, 12))
+        weekdays = np.ones((rows, 7))
+        events = np.ones((rows, 366))
+        for _ in range(FIT_PASSES):
+            others = 1 if day is None else weekdays[location, weekday] * events[location, day]
+            season, _ = _shrunk_ratios(location * 12 + month, relative / others, rows * 12)
+            season = season.reshape(rows, 12)
+            if day is None:
+                season /= season.mean(axis=1, keepdims=True)
+                break
+            season = _smooth_season(season)
+            season /= season.mean(axis=1, keepdims=True)
+
+            weekdays, _ = _shrunk_ratios(location * 7 + weekday,
+                                         relative / (season[location, month] * events[location, day]), rows * 7)
+            weekdays = weekdays.reshape(rows, 7)
+            weekdays /= weekdays.mean(axis=1, keepdims=True)
+
+            uplift, counts = _shrunk_ratios(location * 366 + day,
+                                            relative / (season[location, month] * weekdays[location, weekday]),
+                                            rows * 366)
+            is_event = (uplift >= 1 + EVENT_MIN_UPLIFT) & (counts >= EVENT_MIN_LISTINGS)
+            events = np.where(is_event, uplift, 1).reshape(rows, 366)
+
+        self.season, self.weekday, self.events = season, weekdays, events
+        return self
+
+    def location_rows(self, locations):
+        """
+        Multiplier table row for each location (0 for ones with no data)
+        """
+        return self.locations.get_indexer(pd.Index(locations)) + 1
+
+    def multipliers(self, dates):
+        """
+        Price multiplier for every location row and night - a
+        (locations + 1) x len(dates) array
+        """
+        dates = pd.DatetimeIndex(dates)
+        return (self.season[:, dates.month.to_numpy() - 1]
+                * self.weekday[:, dates.dayofweek.to_numpy()]
+                * self.events[:, leap_day_of_year(dates)])
+
+
+def expected_occupancy(price, market_rate, occupancy, elasticity):
+    """
+    Share of nights booked at `price`, on a straight-line demand curve
+    through `occupancy` at the market rate with slope set by `elasticity`
+    """
+    return np.clip(occupancy * (1 + elasticity * (price / market_rate - 1)), 0, 1)
+
+
+def _read_competitors():
+    source = get_competitor_source()
+    # Reading the version loads the data, so its columns are known
+    source.version
+    dated = [col for col in ('date', 'month') if col in source.columns]
+    return source.read(columns=EXACT_KEYS + ['nightly_rate'] + dated)
+
+
+# Shared model for the current competitor data
+_model = None
+
+
+def get_calendar_model():
+    """
+    Get the shared calendar model, refitting it if the competitor data changed
+    """
+    global _model
+
+    version = get_competitor_source().version
+    if _model is None or _model.version != version:
+        with span('fit_calendar'):
+            model = CalendarModel().fit(_read_competitors())
+        model.version = version
+        _model = model
+
+    return _model
+
+
+def base_prices(properties_df):
+    """
+    generate_base_recommendation's price and confidence for each
+    property, worked out once per segment from the stats cube
+    """
+    segments = properties_df[EXACT_KEYS].drop_duplicates()
+    recommendations = [
+        generate_base_recommendation(get_segment_stats(location, property_type, bedrooms))
+        for location, property_type, bedrooms in segments.itertuples(index=False)
+    ]
+    segments = segments.assign(
+        price=np.array([item['price'] for item in recommendations], dtype=np.float64),
+        confidence=[item['confidence'] for item in recommendations]
+    )
+    return properties_df[EXACT_KEYS].merge(segments, on=EXACT_KEYS, how='left')
+
+
+def _segment_curves(properties_df, curves):
+    """
+    Occupancy and elasticity arrays for each property
+    """
+    if curves is None:
+        shape = len(properties_df)
+        return np.full(shape, DEFAULT_OCCUPANCY), np.full(shape, DEFAULT_ELASTICITY)
+
+    curves = curves[EXACT_KEYS + ['occupancy', 'elasticity']].drop_duplicates(EXACT_KEYS)
+    merged = properties_df[EXACT_KEYS].merge(curves, on=EXACT_KEYS, how='left')
+    return (merged['occupancy'].fillna(DEFAULT_OCCUPANCY).to_numpy(dtype=np.float64),
+            merged['elasticity'].fillna(DEFAULT_ELASTICITY).to_numpy(dtype=np.float64))
+
+
+def _price_limit(properties_df, column, default):
+    if column not in properties_df:
+        return np.full(len(properties_df), default)
+    return pd.to_numeric(properties_df[column], errors='coerce').fillna(default).to_numpy(dtype=np.float64)
+
+
+@span('calendar')
+def price_calendar(properties_df, start=None, nights=NIGHTS, curves=None, prices=None, steps=PRICE_STEPS,
+                   model=None):
+    """
+    Nightly prices for each property for `nights` nights from `start`
+    (default today), chosen to maximise expected revenue.
+
+    properties_df needs location, property_type and bedrooms columns, and
+    may have min_price and max_price to keep each property's prices
+    within. A night's market rate is the property's base price
+    (generate_base_recommendation's, or `prices` if given) times its
+    location's season, weekday and event multipliers. Every candidate
+    price - each of `steps` times the market rate, to the whole pound -
+    is scored as price x expected_occupancy, and the best one kept.
+
+    `curves` is a frame of location, property_type, bedrooms, occupancy
+    (share of nights booked at the market rate) and elasticity, e.g.
+    from your own booking history; other segments use DEFAULT_OCCUPANCY
+    and DEFAULT_ELASTICITY.
+
+    Returns a dict with:
+    - dates: the nights
+    - price, market_rate, occupancy, revenue: properties x nights arrays
+      (NaN for properties with no competitor data)
+    - summary: a DataFrame, indexed like properties_df, of the base price
+      and confidence, average price and occupancy, total revenue, and the
+      revenue the base price would make charged every night (flat_revenue)
+      and the uplift over it
+    """
+    model = model or get_calendar_model()
+    dates = pd.date_range(pd.Timestamp(start or pd.Timestamp.today()).normalize(), periods=nights)
+
+    if prices is None:
+        base = base_prices(properties_df)
+    else:
+        base = pd.DataFrame({'price': np.asarray(prices, dtype=np.float64), 'confidence': None})
+    base_price = base['price'].to_numpy(dtype=np.float64)
+
+    rows = model.location_rows(properties_df['location'])
+    market_rate = base_price[:, None] * model.multipliers(dates)[rows]
+    occupancy, elasticity = _segment_curves(properties_df, curves)
+    lowest = _price_limit(properties_df, 'min_price', 0)
+    highest = _price_limit(properties_df, 'max_price', np.inf)
+    steps = np.asarray(steps, dtype=np.float64)
+
+    price = np.empty_like(market_rate)
+    booked = np.empty_like(market_rate)
+    for first in range(0, len(properties_df), CHUNK_PROPERTIES):
+        chunk = slice(first, first + CHUNK_PROPERTIES)
+        market = market_rate[chunk, :, None]
+        # properties x nights x candidates
+        candidates = np.clip(np.rint(market * steps), lowest[chunk, None, None], highest[chunk, None, None])
+        expected = expected_occupancy(candidates, market, occupancy[chunk, None, None], elasticity[chunk, None, None])
+        best = np.argmax(candidates * expected, axis=2)[:, :, None]
+        price[chunk] = np.take_along_axis(candidates, best, axis=2)[:, :, 0]
+        booked[chunk] = np.take_along_axis(expected, best, axis=2)[:, :, 0]
+    revenue = price * booked
+
+    # The single static rate (within the same limits), for comparison
+    flat_price = np.clip(base_price, lowest, highest)[:, None]
+    flat_revenue = (flat_price * expected_occupancy(
+        flat_price, market_rate, occupancy[:, None], elasticity[:, None]
+    )).sum(axis=1)
+
+    summary = pd.DataFrame({
+        'base_price': base_price,
+        'confidence': base['confidence'].to_numpy(),
+        'avg_price': price.mean(axis=1),
+        'min_price': price.min(axis=1),
+        'max_price': price.max(axis=1),
+        'occupancy': booked.mean(axis=1),
+        'revenue': revenue.sum(axis=1),
+        'flat_revenue': flat_revenue
+    }, index=properties_df.index)
+    summary['uplift'] = summary['revenue'] / summary['flat_revenue'] - 1
+
+    return {
+        'dates': dates,
+        'price': price,
+        'market_rate': market_rate,
+        'occupancy': booked,
+        'revenue': revenue,
+        'summary': summary
+    }
+
+
+def prepare_calendar_chart_data(calendar, position=0):
+    """
+    One property's calendar (by row position) for plotting, in the style
+    of prepare_chart_data: a row per night for its recommended price and
+    for the market rate, with Date, Price, Type and Details columns
+    """
+    dates = calendar['dates']
+    recommended = pd.DataFrame({
+        'Date': dates,
+        'Price': calendar['price'][position],
+        'Type': 'Recommended',
+        'Details': [f"{share:.0%} expected occupancy" for share in calendar['occupancy'][position]]
+    })
+    market = pd.DataFrame({
+        'Date': dates,
+        'Price': calendar['market_rate'][position],
+        'Type': 'Market Rate',
+        'Details': dates.day_name()
+    })
+    return pd.concat([recommended, market], ignore_index=True)
+
+
+def calendar_frame(calendar, properties_df):
+    """
+    A calendar in long form - one row per property and night
+    """
+    nights = len(calendar['dates'])
+    frame = properties_df[EXACT_KEYS].loc[properties_df.index.repeat(nights)].reset_index(drop=True)
+    frame.insert(0, 'property', np.repeat(properties_df.index.to_numpy(), nights))
+    frame['date'] = np.tile(calendar['dates'].strftime('%Y-%m-%d').to_numpy(), len(properties_df))
+    for column in ['price', 'market_rate', 'occupancy']:
+        frame[column] = calendar[column].ravel().round(4 if column == 'occupancy' else 2)
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build year-ahead price calendars for a portfolio')
+    parser.add_argument('properties', help='CSV with location, property_type, bedrooms (and optional '
+                                           'min_price, max_price)')
+    parser.add_argument('output', help='CSV to write, one row per property and night')
+    parser.add_argument('--start', help='First night (default today)')
+    parser.add_argument('--nights', type=int, default=NIGHTS)
+    parser.add_argument('--curves', help='CSV of location, property_type, bedrooms, occupancy, elasticity')
+    args = parser.parse_args()
+
+    properties = pd.read_csv(args.properties)
+    curves = pd.read_csv(args.curves) if args.curves else None
+
+    started = time.perf_counter()
+    calendar = price_calendar(properties, start=args.start, nights=args.nights, curves=curves)
+    elapsed = time.perf_counter() - started
+    calendar_frame(calendar, properties).to_csv(args.output, index=False)
+
+    summary = calendar['summary']
+    print(f"✅ Priced {len(properties):,} properties x {args.nights} nights in {elapsed:.2f}s -> {args.output}")
+    print(f"   Expected revenue £{summary['revenue'].sum():,.0f} vs £{summary['flat_revenue'].sum():,.0f} "
+          f"at a flat base price ({summary['revenue'].sum() / summary['flat_revenue'].sum() - 1:+.1%})")
@@ -0,0 +1,586 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import span
+
+DATA_PATH = 'data/competitors.csv'
+STORE_PATH = 'data/competitors.store'
+
+# Segment keys used for the two kinds of competitor lookup
+EXACT_KEYS = ['location', 'property_type', 'bedrooms']
+SIMILAR_KEYS = ['location', 'bedrooms']
+
+# Sort order of indexed and stored rows - (location, bedrooms) is the
+# outer key so "similar" lookups are also a single slice
+STORE_SORT_KEYS = ['location', 'bedrooms', 'property_type']
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Hash a file's contents so we can tell if it really changed
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_stamp(path):
+    return _stamp_of(os.stat(path))
+
+
+def _stamp_of(info):
+    return [info.st_mtime_ns, info.st_size]
+
+
+def _read_bytes(path):
+    """
+    A file's contents and the stamp of the version they were read from
+    """
+    with open(path, 'rb') as f:
+        stamp = _stamp_of(os.fstat(f.fileno()))
+        return f.read(), stamp
+
+
+def as_flags(values):
+    """
+    Booleans from a column that may hold bools or 'True'/'False' strings
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_bool_dtype(values):
+        return values.to_numpy()
+    return values.astype(str).str.strip().str.lower().isin(['true', '1', 'yes']).to_numpy()
+
+
+def is_flag_set(value):
+    """
+    as_flags for a single value
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes')
+    return bool(value)
+
+
+def _segment_bounds(sorted_columns, keys):
+    """
+    (key values, start, stop) for each run of equal keys in sorted columns
+    """
+    rows = len(sorted_columns[keys[0]])
+    if rows == 0:
+        return []
+
+    # Segment boundaries - wherever any of the sort keys changes
+    changed = np.zeros(rows - 1, dtype=bool)
+    for key in keys:
+        changed |= sorted_columns[key][1:] != sorted_columns[key][:-1]
+    starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+    stops = np.concatenate([starts[1:], [rows]])
+
+    return [
+        ([sorted_columns[key][start].item() for key in keys], int(start), int(stop))
+        for start, stop in zip(starts, stops)
+    ]
+
+
+# Amenity flags packed into the in-memory 'amenities' bitmask, in bit order
+AMENITY_COLUMNS = ['has_parking', 'has_wifi', 'pet_friendly']
+
+
+class CompetitorIndex:
+    """
+    Competitor data loaded once into a compact in-memory form and indexed
+    by segment for fast lookups.
+
+    Strings are held as categorical codes, bedrooms as a small int, rates
+    as whole pence and the amenity flags as one bitmask. Rows are indexed
+    by sorting on the (location, bedrooms, property_type) codes, so a
+    lookup encodes the query to codes and takes one slice of row
+    positions. Rows are only turned back into the usual frame (strings,
+    bools, float rates) when they are returned.
+
+    The data file is checked on every lookup and reloaded if it changed.
+    """
+
+    def __init__(self, path=DATA_PATH):
+        self.path = path
+        self.data = None
+        self.columns = []
+        self.dtypes = {}
+        self.amenities = []
+        self.rates_in_pence = False
+        self._stamp = None
+        self._hash = None
+
+    @span('load_data')
+    def load(self):
+        """
+        Read the data file, pack it and build the segment index
+        """
+        # One read for the stamp, hash and parse, so all three describe the
+        # same contents even if the file is replaced while we load it
+        contents, stamp = _read_bytes(self.path)
+        digest = hashlib.sha256(contents).hexdigest()
+        df = pd.read_csv(io.BytesIO(contents))
+        del contents
+
+        self.columns = list(df.columns)
+        self.dtypes = df.dtypes.to_dict()
+        self.data = self.compact(df)
+        del df
+
+        # Plain arrays behind each column, and the category lookup tables,
+        # so expanding rows skips pandas' per-column indexing
+        self._arrays = {}
+        self._categories = {}
+        for col in self.data.columns:
+            series = self.data[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self._categories[col] = series.cat.categories
+                self._arrays[col] = series.cat.codes.to_numpy()
+            else:
+                self._arrays[col] = series.to_numpy()
+
+        # Row positions sorted by segment (stable, so file order within
+        # each segment), and the slice of that order for each segment
+        codes = {key: self._arrays[key] for key in STORE_SORT_KEYS}
+        self._order = np.lexsort([codes[key] for key in reversed(STORE_SORT_KEYS)]).astype(np.int64)
+        sorted_codes = {key: values[self._order] for key, values in codes.items()}
+
+        self._codes = {
+            col: {value: code for code, value in enumerate(self.data[col].cat.categories)}
+            for col in ['location', 'property_type']
+        }
+        self._segments = {}
+        self._areas = {}
+        for (location, bedrooms, property_type), start, stop in _segment_bounds(sorted_codes, STORE_SORT_KEYS):
+            self._segments[(location, bedrooms, property_type)] = (start, stop)
+            area_start, area_stop = self._areas.get((location, bedrooms), (start, stop))
+            self._areas[(location, bedrooms)] = (min(area_start, start), max(area_stop, stop))
+
+        self._stamp = stamp
+        self._hash = digest
+
+    def compact(self, df):
+        """
+        The compact form of a competitor frame
+        """
+        data = {}
+        for col in df.columns:
+            values = df[col]
+            if col in AMENITY_COLUMNS:
+                continue
+            if col == 'nightly_rate':
+                # Whole pence is exact for prices with up to 2 decimal places
+                pence = values.to_numpy(dtype=np.float64) * 100
+                self.rates_in_pence = bool(np.all(np.abs(pence - np.rint(pence)) < 1e-6))
+                data[col] = np.rint(pence).astype(np.int32) if self.rates_in_pence else values
+            elif pd.api.types.is_integer_dtype(values):
+                data[col] = pd.to_numeric(values, downcast='integer')
+            elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                data[col] = values
+            else:
+                data[col] = values.astype('category')
+
+        self.amenities = [col for col in AMENITY_COLUMNS if col in df.columns]
+        if self.amenities:
+            mask = np.zeros(len(df), dtype=np.uint8)
+            for col in self.amenities:
+                mask |= as_flags(df[col]).astype(np.uint8) << AMENITY_COLUMNS.index(col)
+            data['amenities'] = mask
+
+        return pd.DataFrame(data)
+
+    def expand(self, positions=None, columns=None):
+        """
+        Rows (all, or at positions) back in the original columns and types
+        """
+        if columns is None:
+            columns = self.columns
+
+        data = {}
+        for col in columns:
+            if col in self.amenities:
+                mask = self._arrays['amenities']
+                values = (mask if positions is None else mask[positions]) >> AMENITY_COLUMNS.index(col) & 1
+                data[col] = values.astype(bool)
+                continue
+
+            values = self._arrays[col] if positions is None else self._arrays[col][positions]
+            if col in self._categories:
+                # Straight from codes to the original string type
+                values = self._categories[col].take(values, allow_fill=True, fill_value=np.nan).array
+            elif col == 'nightly_rate' and self.rates_in_pence:
+                values = values / 100
+            if values.dtype != self.dtypes[col]:
+                values = pd.array(values, dtype=self.dtypes[col])
+            data[col] = values
+
+        index = pd.RangeIndex(len(self.data)) if positions is None else pd.Index(positions)
+        return pd.DataFrame(data, index=index, columns=list(columns), copy=False)
+
+    def memory_usage(self):
+        """
+        Bytes held by the compact data and the segment index
+        """
+        return int(self.data.memory_usage(deep=True).sum() + self._order.nbytes)
+
+    def refresh(self):
+        """
+        Reload the data if the file has changed since the last load
+        """
+        if self.data is None:
+            self.load()
+            return True
+
+        stamp = _file_stamp(self.path)
+        if stamp == self._stamp:
+            return False
+
+        # mtime/size changed - only reload if the contents did too
+        if file_hash(self.path) == self._hash:
+            self._stamp = stamp
+            return False
+
+        self.load()
+        return True
+
+    @property
+    def version(self):
+        """
+        Content hash of the data currently loaded
+        """
+        self.refresh()
+        return self._hash
+
+    def _positions(self, location, property_type, bedrooms):
+        """
+        Row positions (in file order) for a segment, or for the whole area
+        if property_type is None
+        """
+        location_code = self._codes['location'].get(location)
+        if property_type is None:
+            found = self._areas.get((location_code, bedrooms))
+        else:
+            type_code = self._codes['property_type'].get(property_type)
+            found = self._segments.get((location_code, bedrooms, type_code))
+        if found is None:
+            return np.array([], dtype=np.int64)
+
+        positions = self._order[found[0]:found[1]]
+        # An area spans several property types - put its rows back in file order
+        return np.sort(positions) if property_type is None else positions
+
+    def read(self, columns=None):
+        """
+        Get the whole competitor frame, optionally just some columns
+        """
+        self.refresh()
+        return self.expand(columns=columns)
+
+    def lookup(self, location, property_type, bedrooms, columns=None):
+        """
+        Get exact matches and similar properties for a segment
+        """
+        self.refresh()
+
+        exact_matches = self.expand(self._positions(location, property_type, bedrooms), columns)
+        similar = self.expand(self._positions(location, None, bedrooms), columns)
+
+        return exact_matches, similar
+
+
+# One shared index per data file
+_indexes = {}
+
+
+def get_competitor_index(path=DATA_PATH):
+    """
+    Get the shared competitor index for a data file
+    """
+    if path not in _indexes:
+        _indexes[path] = CompetitorIndex(path)
+    return _indexes[path]
+
+
+# ============================================
+# COLUMNAR STORE
+# ============================================
+#
+# The CSV is converted once into a directory of memory-mapped NumPy
+# column files. Rows are sorted by (location, bedrooms, property_type) so
+# every segment is one contiguous slice, and string columns are stored as
+# categorical codes. Reads only touch the columns and slices they need.
+
+ROW_ID = '_row_id'
+
+
+@span('build_store')
+def build_columnar_store(csv_path=DATA_PATH, store_path=STORE_PATH):
+    """
+    Convert the competitor CSV into memory-mapped column files
+    """
+    contents, stamp = _read_bytes(csv_path)
+    df = pd.read_csv(io.BytesIO(contents))
+    return write_columnar_store(df, store_path, hashlib.sha256(contents).hexdigest(), stamp)
+
+
+def write_columnar_store(df, store_path=STORE_PATH, source_hash=None, source_stamp=None):
+    """
+    Write a frame of competitor data as a columnar store. source_hash is
+    the store's version - the hash of the CSV it came from, or any string
+    that changes whenever the data does.
+    """
+    meta = {
+        'source_hash': source_hash,
+        'source_stamp': source_stamp,
+        'rows': len(df),
+        'columns': list(df.columns),
+        'categories': {},
+        'segments': [],
+    }
+
+    # Strings become small integer codes plus a lookup table
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            columns[col] = values.to_numpy()
+        else:
+            categorical = pd.Categorical(values)
+            meta['categories'][col] = [str(c) for c in categorical.categories]
+            columns[col] = categorical.codes.astype(np.int32)
+    columns[ROW_ID] = np.arange(len(df), dtype=np.int64)
+
+    # Stable sort so rows keep file order within each segment
+    sort_keys = [columns[key] for key in reversed(STORE_SORT_KEYS)]
+    order = np.lexsort(sort_keys)
+    for col in columns:
+        columns[col] = columns[col][order]
+
+    for key, start, stop in _segment_bounds(columns, STORE_SORT_KEYS):
+        meta['segments'].append(key + [start, stop])
+
+    # Write to a temporary directory then swap it in
+    tmp_path = start_columnar_store(store_path)
+    for col, values in columns.items():
+        np.save(os.path.join(tmp_path, f'{col}.npy'), values)
+    return finish_columnar_store(tmp_path, store_path, meta)
+
+
+def start_columnar_store(store_path=STORE_PATH):
+    """
+    Make an empty temporary directory to write a new store's column files into
+    """
+    tmp_path = store_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    return tmp_path
+
+
+def finish_columnar_store(tmp_path, store_path, meta):
+    """
+    Add the metadata to a store written in tmp_path and swap it in for
+    any store already at store_path
+    """
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(tmp_path, store_path)
+
+    return ColumnarStore(store_path)
+
+
+class ColumnarStore:
+    """
+    Read-only view of a columnar competitor store.
+
+    Supports column projection and filtering on location, property_type
+    and bedrooms without reading the rest of the data.
+    """
+
+    def __init__(self, store_path=STORE_PATH):
+        self.path = store_path
+        with open(os.path.join(store_path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.columns = self.meta['columns']
+        self.version = self.meta['source_hash']
+        self._arrays = {}
+        # The CSV stamp last checked against source_hash, and whether it matched
+        self._checked_stamp = self.meta['source_stamp']
+        self._checked_result = True
+
+        # value -> code for each categorical column
+        self._codes = {
+            col: {value: code for code, value in enumerate(categories)}
+            for col, categories in self.meta['categories'].items()
+        }
+
+        # (location, bedrooms, property_type) -> slice, and the
+        # (location, bedrooms) slice that contains all the types
+        self._segments = {}
+        self._areas = {}
+        for location, bedrooms, property_type, start, stop in self.meta['segments']:
+            self._segments[(location, bedrooms, property_type)] = (start, stop)
+            area_start, area_stop = self._areas.get((location, bedrooms), (start, stop))
+            self._areas[(location, bedrooms)] = (min(area_start, start), max(area_stop, stop))
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def _column(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def _encode(self, col, value):
+        if col in self._codes:
+            return self._codes[col].get(value)
+        return value
+
+    def _ranges(self, location=None, property_type=None, bedrooms=None):
+        """
+        Work out which row slices match the filters
+        """
+        filters = {'location': location, 'property_type': property_type, 'bedrooms': bedrooms}
+        encoded = {}
+        for col, value in filters.items():
+            if value is None:
+                continue
+            code = self._encode(col, value)
+            if code is None:
+                return []
+            encoded[col] = code
+
+        # Fast paths for the lookups the pricing engine makes
+        if 'location' in encoded and 'bedrooms' in encoded:
+            if 'property_type' in encoded:
+                key = (encoded['location'], encoded['bedrooms'], encoded['property_type'])
+                found = self._segments.get(key)
+            else:
+                found = self._areas.get((encoded['location'], encoded['bedrooms']))
+            return [found] if found else []
+
+        ranges = []
+        for (location_code, bedrooms_value, type_code), (start, stop) in self._segments.items():
+            if encoded.get('location', location_code) != location_code:
+                continue
+            if encoded.get('bedrooms', bedrooms_value) != bedrooms_value:
+                continue
+            if encoded.get('property_type', type_code) != type_code:
+                continue
+            ranges.append((start, stop))
+        return ranges
+
+    def _gather(self, name, ranges):
+        array = self._column(name)
+        if not ranges:
+            return np.array(array[0:0])
+        return np.concatenate([array[start:stop] for start, stop in ranges])
+
+    def read(self, columns=None, location=None, property_type=None, bedrooms=None):
+        """
+        Read the matching rows, in original file order, for the given columns
+        """
+        if columns is None:
+            columns = self.columns
+
+        ranges = sorted(self._ranges(location, property_type, bedrooms))
+
+        # Restore file order - rows are stored sorted by segment
+        row_ids = self._gather(ROW_ID, ranges)
+        order = np.argsort(row_ids, kind='stable')
+
+        data = {}
+        for col in columns:
+            values = self._gather(col, ranges)[order]
+            if col in self.meta['categories']:
+                categories = self.meta['categories'][col]
+                values = np.asarray(pd.Categorical.from_codes(values, categories), dtype=object)
+            data[col] = values
+
+        return pd.DataFrame(data, index=pd.Index(row_ids[order]), columns=list(columns))
+
+    def read_slice(self, start, stop, columns=None):
+        """
+        Read rows start:stop in storage order, with string columns left as
+        pandas Categoricals. Cheap enough for worker processes to each read
+        their own shard straight from the memory-mapped files.
+        """
+        if columns is None:
+            columns = self.columns
+
+        data = {}
+        for col in columns:
+            values = np.asarray(self._column(col)[start:stop])
+            if col in self.meta['categories']:
+                values = pd.Categorical.from_codes(values, self.meta['categories'][col])
+            data[col] = values
+
+        return pd.DataFrame(data, columns=list(columns))
+
+    def lookup(self, location, property_type, bedrooms, columns=None):
+        """
+        Get exact matches and similar properties for a segment
+        """
+        exact_matches = self.read(columns, location, property_type, bedrooms)
+        similar = self.read(columns, location, bedrooms=bedrooms)
+        return exact_matches, similar
+
+    def is_current(self, csv_path=DATA_PATH):
+        """
+        Check the store was built from the current version of the CSV
+        """
+        if not os.path.exists(csv_path):
+            return True
+
+        # Only hash the CSV again once it has been touched
+        stamp = _file_stamp(csv_path)
+        if stamp != self._checked_stamp:
+            self._checked_result = file_hash(csv_path) == self.meta['source_hash']
+            self._checked_stamp = stamp
+        return self._checked_result
+
+
+# Open stores, with the meta.json stamp they were opened at
+_stores = {}
+
+
+def open_columnar_store(store_path=STORE_PATH):
+    """
+    Open a columnar store, or return None if it hasn't been built
+    """
+    meta_path = os.path.join(store_path, 'meta.json')
+    if not os.path.exists(meta_path):
+        _stores.pop(store_path, None)
+        return None
+
+    stamp = _file_stamp(meta_path)
+    cached = _stores.get(store_path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, ColumnarStore(store_path))
+        _stores[store_path] = cached
+    return cached[1]
+
+
+def get_competitor_source(path=DATA_PATH, store_path=STORE_PATH):
+    """
+    Get the columnar store if it is up to date, otherwise the in-memory index
+    """
+    store = open_columnar_store(store_path)
+    if store is not None and store.is_current(path):
+        return store
+    return get_competitor_index(path)
+
+
+if __name__ == '__main__':
+    store = build_columnar_store()
+    print(f"✅ Built columnar store at {store.path} ({len(store)} rows)")
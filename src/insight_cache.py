@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.metrics import INSIGHT_CACHE_LOOKUPS
+
+CACHE_PATH = 'data/insight_cache.sqlite'
+DEFAULT_TTL = 7 * 24 * 60 * 60  # a week - market data moves slowly
+DEFAULT_MAX_ENTRIES = 5000
+
+PROPERTY_FIELDS = ['location', 'property_type', 'bedrooms', 'has_parking', 'has_wifi', 'pet_friendly']
+
+
+def normalize_value(value):
+    """
+    Make a value JSON-friendly and stable - floats rounded to pence
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        value = value.item()
+        if isinstance(value, bool):
+            return value
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def insight_cache_key(property_details, stats, base_recommendation, model):
+    """
+    Hash of everything that goes into an AI pricing request
+    """
+    payload = {
+        'property': {field: normalize_value(property_details.get(field)) for field in PROPERTY_FIELDS},
+        'stats': normalize_value(stats),
+        'base': normalize_value(base_recommendation),
+        'model': model,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class InsightCache:
+    """
+    SQLite cache of parsed AI insights with expiry and LRU eviction
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS insights (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS insights_last_used ON insights (last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Get cached insights, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM insights WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                INSIGHT_CACHE_LOOKUPS.inc(result='miss')
+                return None
+
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM insights WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                INSIGHT_CACHE_LOOKUPS.inc(result='miss')
+                return None
+
+            self._conn.execute("UPDATE insights SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            INSIGHT_CACHE_LOOKUPS.inc(result='hit')
+
+        return json.loads(value)
+
+    def set(self, key, insights):
+        """
+        Store insights and evict the least recently used entries if full
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO insights (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(insights), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM insights WHERE created < ?", (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                """DELETE FROM insights WHERE key NOT IN (
+                    SELECT key FROM insights ORDER BY last_used DESC LIMIT ?
+                )""",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM insights")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Hit/miss counters for this process and the number of entries stored
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries
+        }
+
+
+# One shared cache per file
+_caches = {}
+
+
+def get_insight_cache(path=CACHE_PATH):
+    """
+    Get the shared insight cache for a file
+    """
+    if path not in _caches:
+        _caches[path] = InsightCache(path)
+    return _caches[path]
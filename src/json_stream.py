@@ -0,0 +1,148 @@
+"""
+Incremental parsing of a JSON object arriving a few characters at a time,
+so each top-level field can be used as soon as it is complete.
+"""
+import json
+import re
+
+WHITESPACE = ' \t\r\n'
+
+# Longest escape (\uXXXX) that can be cut off at the end of a chunk
+MAX_ESCAPE = 6
+
+# A \uXXXX escape (not an escaped backslash and 'u') for the first half of
+# a surrogate pair, which can only be decoded together with the second half
+HIGH_SURROGATE = re.compile(r'(?<!\\)(\\\\)*\\u[dD][89abAB][0-9a-fA-F]{2}$')
+
+
+class IncrementalJSONParser:
+    """
+    Parses a streamed JSON object one chunk at a time.
+
+    feed() returns the top-level (key, value) pairs completed by each
+    chunk, so a field is available the moment its value ends, without
+    waiting for the rest of the object. Each character is looked at once,
+    however many chunks there are. Anything before the opening brace
+    (a ```json fence, say) and after the closing one is ignored.
+    partial_string() only decodes what arrived since it was last called.
+
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            for key, value in parser.feed(chunk):
+                ...
+        parser.fields  # everything so far
+
+    Raises ValueError if a completed value isn't valid JSON.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.done = False
+        self._buffer = ''
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # At the top level: waiting for a 'key', the 'colon' or a 'value'
+        self._expect = 'key'
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        # partial_string's progress: which value, how far it has decoded, and the text so far
+        self._partial_start = None
+        self._partial_end = None
+        self._partial_text = ''
+
+    def feed(self, chunk):
+        """
+        Add the next chunk of text. Returns the fields it completed, in order.
+        """
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+
+        for position in range(self._position, len(buffer)):
+            if self.done:
+                break
+            char = buffer[position]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == 'key':
+                        self._key = json.loads(buffer[self._key_start:position + 1])
+                        self._expect = 'colon'
+                continue
+
+            if self._depth == 0:
+                # Still looking for the object
+                if char == '{':
+                    self._depth = 1
+                continue
+
+            top_level = self._depth == 1
+            if char == '"':
+                self._in_string = True
+                if top_level and self._expect == 'key':
+                    self._key_start = position
+                elif top_level and self._value_start is None:
+                    self._value_start = position
+            elif char in '{[':
+                if top_level and self._value_start is None:
+                    self._value_start = position
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(position, completed)
+                    self.done = True
+            elif top_level and char == ':' and self._expect == 'colon':
+                self._expect = 'value'
+            elif top_level and char == ',':
+                self._finish_value(position, completed)
+                self._expect = 'key'
+            elif top_level and self._value_start is None and self._expect == 'value' and char not in WHITESPACE:
+                # A number, true, false or null
+                self._value_start = position
+
+        self._position = len(buffer)
+        return completed
+
+    def _finish_value(self, end, completed):
+        if self._expect != 'value' or self._value_start is None:
+            return
+        value = json.loads(self._buffer[self._value_start:end])
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = self._value_start = None
+
+    def partial_string(self):
+        """
+        (key, text so far) when a top-level string value is part-way
+        through arriving, otherwise None
+        """
+        if not (self._in_string and self._depth == 1 and self._expect == 'value' and self._value_start is not None):
+            return None
+        if self._partial_start != self._value_start:
+            # A new value - start after its opening quote
+            self._partial_start = self._value_start
+            self._partial_end = self._value_start + 1
+            self._partial_text = ''
+
+        # Decode what arrived since last time, backing off an escape cut in half
+        raw = self._buffer[self._partial_end:]
+        for cut in range(min(MAX_ESCAPE, len(raw)) + 1):
+            piece = raw[:len(raw) - cut]
+            if HIGH_SURROGATE.search(piece):
+                continue
+            try:
+                self._partial_text += json.loads('"' + piece + '"')
+            except ValueError:
+                continue
+            self._partial_end += len(piece)
+            break
+        return self._key, self._partial_text
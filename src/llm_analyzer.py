@@ -1,29 +1,91 @@
-from anthropic import Anthropic
+import asyncio
+import logging
 import os
 import json
+import threading
+import time
 
-def get_ai_pricing_insights(property_details, stats, base_recommendation):
+from src.insight_cache import get_insight_cache, insight_cache_key, normalize_value
+from src.json_stream import IncrementalJSONParser
+from src.llm_resilience import CircuitOpen, DeadlineExceeded, ResilientCaller
+from src.metrics import LLM_FALLBACKS, LLM_FIRST_FIELD_SECONDS, record_llm_call, span
+
+logger = logging.getLogger(__name__)
+
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 1000
+
+# Seconds an AI insights request may take, retries included, before the
+# base recommendation is used instead. Set PRICING_AI_HEDGE=1 to race a
+# second request against calls slower than the recent p95.
+AI_DEADLINE = float(os.getenv('PRICING_AI_DEADLINE', 20))
+AI_HEDGE = bool(os.getenv('PRICING_AI_HEDGE'))
+
+# The app streams Claude's reply and shows each field as it arrives;
+# PRICING_AI_STREAM=0 waits for the whole reply instead
+AI_STREAM = os.getenv('PRICING_AI_STREAM', '1') != '0'
+
+# Fields shown while they are still being written; the rest only once complete
+STREAMED_TEXT_FIELDS = {'reasoning'}
+
+FALLBACK_REASONS = {
+    'deadline': "Claude didn't answer in time",
+    'circuit_open': "Claude is unavailable right now",
+    'api_error': "the Claude API returned an error",
+    'parse_error': "Claude's reply couldn't be read"
+}
+
+# Shared clients, one per API key / base URL, so connections are reused
+_clients = {}
+
+def get_client(api_key=None, base_url=None):
     """
-    Use Claude to analyze pricing data and provide intelligent recommendations
+    Get the shared Claude client
     """
-    
-    # Get API key
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    if not api_key:
-        return None
-    
-    # Build the prompt for Claude
-    prompt = f"""You are a revenue management expert for holiday rental properties.
+    api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+    key = (api_key, base_url)
+    if key not in _clients:
+        # Imported here so the app doesn't pay for it until Claude is needed
+        from anthropic import Anthropic
+        
+        kwargs = {'api_key': api_key}
+        if base_url:
+            kwargs['base_url'] = base_url
+        _clients[key] = Anthropic(**kwargs)
+    return _clients[key]
 
-PROPERTY DETAILS:
-- Location: {property_details['location']}
-- Type: {property_details['property_type']}
-- Bedrooms: {property_details['bedrooms']}
-- Parking: {'Yes' if property_details['has_parking'] else 'No'}
-- WiFi: {'Yes' if property_details['has_wifi'] else 'No'}
-- Pet Friendly: {'Yes' if property_details['pet_friendly'] else 'No'}
+_caller = None
+
+def get_resilient_caller():
+    """
+    Get the shared caller - one circuit breaker and latency history for all Claude calls
+    """
+    global _caller
+    if _caller is None:
+        _caller = ResilientCaller(deadline=AI_DEADLINE, hedge=AI_HEDGE)
+    return _caller
+
+def fallback_insights(base_recommendation, reason):
+    """
+    Stand-in insights when Claude can't help - the base recommendation,
+    marked with fallback=True and the reason
+    """
+    LLM_FALLBACKS.inc(reason=reason)
+    return {
+        'recommended_price': base_recommendation['price'],
+        'positioning': 'mid-range',
+        'reasoning': (f"AI analysis unavailable ({FALLBACK_REASONS[reason]}), so this is the market-based "
+                      f"price: {base_recommendation['reasoning'][0].lower()}{base_recommendation['reasoning'][1:]}."),
+        'tips': [],
+        'fallback': True,
+        'fallback_reason': reason
+    }
 
-MARKET DATA:
+def build_market_section(stats, base_recommendation):
+    """
+    Market data and baseline part of the prompt, shared by single and packed prompts
+    """
+    return f"""MARKET DATA:
 - Exact competitor matches found: {stats['exact_count']}
 - Similar properties found: {stats['similar_count']}
 {f"- Average price (exact matches): £{stats['exact_avg']:.2f}" if stats['exact_avg'] else ""}
@@ -32,7 +94,23 @@ MARKET DATA:
 
 BASELINE RECOMMENDATION:
 - Suggested price: £{base_recommendation['price']:.2f}
-- Confidence: {base_recommendation['confidence']}
+- Confidence: {base_recommendation['confidence']}"""
+
+def build_pricing_prompt(property_details, stats, base_recommendation):
+    """
+    Build the prompt asking Claude for pricing insights on one property
+    """
+    return f"""You are a revenue management expert for holiday rental properties.
+
+PROPERTY DETAILS:
+- Location: {property_details['location']}
+- Type: {property_details['property_type']}
+- Bedrooms: {property_details['bedrooms']}
+- Parking: {'Yes' if property_details['has_parking'] else 'No'}
+- WiFi: {'Yes' if property_details['has_wifi'] else 'No'}
+- Pet Friendly: {'Yes' if property_details['pet_friendly'] else 'No'}
+
+{build_market_section(stats, base_recommendation)}
 
 Please provide:
 1. A refined pricing recommendation (suggest a specific nightly rate)
@@ -50,35 +128,573 @@ Respond in JSON format with these exact keys:
 
 Only return the JSON, no other text."""
 
+def parse_insights_response(response_text):
+    """
+    Parse Claude's JSON reply
+    """
+    # Clean up response (remove markdown code blocks if present)
+    response_text = response_text.strip()
+    if response_text.startswith('```json'):
+        response_text = response_text[7:]  # Remove ```json
+    if response_text.startswith('```'):
+        response_text = response_text[3:]  # Remove ```
+    if response_text.endswith('```'):
+        response_text = response_text[:-3]  # Remove ```
+    response_text = response_text.strip()
+    
+    # Parse JSON
+    return json.loads(response_text)
+
+@span('ai_insights')
+def get_ai_pricing_insights(property_details, stats, base_recommendation, use_cache=True, deadline=None,
+                            fallback=True):
+    """
+    Use Claude to analyze pricing data and provide intelligent recommendations
+
+    The call gives up after `deadline` seconds (default AI_DEADLINE),
+    retrying transient errors on the way. If Claude can't answer, returns
+    fallback_insights (the base recommendation) - or None with
+    fallback=False. Also None without an API key.
+    """
+    
+    # Identical requests get the cached answer instead of a new API call
+    cache_key = insight_cache_key(property_details, stats, base_recommendation, MODEL)
+    if use_cache:
+        cached = get_insight_cache().get(cache_key)
+        if cached is not None:
+            return cached
+    
+    # Get API key
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        return None
+    
+    # Build the prompt for Claude
+    prompt = build_pricing_prompt(property_details, stats, base_recommendation)
+    # Retries are handled by the resilient caller, not the SDK
+    client = get_client(api_key).with_options(max_retries=0)
+    
+    def attempt(timeout):
+        started = time.perf_counter()
+        try:
+            message = client.messages.create(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=timeout
+            )
+        except Exception:
+            record_llm_call('single', time.perf_counter() - started, 'api_error')
+            raise
+        return message, started
+    
+    requested = time.perf_counter()
     try:
         # Call Claude API
-        client = Anthropic(api_key=api_key)
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
+        message, started = get_resilient_caller().call(attempt, deadline=deadline, operation='single')
+    except (DeadlineExceeded, CircuitOpen) as e:
+        logger.warning("Claude call abandoned: %s", e)
+        reason = 'deadline' if isinstance(e, DeadlineExceeded) else 'circuit_open'
+        return fallback_insights(base_recommendation, reason) if fallback else None
+    except Exception as e:
+        logger.warning("Error calling Claude API: %s", e)
+        return fallback_insights(base_recommendation, 'api_error') if fallback else None
+    
+    try:
         # Parse the response
-        response_text = message.content[0].text
+        ai_insights = parse_insights_response(message.content[0].text)
+    except (ValueError, IndexError, AttributeError) as e:
+        record_llm_call('single', time.perf_counter() - started, 'parse_error', message.usage)
+        logger.warning("Could not parse Claude's reply: %s", e)
+        return fallback_insights(base_recommendation, 'parse_error') if fallback else None
+    
+    record_llm_call('single', time.perf_counter() - started, 'ok', message.usage)
+    # Nothing can be shown until the whole reply is in
+    LLM_FIRST_FIELD_SECONDS.observe(time.perf_counter() - requested, mode='blocking')
+    
+    if use_cache:
+        get_insight_cache().set(cache_key, ai_insights)
+    
+    return ai_insights
+
+def stream_ai_pricing_insights(property_details, stats, base_recommendation, use_cache=True, deadline=None,
+                               fallback=True):
+    """
+    Streaming version of get_ai_pricing_insights, for showing the answer
+    as it is written.
+    
+    Yields the insights so far each time Claude's reply adds to them:
+    recommended_price and positioning as soon as each is complete, the
+    reasoning as it is written, then the tips. The last dict yielded is
+    the finished insights - what get_ai_pricing_insights would have
+    returned, fallbacks included. Yields nothing without an API key.
+    
+    Errors before the reply starts are retried as usual; the deadline is
+    checked between chunks after that, and a reply that fails part-way
+    falls back to the base recommendation.
+    """
+    cache_key = insight_cache_key(property_details, stats, base_recommendation, MODEL)
+    if use_cache:
+        cached = get_insight_cache().get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        return
+    
+    prompt = build_pricing_prompt(property_details, stats, base_recommendation)
+    client = get_client(api_key).with_options(max_retries=0)
+    deadline = deadline or AI_DEADLINE
+    ends = time.monotonic() + deadline
+    
+    def attempt(timeout):
+        started = time.perf_counter()
+        try:
+            # Entering the stream sends the request and waits for the reply to start
+            stream = client.messages.stream(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=timeout
+            ).__enter__()
+        except Exception:
+            record_llm_call('stream', time.perf_counter() - started, 'api_error')
+            raise
+        return stream, started
+    
+    with span('ai_insights'):
+        requested = time.perf_counter()
+        try:
+            # Not hedged, so only one stream is open at a time. A stream
+            # that opens after the deadline has passed is closed straight away.
+            stream, started = get_resilient_caller().call(attempt, deadline=deadline, operation='stream',
+                                                          hedge=False, discard=lambda result: result[0].close())
+        except (DeadlineExceeded, CircuitOpen) as e:
+            logger.warning("Claude call abandoned: %s", e)
+            if fallback:
+                yield fallback_insights(base_recommendation,
+                                        'deadline' if isinstance(e, DeadlineExceeded) else 'circuit_open')
+            return
+        except Exception as e:
+            logger.warning("Error calling Claude API: %s", e)
+            if fallback:
+                yield fallback_insights(base_recommendation, 'api_error')
+            return
         
-        # Clean up response (remove markdown code blocks if present)
-        response_text = response_text.strip()
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]  # Remove ```json
-        if response_text.startswith('```'):
-            response_text = response_text[3:]  # Remove ```
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]  # Remove ```
-        response_text = response_text.strip()
+        parser = IncrementalJSONParser()
+        first_field = True
+        try:
+            for text in stream.text_stream:
+                completed = parser.feed(text)
+                if completed and first_field:
+                    LLM_FIRST_FIELD_SECONDS.observe(time.perf_counter() - requested, mode='stream')
+                    first_field = False
+                
+                partial = parser.partial_string()
+                if partial and partial[0] in STREAMED_TEXT_FIELDS:
+                    yield dict(parser.fields, **{partial[0]: partial[1]})
+                elif completed:
+                    yield dict(parser.fields)
+                
+                if time.monotonic() > ends:
+                    raise DeadlineExceeded("Claude didn't finish replying before the deadline")
+            
+            message = stream.get_final_message()
+            # Falls back to parsing the whole reply if it wasn't a single object
+            ai_insights = parser.fields if parser.done else parse_insights_response(message.content[0].text)
+        except (ValueError, IndexError, AttributeError) as e:
+            record_llm_call('stream', time.perf_counter() - started, 'parse_error')
+            logger.warning("Could not parse Claude's reply: %s", e)
+            if fallback:
+                yield fallback_insights(base_recommendation, 'parse_error')
+            return
+        except Exception as e:
+            record_llm_call('stream', time.perf_counter() - started, 'api_error')
+            logger.warning("Claude's reply was cut short: %s", e)
+            if fallback:
+                yield fallback_insights(base_recommendation,
+                                        'deadline' if isinstance(e, DeadlineExceeded) else 'api_error')
+            return
+        finally:
+            stream.close()
         
-        # Parse JSON
-        ai_insights = json.loads(response_text)
+        record_llm_call('stream', time.perf_counter() - started, 'ok', message.usage)
         
-        return ai_insights
+        if use_cache:
+            get_insight_cache().set(cache_key, ai_insights)
         
+        yield ai_insights
+
+
+# ============================================
+# PACKED MULTI-PROPERTY INSIGHTS
+# ============================================
+
+POSITIONINGS = {'budget', 'mid-range', 'premium'}
+
+def build_packed_prompt(properties, stats, base_recommendation):
+    """
+    Build one prompt asking for insights on several properties from the
+    same segment. `properties` maps an id to each property's details.
+    """
+    property_lines = "\n".join(
+        f"- id {property_id}: Location: {details['location']}, Type: {details['property_type']}, "
+        f"Bedrooms: {details['bedrooms']}, Parking: {'Yes' if details['has_parking'] else 'No'}, "
+        f"WiFi: {'Yes' if details['has_wifi'] else 'No'}, "
+        f"Pet Friendly: {'Yes' if details['pet_friendly'] else 'No'}"
+        for property_id, details in properties.items()
+    )
+    
+    return f"""You are a revenue management expert for holiday rental properties.
+
+All of these properties are in the same market segment:
+
+PROPERTIES:
+{property_lines}
+
+{build_market_section(stats, base_recommendation)}
+
+For EACH property, please provide:
+1. A refined pricing recommendation (suggest a specific nightly rate)
+2. Strategic reasoning (why this price makes sense)
+3. Competitive positioning (budget/mid-range/premium and why)
+4. 2-3 actionable tips to maximize revenue
+
+Respond with a JSON array containing one object per property, with these exact keys:
+[
+    {{
+        "id": <property id>,
+        "recommended_price": <number>,
+        "positioning": "<budget|mid-range|premium>",
+        "reasoning": "<2-3 sentences explaining the recommendation>",
+        "tips": ["<tip 1>", "<tip 2>", "<tip 3>"]
+    }}
+]
+
+Only return the JSON array, no other text."""
+
+def validate_insights(insights):
+    """
+    Check a reply has all the fields the app needs, with sensible types
+    """
+    if not isinstance(insights, dict):
+        return False
+    price = insights.get('recommended_price')
+    if isinstance(price, bool) or not isinstance(price, (int, float)):
+        return False
+    if str(insights.get('positioning', '')).lower() not in POSITIONINGS:
+        return False
+    if not isinstance(insights.get('reasoning'), str):
+        return False
+    tips = insights.get('tips')
+    return isinstance(tips, list) and all(isinstance(tip, str) for tip in tips)
+
+def parse_packed_response(response_text, property_ids):
+    """
+    Split a packed JSON array reply into {id: insights}, keeping only valid items
+    """
+    try:
+        items = parse_insights_response(response_text)
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    
+    wanted = {str(property_id): property_id for property_id in property_ids}
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        property_id = wanted.get(str(item.get('id')))
+        if property_id is None or not validate_insights(item):
+            continue
+        parsed[property_id] = {key: value for key, value in item.items() if key != 'id'}
+    return parsed
+
+def get_packed_ai_pricing_insights(requests, pack_size=10, max_retries=1, api_key=None,
+                                   base_url=None, use_cache=True, deadline=None):
+    """
+    Get AI insights for many properties, packing properties that share a
+    segment (same stats and baseline) into one request.
+
+    `requests` is a list of (property_details, stats, base_recommendation)
+    tuples. Returns (results, report): results in input order with None
+    for failures, and a report of calls and tokens used. 'calls' counts
+    every request sent, retries and hedges included, and 'failed_calls'
+    those that got an error or timed out. Items missing or invalid in a
+    packed reply are retried on their own pack.
+
+    Each pack goes through the resilient caller like a single call, with
+    `deadline` seconds per pack (default AI_DEADLINE for each property in
+    it, as the reply grows with the pack).
+    """
+    results = [None] * len(requests)
+    report = {
+        'properties': len(requests),
+        'cache_hits': 0,
+        'calls': 0,
+        'failed_calls': 0,
+        'retried': 0,
+        'failed': 0,
+        'input_tokens': 0,
+        'output_tokens': 0
+    }
+    
+    # Group the uncached requests by segment
+    segments = {}
+    for position, (property_details, stats, base_recommendation) in enumerate(requests):
+        if use_cache:
+            cache_key = insight_cache_key(property_details, stats, base_recommendation, MODEL)
+            cached = get_insight_cache().get(cache_key)
+            if cached is not None:
+                results[position] = cached
+                report['cache_hits'] += 1
+                continue
+        
+        segment_key = json.dumps(normalize_value([stats, base_recommendation]), sort_keys=True)
+        segments.setdefault(segment_key, []).append(position)
+    
+    api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+    pending = sum(len(positions) for positions in segments.values())
+    if not api_key:
+        report['failed'] = pending
+        return results, report
+    
+    # Retries are handled by the resilient caller, not the SDK
+    client = get_client(api_key, base_url).with_options(max_retries=0)
+    caller = get_resilient_caller()
+    # Requests can be sent from the caller's threads at once (retries, hedges)
+    counting = threading.Lock()
+    
+    for positions in segments.values():
+        _, stats, base_recommendation = requests[positions[0]]
+        remaining = positions
+        
+        for attempt in range(max_retries + 1):
+            if not remaining:
+                break
+            if attempt > 0:
+                report['retried'] += len(remaining)
+            
+            failed = []
+            for start in range(0, len(remaining), pack_size):
+                pack = remaining[start:start + pack_size]
+                properties = {position: requests[position][0] for position in pack}
+                prompt = build_packed_prompt(properties, stats, base_recommendation)
+                
+                def send(timeout, prompt=prompt, max_tokens=MAX_TOKENS * len(pack)):
+                    with counting:
+                        report['calls'] += 1
+                    started = time.perf_counter()
+                    try:
+                        message = client.messages.create(
+                            model=MODEL,
+                            max_tokens=max_tokens,
+                            messages=[
+                                {"role": "user", "content": prompt}
+                            ],
+                            timeout=timeout
+                        )
+                    except Exception:
+                        record_llm_call('packed', time.perf_counter() - started, 'api_error')
+                        with counting:
+                            report['failed_calls'] += 1
+                        raise
+                    return message, started
+                
+                try:
+                    message, started = caller.call(send, deadline=deadline or AI_DEADLINE * len(pack),
+                                                   operation='packed')
+                except (DeadlineExceeded, CircuitOpen) as e:
+                    logger.warning("Claude call abandoned: %s", e)
+                    failed.extend(pack)
+                    continue
+                except Exception as e:
+                    logger.warning("Error calling Claude API: %s", e)
+                    failed.extend(pack)
+                    continue
+                
+                report['input_tokens'] += message.usage.input_tokens
+                report['output_tokens'] += message.usage.output_tokens
+                
+                try:
+                    parsed = parse_packed_response(message.content[0].text, pack)
+                except (IndexError, AttributeError) as e:
+                    # No text block in the reply - retried like an unparseable one
+                    logger.warning("Could not parse Claude's reply: %s", e)
+                    parsed = {}
+                outcome = 'ok' if len(parsed) == len(pack) else 'parse_error'
+                record_llm_call('packed', time.perf_counter() - started, outcome, message.usage)
+                for position in pack:
+                    if position not in parsed:
+                        failed.append(position)
+                        continue
+                    results[position] = parsed[position]
+                    if use_cache:
+                        cache_key = insight_cache_key(*requests[position], MODEL)
+                        get_insight_cache().set(cache_key, parsed[position])
+            
+            remaining = failed
+        
+        report['failed'] += len(remaining)
+    
+    priced = pending - report['failed']
+    report['calls_saved'] = pending - report['calls']
+    report['tokens_per_property'] = (
+        (report['input_tokens'] + report['output_tokens']) / priced if priced else None
+    )
+    
+    return results, report
+
+# ============================================
+# BULK ASYNC INSIGHTS
+# ============================================
+
+def estimate_tokens(prompt, max_tokens=MAX_TOKENS):
+    """
+    Rough token budget for a request - ~4 characters per token plus the reply
+    """
+    return len(prompt) // 4 + max_tokens
+
+class TokenRateLimiter:
+    """
+    Token bucket limiting how many tokens are sent per minute
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens):
+        """
+        Wait until `tokens` can be spent
+        """
+        # A request bigger than the whole bucket would never fit
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def settle(self, estimated, actual):
+        """
+        Correct the bucket once the real token usage is known
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + estimated - actual)
+
+async def get_ai_pricing_insights_async(property_details, stats, base_recommendation, client,
+                                        limiter=None, use_cache=True, deadline=None, fallback=True):
+    """
+    Async version of get_ai_pricing_insights using a shared AsyncAnthropic client
+    """
+    cache_key = insight_cache_key(property_details, stats, base_recommendation, MODEL)
+    if use_cache:
+        cached = get_insight_cache().get(cache_key)
+        if cached is not None:
+            return cached
+    
+    prompt = build_pricing_prompt(property_details, stats, base_recommendation)
+    estimated = estimate_tokens(prompt)
+    if limiter:
+        await limiter.acquire(estimated)
+    
+    client = client.with_options(max_retries=0)
+    
+    async def attempt(timeout):
+        started = time.perf_counter()
+        try:
+            message = await client.messages.create(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=timeout
+            )
+        except Exception:
+            record_llm_call('async', time.perf_counter() - started, 'api_error')
+            raise
+        return message, started
+    
+    try:
+        message, started = await get_resilient_caller().call_async(attempt, deadline=deadline, operation='async')
+    except (DeadlineExceeded, CircuitOpen) as e:
+        logger.warning("Claude call abandoned: %s", e)
+        reason = 'deadline' if isinstance(e, DeadlineExceeded) else 'circuit_open'
+        return fallback_insights(base_recommendation, reason) if fallback else None
     except Exception as e:
-        print(f"Error calling Claude API: {e}")
-        return None
+        logger.warning("Error calling Claude API: %s", e)
+        return fallback_insights(base_recommendation, 'api_error') if fallback else None
+    
+    if limiter:
+        limiter.settle(estimated, message.usage.input_tokens + message.usage.output_tokens)
+    
+    try:
+        ai_insights = parse_insights_response(message.content[0].text)
+    except (ValueError, IndexError, AttributeError) as e:
+        record_llm_call('async', time.perf_counter() - started, 'parse_error', message.usage)
+        logger.warning("Could not parse Claude's reply: %s", e)
+        return fallback_insights(base_recommendation, 'parse_error') if fallback else None
+    
+    record_llm_call('async', time.perf_counter() - started, 'ok', message.usage)
+    
+    if use_cache:
+        get_insight_cache().set(cache_key, ai_insights)
+    
+    return ai_insights
+
+async def get_bulk_ai_pricing_insights_async(requests, concurrency=8, tokens_per_minute=None,
+                                             api_key=None, base_url=None, use_cache=True):
+    """
+    Get AI insights for many properties concurrently.
+
+    `requests` is a list of (property_details, stats, base_recommendation)
+    tuples. Results come back in the same order, with None for failures.
+    """
+    api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        return [None] * len(requests)
+    
+    from anthropic import AsyncAnthropic
+    
+    kwargs = {'api_key': api_key}
+    if base_url:
+        kwargs['base_url'] = base_url
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute else None
+    
+    # One client (and connection pool) for the whole batch
+    async with AsyncAnthropic(**kwargs) as client:
+        
+        async def run(request):
+            async with semaphore:
+                return await get_ai_pricing_insights_async(
+                    *request, client=client, limiter=limiter, use_cache=use_cache, fallback=False
+                )
+        
+        return await asyncio.gather(*(run(request) for request in requests))
+
+def get_bulk_ai_pricing_insights(requests, **kwargs):
+    """
+    Blocking wrapper around get_bulk_ai_pricing_insights_async
+    """
+    return asyncio.run(get_bulk_ai_pricing_insights_async(requests, **kwargs))
@@ -0,0 +1,354 @@
+"""
+Latency-bounded calls to Claude: a deadline per request, jittered
+exponential retries, a circuit breaker and optional hedged requests.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.metrics import LLM_CIRCUIT_OPENED, LLM_HEDGES, LLM_RETRIES
+
+DEFAULT_DEADLINE = 20.0  # seconds for the whole call, retries included
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5       # the first retry waits up to this long, doubling after that...
+BACKOFF_CAP = 8.0        # ...up to this
+
+# Consecutive failures that open the circuit, and how long it stays open
+# before a trial call is let through
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# Hedge once an attempt is slower than this share of recent successful
+# calls, when there are enough of them to go on
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+
+# Request timeout, conflict and rate limiting - plus every 5xx, which
+# includes 529 (overloaded)
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    No successful reply before the deadline
+    """
+
+
+class CircuitOpen(RuntimeError):
+    """
+    The circuit breaker is refusing calls after repeated failures
+    """
+
+
+def is_retryable(error):
+    """
+    Whether an error is worth trying again (a transient server or network problem)
+    """
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from anthropic import APIConnectionError
+    except ImportError:
+        return False
+    # Includes APITimeoutError
+    return isinstance(error, APIConnectionError)
+
+
+def retry_after(error):
+    """
+    Seconds the server asked us to wait before retrying, if it said
+    """
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'headers', {}).get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP, rng=random):
+    """
+    Full-jitter exponential backoff before retry number `attempt` (1, 2, ...)
+    """
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while.
+
+    After failure_threshold failures in a row the circuit opens and calls
+    are refused straight away. After reset_timeout, one trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """
+        Whether a call may go ahead now
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                LLM_CIRCUIT_OPENED.inc()
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+
+class LatencyTracker:
+    """
+    Latencies of recent successful calls
+    """
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, min_samples=HEDGE_MIN_SAMPLES):
+        """
+        The q-th percentile (0-1) of recent latencies, or None with too few samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def _discard_when_done(future, discard):
+    """
+    Hand the result of an abandoned attempt to discard() once it has one
+    """
+    if discard is None:
+        return
+
+    def done(future):
+        if not future.cancelled() and future.exception() is None:
+            discard(future.result())
+
+    future.add_done_callback(done)
+
+
+class ResilientCaller:
+    """
+    Runs requests under a deadline, with retries, a circuit breaker and
+    optional hedging.
+
+    A request is a function taking the seconds it has left, which should
+    give up after that long. Retryable errors (network problems, 429s,
+    5xx and 529 overloaded) are retried with jittered exponential backoff
+    while the deadline allows; anything else is raised straight away.
+    With hedge=True an attempt still running after `hedge_after` seconds
+    (default: the p95 of recent calls) gets an identical second request
+    racing it, and the first success wins.
+
+    Raises DeadlineExceeded when time runs out, CircuitOpen when the
+    breaker is refusing calls, or the last error once attempts run out.
+    """
+
+    def __init__(self, deadline=DEFAULT_DEADLINE, max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE,
+                 backoff_cap=BACKOFF_CAP, hedge=False, hedge_after=None, breaker=None, latencies=None,
+                 rng=None, max_workers=8):
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = latencies or LatencyTracker()
+        self.rng = rng or random.Random()
+        self.max_workers = max_workers
+        self._pool = None
+
+    def hedge_delay(self, hedge=True):
+        """
+        Seconds to wait before hedging an attempt, or None not to hedge
+        """
+        if not (self.hedge and hedge):
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        return self.latencies.percentile(HEDGE_PERCENTILE)
+
+    def _retry_delay(self, error, attempt, ends):
+        """
+        How long to wait before retrying after an error, or None if it isn't
+        worth retrying. Raises DeadlineExceeded if there's no time to.
+        """
+        if not is_retryable(error):
+            # Claude answered, even if it was to refuse the request
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        delay = max(backoff_delay(attempt, self.backoff_base, self.backoff_cap, self.rng), retry_after(error) or 0)
+        if time.monotonic() + delay >= ends:
+            raise DeadlineExceeded("No time left to retry Claude") from error
+        return delay
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Attempts run here so the deadline holds even if one hangs
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='claude')
+        return self._pool
+
+    def call(self, request, deadline=None, operation='single', hedge=True, discard=None):
+        """
+        Make a request, returning its result. hedge=False never hedges it.
+
+        An attempt can't be stopped once it has started, so one given up on
+        at the deadline, or beaten by its hedge, carries on in the
+        background. `discard` is called with the result of any such attempt
+        that goes on to succeed - to close an open stream, say.
+        """
+        deadline = deadline or self.deadline
+        ends = time.monotonic() + deadline
+
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                raise CircuitOpen("Claude calls are paused after repeated failures")
+            try:
+                return self._attempt(request, ends, operation, hedge, discard)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception as error:
+                delay = self._retry_delay(error, attempt, ends)
+                if delay is None or attempt == self.max_attempts:
+                    raise
+                LLM_RETRIES.inc(operation=operation)
+                time.sleep(delay)
+
+    def _attempt(self, request, ends, operation, hedge, discard=None):
+        """
+        One attempt, hedged if it runs slow
+        """
+        pool = self._get_pool()
+        started = {pool.submit(request, ends - time.monotonic()): ('primary', time.monotonic())}
+
+        hedge_after = self.hedge_delay(hedge)
+        if hedge_after is not None and hedge_after < ends - time.monotonic():
+            done, _ = wait(started, timeout=hedge_after)
+            if not done and self.breaker.allow():
+                started[pool.submit(request, ends - time.monotonic())] = ('hedge', time.monotonic())
+
+        running = set(started)
+        error = None
+        while running:
+            done, running = wait(running, timeout=max(ends - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # Whatever is still running finishes (or times out) in the background
+                for future in running:
+                    _discard_when_done(future, discard)
+                raise DeadlineExceeded("Claude didn't reply before the deadline")
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                kind, sent = started[future]
+                self.latencies.observe(time.monotonic() - sent)
+                self.breaker.record_success()
+                if len(started) > 1:
+                    LLM_HEDGES.inc(operation=operation, winner=kind)
+                for other in started:
+                    if other is not future:
+                        _discard_when_done(other, discard)
+                return result
+        raise error
+
+    async def call_async(self, request, deadline=None, operation='async'):
+        """
+        call() for a coroutine function `request`
+        """
+        deadline = deadline or self.deadline
+        ends = time.monotonic() + deadline
+
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                raise CircuitOpen("Claude calls are paused after repeated failures")
+            try:
+                return await self._attempt_async(request, ends, operation)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception as error:
+                delay = self._retry_delay(error, attempt, ends)
+                if delay is None or attempt == self.max_attempts:
+                    raise
+                LLM_RETRIES.inc(operation=operation)
+                await asyncio.sleep(delay)
+
+    async def _attempt_async(self, request, ends, operation):
+        started = {asyncio.ensure_future(request(ends - time.monotonic())): ('primary', time.monotonic())}
+        try:
+            hedge_after = self.hedge_delay()
+            if hedge_after is not None and hedge_after < ends - time.monotonic():
+                done, _ = await asyncio.wait(started, timeout=hedge_after)
+                if not done and self.breaker.allow():
+                    started[asyncio.ensure_future(request(ends - time.monotonic()))] = ('hedge', time.monotonic())
+
+            running = set(started)
+            error = None
+            while running:
+                done, running = await asyncio.wait(running, timeout=max(ends - time.monotonic(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("Claude didn't reply before the deadline")
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    kind, sent = started[task]
+                    self.latencies.observe(time.monotonic() - sent)
+                    self.breaker.record_success()
+                    if len(started) > 1:
+                        LLM_HEDGES.inc(operation=operation, winner=kind)
+                    return task.result()
+            raise error
+        finally:
+            # Unlike threads, the losers and stragglers can be cancelled
+            for task in started:
+                task.cancel()
@@ -0,0 +1,483 @@
+"""
+Change-data ingestion for competitor listings, with point-in-time snapshots.
+
+    python3 -m src.market_log init                                   # seed from data/competitors.csv
+    python3 -m src.market_log ingest changes.csv --as-of 2026-10-17
+    python3 -m src.market_log snapshot --as-of 2026-10-01 --output market.csv
+    python3 -m src.market_log diff 2026-10-16 2026-10-17
+    python3 -m src.market_log compact --keep-days 90
+    python3 -m src.market_log publish                                # current market -> data/competitors.csv
+
+Listings are keyed by listing_id. The market is a base snapshot plus an
+append-only log of upserts and deletes (data/market/changes.jsonl), each
+stamped with the date it applies from; replaying the log up to a date
+gives the market as it was on that date. Compaction folds old changes
+into a new base so the log stays short - dates before the base can no
+longer be replayed.
+
+Pricing as of a date works on a snapshot like on the live data:
+
+    competitors = MarketLog().snapshot(as_of='2026-10-01')
+    price_portfolio(properties, competitors=competitors)
+"""
+import argparse
+import copy
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_handler import DATA_PATH, EXACT_KEYS, as_flags, file_hash
+from src.segment_stats import STATS_PATH, SegmentStatsCube, use_stats_cube
+
+MARKET_PATH = 'data/market'
+LISTING_ID = 'listing_id'
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# Fields a listing needs the first time it is upserted
+REQUIRED_FIELDS = EXACT_KEYS + ['nightly_rate']
+
+# Once the log has this many entries, ingest compacts it, keeping
+# KEEP_DAYS of history replayable
+COMPACT_AFTER = 1_000_000
+KEEP_DAYS = 90
+
+
+def parse_date(value=None):
+    """
+    A date, an ISO date string or None (today) -> 'YYYY-MM-DD'
+    """
+    if value is None:
+        return datetime.date.today().isoformat()
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return datetime.date.fromisoformat(str(value)).isoformat()
+
+
+def _json_default(value):
+    # NumPy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Can't write {type(value).__name__} to the market log")
+
+
+def _write_atomic(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _rows_differ(before, after):
+    """
+    Which rows of two frames with the same index and columns differ (NaN equals NaN)
+    """
+    same = (before == after) | (before.isna() & after.isna())
+    return ~same.all(axis=1).to_numpy()
+
+
+def _contains(index, labels):
+    """
+    Which labels are in a (unique) index - index.isin is slow on big string indexes
+    """
+    return index.get_indexer(labels) >= 0
+
+
+def _empty_delta(as_of, frame):
+    empty = frame.iloc[0:0]
+    return {'as_of': as_of, 'added': empty, 'removed': empty, 'before': empty, 'after': empty}
+
+
+class MarketLog:
+    """
+    The competitor market as a base snapshot plus an append-only change
+    log, keyed by listing ID.
+
+    The current market is kept in memory, indexed by listing_id, along
+    with a stats cube that each ingest updates from its delta - a day's
+    changes never mean rebuilding either. Past states are replayed from
+    the base when asked for.
+    """
+
+    def __init__(self, path=MARKET_PATH, compact_after=COMPACT_AFTER, keep_days=KEEP_DAYS):
+        self.path = path
+        self.compact_after = compact_after
+        self.keep_days = keep_days
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.base = pd.read_csv(os.path.join(path, self.meta['base']), dtype={LISTING_ID: str}).set_index(LISTING_ID)
+        self.columns = list(self.base.columns)
+        self.entries = self._read_entries()
+        self.current = self._replay(self.entries)
+        self._cube = None
+
+    @classmethod
+    def create(cls, competitors, path=MARKET_PATH, as_of=None, **kwargs):
+        """
+        Start a market log from a competitor frame, as of a date (default
+        today). Listings without a listing_id column are numbered by row.
+        """
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            raise FileExistsError(f"{path} already holds a market log")
+
+        base = competitors.copy()
+        if LISTING_ID not in base.columns:
+            base.insert(0, LISTING_ID, np.arange(len(base)).astype(str))
+        base[LISTING_ID] = base[LISTING_ID].astype(str)
+        duplicated = base[LISTING_ID][base[LISTING_ID].duplicated()]
+        if len(duplicated):
+            raise ValueError(f"Duplicate listing IDs: {', '.join(duplicated.unique()[:5])}")
+
+        os.makedirs(path, exist_ok=True)
+        _write_atomic(os.path.join(path, 'base-0.csv'), lambda f: base.to_csv(f, index=False))
+        meta = {'as_of': parse_date(as_of), 'seq': 0, 'base': 'base-0.csv'}
+        _write_atomic(os.path.join(path, 'meta.json'), lambda f: json.dump(meta, f))
+        return cls(path, **kwargs)
+
+    @property
+    def _log_path(self):
+        return os.path.join(self.path, 'changes.jsonl')
+
+    @property
+    def latest_date(self):
+        """
+        Date of the newest change (or of the base, if there are none)
+        """
+        return self.entries[-1]['as_of'] if self.entries else self.meta['as_of']
+
+    @property
+    def _next_seq(self):
+        return (self.entries[-1]['seq'] if self.entries else self.meta['seq']) + 1
+
+    def _read_entries(self):
+        """
+        Log entries newer than the base. A half-written last line (from a
+        crash mid-append) is cut off so the next append starts cleanly.
+        """
+        if not os.path.exists(self._log_path):
+            return []
+
+        entries = []
+        good_bytes = 0
+        with open(self._log_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                entry = json.loads(line)
+                good_bytes += len(line)
+                if entry['seq'] > self.meta['seq']:
+                    entries.append(entry)
+
+        if good_bytes < os.path.getsize(self._log_path):
+            with open(self._log_path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return entries
+
+    def _conform(self, rows):
+        """
+        Rows in the base's column order and, where they have no gaps, its types
+        """
+        rows = rows.reindex(columns=self.columns)
+        for col, dtype in self.base.dtypes.items():
+            values = rows[col]
+            if values.dtype == dtype or not values.notna().all():
+                continue
+            if pd.api.types.is_bool_dtype(dtype):
+                rows[col] = as_flags(values)
+                continue
+            try:
+                rows[col] = values.astype(dtype)
+            except (TypeError, ValueError):
+                pass
+        return rows
+
+    def _replay(self, entries):
+        """
+        The base with entries applied. Each listing's last change wins, and
+        upserted listings come after the untouched ones in the order they
+        were last changed - the same order ingest leaves `current` in.
+        """
+        if not entries:
+            return self.base.copy()
+
+        last = {}
+        for entry in entries:
+            last.pop(entry[LISTING_ID], None)
+            last[entry[LISTING_ID]] = entry
+
+        upserts = [entry for entry in last.values() if entry['op'] == UPSERT]
+        rows = pd.DataFrame.from_records(
+            [entry['row'] for entry in upserts],
+            index=pd.Index([entry[LISTING_ID] for entry in upserts], name=LISTING_ID, dtype=self.base.index.dtype),
+            columns=self.columns
+        )
+        return pd.concat([self.base.drop(index=list(last), errors='ignore'), self._conform(rows)])
+
+    def _state(self, as_of=None):
+        """
+        The market (indexed by listing_id) at the end of a date, default now
+        """
+        if as_of is None:
+            return self.current
+        as_of = parse_date(as_of)
+        if as_of < self.meta['as_of']:
+            raise ValueError(f"History before {self.meta['as_of']} has been compacted away")
+        if as_of >= self.latest_date:
+            return self.current
+        return self._replay([entry for entry in self.entries if entry['as_of'] <= as_of])
+
+    def snapshot(self, as_of=None):
+        """
+        The competitor frame at the end of a date (default: now), with a
+        listing_id column
+        """
+        return self._state(as_of).reset_index()
+
+    def ingest(self, changes, as_of=None):
+        """
+        Apply a batch of changes as of a date (default today) and log them.
+
+        `changes` is a DataFrame or list of records with a listing_id and
+        an optional op - 'upsert' (the default) or 'delete'. An upsert of
+        a known listing only needs the fields that changed; a new listing
+        needs location, property_type, bedrooms and nightly_rate. If a
+        listing appears more than once, its last change wins. Deletes of
+        unknown listings and upserts that change nothing are dropped.
+
+        Returns the delta - {'as_of', 'added', 'removed', 'before',
+        'after'}, frames indexed by listing_id, where before/after are the
+        listings that changed - and folds it into the stats cube.
+        """
+        as_of = parse_date(as_of)
+        if as_of < self.latest_date:
+            raise ValueError(f"Changes must arrive in date order - the log already has {self.latest_date}")
+
+        changes = pd.DataFrame(changes)
+        if LISTING_ID not in changes.columns:
+            raise ValueError(f"Changes need a {LISTING_ID} column")
+        changes = changes.astype({LISTING_ID: str}).drop_duplicates(LISTING_ID, keep='last').set_index(LISTING_ID)
+        if len(changes) == 0:
+            return _empty_delta(as_of, self.current)
+
+        ops = changes['op'].fillna(UPSERT) if 'op' in changes.columns else pd.Series(UPSERT, index=changes.index)
+        unknown = set(ops.unique()) - {UPSERT, DELETE}
+        if unknown:
+            raise ValueError(f"Unknown change ops: {', '.join(map(str, unknown))}")
+
+        fields = [col for col in self.columns if col in changes.columns]
+        upserts = changes.loc[(ops == UPSERT).to_numpy(), fields]
+        known = _contains(self.current.index, upserts.index)
+
+        # Listings that changed - given fields replace the old values
+        before = self.current.loc[upserts.index[known]]
+        after = self._conform(upserts[known].combine_first(before))
+        changed = _rows_differ(before, after)
+        before, after = before[changed], after[changed]
+
+        added = self._conform(upserts[~known])
+        incomplete = added.index[added[REQUIRED_FIELDS].isna().any(axis=1).to_numpy()]
+        if len(incomplete):
+            raise ValueError(f"New listings need {', '.join(REQUIRED_FIELDS)}: {', '.join(incomplete[:5])}")
+
+        deleted = changes.index[(ops == DELETE).to_numpy()]
+        removed = self.current.loc[deleted[_contains(self.current.index, deleted)]]
+
+        # Upserted rows in the order they were given
+        written = pd.concat([after, added])
+        written = written.loc[upserts.index[_contains(written.index, upserts.index)]]
+
+        seq = self._next_seq
+        entries = [
+            {'seq': seq + offset, 'as_of': as_of, 'op': DELETE, LISTING_ID: listing_id, 'row': None}
+            for offset, listing_id in enumerate(removed.index)
+        ]
+        seq += len(entries)
+        entries += [
+            {'seq': seq + offset, 'as_of': as_of, 'op': UPSERT, LISTING_ID: listing_id, 'row': row}
+            for offset, (listing_id, row) in enumerate(zip(written.index, written.to_dict('records')))
+        ]
+        if entries:
+            with open(self._log_path, 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, default=_json_default) + '\n')
+                # Make sure the changes are on disk before they are applied
+                f.flush()
+                os.fsync(f.fileno())
+
+        self.entries += entries
+        touched = removed.index.append(written.index)
+        self.current = pd.concat([self.current.drop(index=touched, errors='ignore'), written])
+
+        delta = {'as_of': as_of, 'added': added, 'removed': removed, 'before': before, 'after': after}
+        if self._cube is not None:
+            self._cube.apply_delta(delta)
+
+        if len(self.entries) > self.compact_after:
+            cutoff = datetime.date.fromisoformat(as_of) - datetime.timedelta(days=self.keep_days)
+            self.compact(before=cutoff)
+
+        return delta
+
+    def diff(self, start, end=None):
+        """
+        How the market changed after `start`, up to the end of `end`
+        (default: now). Same shape as ingest's delta.
+        """
+        start, end = parse_date(start), parse_date(end) if end is not None else self.latest_date
+        old, new = self._state(start), self._state(end)
+
+        touched = pd.Index(
+            list(dict.fromkeys(entry[LISTING_ID] for entry in self.entries if start < entry['as_of'] <= end)),
+            dtype=self.base.index.dtype
+        )
+        was_there = _contains(old.index, touched)
+        is_there = _contains(new.index, touched)
+
+        both = touched[was_there & is_there]
+        before, after = old.loc[both], new.loc[both]
+        changed = _rows_differ(before, after)
+
+        return {
+            'as_of': end,
+            'added': new.loc[touched[~was_there & is_there]],
+            'removed': old.loc[touched[was_there & ~is_there]],
+            'before': before[changed],
+            'after': after[changed]
+        }
+
+    def stats_cube(self, as_of=None):
+        """
+        Segment stats for the market at a date (default: now). The current
+        cube is kept and updated by each ingest; past ones are built fresh.
+        """
+        if as_of is not None and parse_date(as_of) < self.latest_date:
+            cube = SegmentStatsCube()
+            cube.build(self._state(as_of))
+            return cube
+
+        if self._cube is None:
+            self._cube = SegmentStatsCube(source=lambda: self.current)
+            self._cube.build(self.current)
+        return self._cube
+
+    def compact(self, before=None):
+        """
+        Fold changes up to the end of `before` (default: all of them) into
+        a new base, and drop them from the log. Returns how many were folded.
+        """
+        before = parse_date(before) if before is not None else self.latest_date
+        folded = [entry for entry in self.entries if entry['as_of'] <= before]
+        remaining = self.entries[len(folded):]
+        if not folded:
+            return 0
+
+        base = self._replay(folded)
+        seq = folded[-1]['seq']
+        old_base = self.meta['base']
+        meta = {'as_of': max(before, self.meta['as_of']), 'seq': seq, 'base': f'base-{seq}.csv'}
+
+        # The new base only counts once meta.json points at it, and log
+        # entries it already holds are skipped on load, so a crash at any
+        # point leaves a consistent log
+        _write_atomic(os.path.join(self.path, meta['base']), lambda f: base.reset_index().to_csv(f, index=False))
+        _write_atomic(os.path.join(self.path, 'meta.json'), lambda f: json.dump(meta, f))
+        _write_atomic(self._log_path, lambda f: f.writelines(
+            json.dumps(entry, default=_json_default) + '\n' for entry in remaining
+        ))
+        if old_base != meta['base']:
+            os.remove(os.path.join(self.path, old_base))
+
+        self.meta = meta
+        self.base = base
+        self.entries = remaining
+        return len(folded)
+
+    def publish(self, path=DATA_PATH, stats_path=STATS_PATH):
+        """
+        Write the current market to the competitor CSV the app reads, and
+        the up-to-date stats cube beside it, versioned with the CSV's hash -
+        so the app and the service load the cube instead of rebuilding it,
+        and so does this process's pricing engine
+        """
+        _write_atomic(path, lambda f: self.snapshot().to_csv(f, index=False))
+        cube = copy.deepcopy(self.stats_cube())
+        cube.version = file_hash(path)
+        cube.save(stats_path)
+        use_stats_cube(cube, cube.version)
+        return len(self.current)
+
+
+def read_changes(path):
+    """
+    Changes from a CSV or JSONL file, with listing IDs kept as text
+    """
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        return pd.read_json(path, lines=True, dtype={LISTING_ID: str})
+    return pd.read_csv(path, dtype={LISTING_ID: str})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Competitor market change log')
+    parser.add_argument('--path', default=MARKET_PATH, help='Market log directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init_parser = commands.add_parser('init', help='Start the log from a competitor CSV')
+    init_parser.add_argument('--csv', default=DATA_PATH)
+    init_parser.add_argument('--as-of', help='Date the data is from (default today)')
+
+    ingest_parser = commands.add_parser('ingest', help='Apply a CSV/JSONL of upserts and deletes')
+    ingest_parser.add_argument('changes')
+    ingest_parser.add_argument('--as-of', help='Date the changes apply from (default today)')
+
+    snapshot_parser = commands.add_parser('snapshot', help='Write the market as of a date')
+    snapshot_parser.add_argument('--as-of', help='Default now')
+    snapshot_parser.add_argument('--output', required=True)
+
+    diff_parser = commands.add_parser('diff', help='Summarise changes between two dates')
+    diff_parser.add_argument('start')
+    diff_parser.add_argument('end', nargs='?')
+
+    compact_parser = commands.add_parser('compact', help='Fold old changes into the base')
+    compact_parser.add_argument('--keep-days', type=int, default=0, help='Days of history to keep replayable')
+
+    publish_parser = commands.add_parser('publish', help='Write the current market for the app')
+    publish_parser.add_argument('--output', default=DATA_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        market = MarketLog.create(pd.read_csv(args.csv), args.path, as_of=args.as_of)
+        print(f"✅ Started market log in {args.path} with {len(market.current):,} listings")
+    else:
+        market = MarketLog(args.path)
+
+    if args.command == 'ingest':
+        delta = market.ingest(read_changes(args.changes), as_of=args.as_of)
+        print(f"✅ {delta['as_of']}: {len(delta['added']):,} added, {len(delta['after']):,} changed, "
+              f"{len(delta['removed']):,} removed")
+    elif args.command == 'snapshot':
+        market.snapshot(args.as_of).to_csv(args.output, index=False)
+        print(f"✅ Wrote the market as of {args.as_of or market.latest_date} to {args.output}")
+    elif args.command == 'diff':
+        delta = market.diff(args.start, args.end)
+        print(f"📊 {args.start} -> {delta['as_of']}: {len(delta['added']):,} added, "
+              f"{len(delta['after']):,} changed, {len(delta['removed']):,} removed")
+        if len(delta['after']):
+            moves = delta['after']['nightly_rate'] - delta['before']['nightly_rate']
+            print(f"   Average price change: £{moves.mean():+.2f}")
+    elif args.command == 'compact':
+        cutoff = datetime.date.fromisoformat(market.latest_date) - datetime.timedelta(days=args.keep_days)
+        folded = market.compact(before=cutoff)
+        print(f"✅ Folded {folded:,} changes into the base; history kept from {market.meta['as_of']}")
+    elif args.command == 'publish':
+        rows = market.publish(args.output)
+        print(f"✅ Published {rows:,} listings to {args.output}")
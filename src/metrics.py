@@ -0,0 +1,219 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds, in seconds. In-memory stages take
+# microseconds to milliseconds, loading data and Claude calls take seconds.
+STAGE_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+LLM_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+TOKEN_BUCKETS = [100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A count that only goes up, per combination of label values
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        """
+        (name, labels, value) for each series
+        """
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets, with a running sum and count
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.labelnames = tuple(labelnames)
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def summary(self, **labels):
+        """
+        {'count', 'sum', 'mean'} for one series
+        """
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        if series is None:
+            return {'count': 0, 'sum': 0.0, 'mean': None}
+        return {'count': series[2], 'sum': series[1], 'mean': series[1] / series[2]}
+
+    def samples(self):
+        """
+        (name, labels, value) for each series - cumulative buckets, then sum and count
+        """
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + [float('inf')], counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(float(bound))), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """
+    The set of metrics exported together
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'pricing_stage_seconds', 'Time spent in each stage of the pricing flow.', STAGE_BUCKETS, ['stage']
+))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    'llm_request_seconds', 'Latency of Claude API calls.', LLM_BUCKETS, ['operation', 'outcome']
+))
+LLM_REQUESTS = registry.register(Counter(
+    'llm_requests_total', 'Claude API calls by outcome (ok, api_error, parse_error).', ['operation', 'outcome']
+))
+LLM_TOKENS = registry.register(Counter(
+    'llm_tokens_total', 'Tokens sent to and received from Claude.', ['operation', 'direction']
+))
+LLM_REQUEST_TOKENS = registry.register(Histogram(
+    'llm_request_tokens', 'Tokens per Claude API call.', TOKEN_BUCKETS, ['direction']
+))
+LLM_FIRST_FIELD_SECONDS = registry.register(Histogram(
+    'llm_time_to_first_field_seconds',
+    'Time from asking Claude for insights to the first usable field, streamed or blocking.',
+    LLM_BUCKETS, ['mode']
+))
+LLM_RETRIES = registry.register(Counter(
+    'llm_retries_total', 'Claude calls retried after a transient error.', ['operation']
+))
+LLM_HEDGES = registry.register(Counter(
+    'llm_hedged_requests_total', 'Slow Claude calls raced by a second request, by which one won.',
+    ['operation', 'winner']
+))
+LLM_CIRCUIT_OPENED = registry.register(Counter(
+    'llm_circuit_opened_total', 'Times repeated failures paused Claude calls.'
+))
+LLM_FALLBACKS = registry.register(Counter(
+    'llm_fallbacks_total', 'AI insights replaced by the base recommendation, by reason.', ['reason']
+))
+INSIGHT_CACHE_LOOKUPS = registry.register(Counter(
+    'insight_cache_lookups_total', 'AI insight cache lookups by result (hit, miss).', ['result']
+))
+
+# Spans finished in the current context, if someone is collecting them
+_trace = ContextVar('trace', default=None)
+
+
+def start_trace():
+    """
+    Start collecting the spans finished from here on in this thread / task.
+    Returns the list they are appended to, as (stage, milliseconds).
+    """
+    trace = []
+    _trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a stage of the pricing flow. Works as a decorator too.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed * 1000))
+
+
+def record_llm_call(operation, seconds, outcome, usage=None):
+    """
+    Record one Claude API call - outcome is 'ok', 'api_error' or 'parse_error'
+    """
+    LLM_REQUEST_SECONDS.observe(seconds, operation=operation, outcome=outcome)
+    LLM_REQUESTS.inc(operation=operation, outcome=outcome)
+    if usage is not None:
+        for direction, tokens in (('input', usage.input_tokens), ('output', usage.output_tokens)):
+            LLM_TOKENS.inc(tokens, operation=operation, direction=direction)
+            LLM_REQUEST_TOKENS.observe(tokens, direction=direction)
+
+
+def render_prometheus():
+    return registry.render()
@@ -1,27 +1,46 @@
+import numpy as np
 import pandas as pd
 
-def get_competitor_data(location, property_type, bedrooms):
+from src.data_handler import EXACT_KEYS, SIMILAR_KEYS, get_competitor_source
+from src.metrics import span
+from src.segment_stats import get_stats_cube
+from src.similarity import get_similarity_index
+
+@span('filter')
+def get_competitor_data(location, property_type, bedrooms, columns=None):
     """
     Filter competitor data based on property characteristics
     """
-    # Load the data
-    df = pd.read_csv('data/competitors.csv')
-    
-    # Filter for exact matches
-    exact_matches = df[
-        (df['location'] == location) &
-        (df['property_type'] == property_type) &
-        (df['bedrooms'] == bedrooms)
-    ]
+    # Columnar store if it has been built, otherwise the shared in-memory index
+    source = get_competitor_source()
     
-    # Also get similar properties (same location and bedrooms, different type)
-    similar = df[
-        (df['location'] == location) &
-        (df['bedrooms'] == bedrooms)
-    ]
+    # Exact matches, plus similar properties (same location and bedrooms, any type)
+    exact_matches, similar = source.lookup(location, property_type, bedrooms, columns=columns)
     
     return exact_matches, similar
 
+# How many of the most comparable listings to find for a property
+COMPARABLE_LISTINGS = 10
+
+@span('similarity')
+def get_comparable_competitors(property_details, k=COMPARABLE_LISTINGS, max_distance=None):
+    """
+    Find the k competitors most like the property, amenities included.
+    
+    Returns (nearest, similar) - use it in place of get_competitor_data
+    when calling calculate_price_stats, so the k nearest listings take the
+    place of the exact matches.
+    """
+    nearest = get_similarity_index().query(property_details, k=k, max_distance=max_distance)
+    
+    # Same-area fallback, as for the exact/similar split
+    _, similar = get_competitor_data(
+        property_details['location'], property_details['property_type'], property_details['bedrooms']
+    )
+    
+    return nearest, similar
+
+@span('stats')
 def calculate_price_stats(exact_matches, similar):
     """
     Calculate pricing statistics from competitor data
@@ -48,58 +67,271 @@ def calculate_price_stats(exact_matches, similar):
     
     return stats
 
-def generate_base_recommendation(stats):
+@span('stats')
+def get_segment_stats(location, property_type, bedrooms):
+    """
+    Pricing statistics for a segment from the precomputed stats cube
+    (same result as calculate_price_stats on get_competitor_data's output,
+    plus p25/p50/p75 percentiles)
+    """
+    return get_stats_cube().stats(location, property_type, bedrooms)
+
+def generate_base_recommendation(stats, use_median=False):
     """
     Generate a basic pricing recommendation from stats
+    
+    With use_median=True the median (p50) is used instead of the average
+    when the stats include percentiles (see get_segment_stats), and the
+    interquartile range is reported alongside it.
     """
     if stats['exact_count'] > 0:
         # We have exact matches - use their average as baseline
+        level = 'exact'
         recommended_price = stats['exact_avg']
         confidence = "High"
         reasoning = f"Based on {stats['exact_count']} similar properties"
     elif stats['similar_count'] > 0:
         # No exact matches, use similar properties
+        level = 'similar'
         recommended_price = stats['similar_avg']
         confidence = "Medium"
         reasoning = f"Based on {stats['similar_count']} properties in same area"
     else:
         # No data at all
+        level = None
         recommended_price = None
         confidence = "Low"
         reasoning = "Insufficient competitor data"
     
-    return {
+    recommendation = {
         'price': recommended_price,
         'confidence': confidence,
         'reasoning': reasoning
     }
-def prepare_chart_data(exact_matches, similar, recommended_price, property_details):
+    
+    # Median is less skewed by luxury outliers than the average
+    if use_median and level and stats.get(f'{level}_p50') is not None:
+        error = stats.get('quantile_error', 0)
+        recommendation['price'] = stats[f'{level}_p50']
+        recommendation['iqr'] = (stats[f'{level}_p25'], stats[f'{level}_p75'])
+        recommendation['error_bound'] = error
+        recommendation['reasoning'] += (
+            f" (median price; middle 50% between £{stats[f'{level}_p25']:.2f} and "
+            f"£{stats[f'{level}_p75']:.2f}, ±{error:.0%})"
+        )
+    
+    return recommendation
+
+def _segment_stats(competitors, keys, prefix):
+    """
+    Mean, min, max and count of nightly rates for every segment
+    """
+    grouped = competitors.groupby(keys, sort=False, observed=True)['nightly_rate']
+    # 'size' rather than 'count' so it matches len() of the filtered rows
+    stats = grouped.agg(['min', 'max', 'size'])
+    # Series.mean on each segment's rates (in file order, as a lookup returns
+    # them) - the groupby mean sums differently and can be a bit or two off
+    stats.insert(0, 'mean', grouped.apply(lambda rates: rates.mean()))
+    stats.columns = [f'{prefix}_avg', f'{prefix}_min', f'{prefix}_max', f'{prefix}_count']
+    return stats.reset_index()
+
+# Per-segment stats of the current competitor data, for price_portfolio
+_portfolio_stats = None
+
+def get_portfolio_stats():
+    """
+    Get the shared (version, exact, similar) per-segment stats tables,
+    rebuilding them if the competitor data changed
+    """
+    global _portfolio_stats
+    
+    source = get_competitor_source()
+    version = source.version
+    if _portfolio_stats is None or _portfolio_stats[0] != version:
+        competitors = source.read(columns=EXACT_KEYS + ['nightly_rate'])
+        _portfolio_stats = (
+            version,
+            _segment_stats(competitors, EXACT_KEYS, 'exact'),
+            _segment_stats(competitors, SIMILAR_KEYS, 'similar')
+        )
+    
+    return _portfolio_stats
+
+@span('portfolio')
+def price_portfolio(properties_df, competitors=None):
+    """
+    Price many properties at once.
+
+    Gives the same result as get_competitor_data -> calculate_price_stats ->
+    generate_base_recommendation for each row of properties_df (which needs
+    location, property_type and bedrooms columns), but aggregates the
+    competitor data once per segment instead of filtering it per property.
+
+    Without `competitors`, the current competitor data's segment stats are
+    worked out once and shared, so pricing a big file a chunk at a time
+    doesn't aggregate the data again for every chunk.
+    """
+    if competitors is None:
+        _, exact_stats, similar_stats = get_portfolio_stats()
+    else:
+        exact_stats = _segment_stats(competitors, EXACT_KEYS, 'exact')
+        similar_stats = _segment_stats(competitors, SIMILAR_KEYS, 'similar')
+    
+    # Per-segment stats, joined onto each property
+    merged = (
+        properties_df[EXACT_KEYS]
+        .merge(exact_stats, on=EXACT_KEYS, how='left')
+        .merge(similar_stats, on=SIMILAR_KEYS, how='left')
+    )
+    
+    exact_count = merged['exact_count'].fillna(0).astype(int).to_numpy()
+    similar_count = merged['similar_count'].fillna(0).astype(int).to_numpy()
+    has_exact = exact_count > 0
+    has_similar = similar_count > 0
+    
+    # Same fallback order as generate_base_recommendation
+    price = np.where(has_exact, merged['exact_avg'], np.where(has_similar, merged['similar_avg'], np.nan))
+    confidence = np.select([has_exact, has_similar], ['High', 'Medium'], default='Low')
+    
+    exact_reasoning = 'Based on ' + pd.Series(exact_count).astype(str) + ' similar properties'
+    similar_reasoning = 'Based on ' + pd.Series(similar_count).astype(str) + ' properties in same area'
+    reasoning = np.select(
+        [has_exact, has_similar],
+        [exact_reasoning.to_numpy(dtype=object), similar_reasoning.to_numpy(dtype=object)],
+        default='Insufficient competitor data'
+    )
+    
+    return pd.DataFrame({
+        'price': price,
+        'confidence': confidence,
+        'reasoning': reasoning,
+        'exact_count': exact_count,
+        'similar_count': similar_count
+    }, index=properties_df.index)
+
+# Chart summaries have a fixed size, however many listings a segment has
+CHART_BINS = 20
+CHART_SAMPLE_SIZE = 10
+
+# Above this many listings, summaries are worked out from a random sample
+SUMMARY_MAX_ROWS = 100_000
+
+def summarize_prices(rates, bins=CHART_BINS, sample_size=CHART_SAMPLE_SIZE, max_rows=SUMMARY_MAX_ROWS, seed=0):
     """
-    Prepare data for price comparison visualization
+    Bounded-size summary of a set of nightly rates for charting.
+    
+    Returns a dict with:
+    - histogram: DataFrame of bin_start, bin_end, count, between the box
+      plot whiskers (rates beyond them are counted in the end bins)
+    - box: min, q1, median, q3, max, whiskers (1.5 x IQR) and outlier count
+    - sample: positions of representative rates - the middle rate of each
+      of sample_size equal-sized price bands, cheapest first
+    
+    With more than max_rows rates everything is estimated from a uniform
+    random sample of max_rows (counts are scaled back up), so the cost
+    stops growing with the segment size.
     """
-    import pandas as pd
+    rates = np.asarray(rates, dtype=np.float64)
+    rows = len(rates)
+    if rows == 0:
+        return {
+            'rows': 0,
+            'summarised': 0,
+            'histogram': pd.DataFrame({'bin_start': [], 'bin_end': [], 'count': []}),
+            'box': None,
+            'sample': np.array([], dtype=np.int64)
+        }
+    
+    if rows > max_rows:
+        positions = np.random.default_rng(seed).integers(0, rows, max_rows)
+    else:
+        positions = np.arange(rows)
+    
+    order = np.argsort(rates[positions], kind='stable')
+    values = rates[positions][order]
+    summarised = len(values)
+    scale = rows / summarised
     
-    chart_data = []
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    # Whiskers end at the furthest rates inside the fences
+    low_cut = np.searchsorted(values, q1 - 1.5 * iqr, side='left')
+    high_cut = np.searchsorted(values, q3 + 1.5 * iqr, side='right')
+    lower_whisker, upper_whisker = values[low_cut], values[high_cut - 1]
     
+    if upper_whisker > lower_whisker:
+        span_range = (lower_whisker, upper_whisker)
+    else:
+        span_range = (lower_whisker - 0.5, upper_whisker + 0.5)
+    counts, edges = np.histogram(np.clip(values, *span_range), bins=min(bins, summarised), range=span_range)
+    
+    bands = min(sample_size, summarised)
+    middles = ((np.arange(bands) + 0.5) * summarised / bands).astype(np.int64)
+    
+    return {
+        'rows': rows,
+        'summarised': summarised,
+        'histogram': pd.DataFrame({
+            'bin_start': edges[:-1],
+            'bin_end': edges[1:],
+            'count': np.rint(counts * scale).astype(np.int64)
+        }),
+        'box': {
+            'min': float(values[0]),
+            'q1': float(q1),
+            'median': float(median),
+            'q3': float(q3),
+            'max': float(values[-1]),
+            'lower_whisker': float(lower_whisker),
+            'upper_whisker': float(upper_whisker),
+            'outliers': int(round((low_cut + summarised - high_cut) * scale))
+        },
+        'sample': positions[order[middles]]
+    }
+
+@span('chart')
+def prepare_chart_summary(exact_matches, similar, recommended_price, property_details,
+                          bins=CHART_BINS, sample_size=CHART_SAMPLE_SIZE):
+    """
+    Summary of the whole competitor segment for the price chart: the
+    summarize_prices histogram and box plot, plus `points` - the
+    representative competitors and your property in prepare_chart_data's
+    format.
+    """
     # Use exact matches if available, otherwise similar
     competitors = exact_matches if len(exact_matches) > 0 else similar
+    summary = summarize_prices(competitors['nightly_rate'], bins=bins, sample_size=sample_size)
     
-    if len(competitors) > 0:
-        # Add competitor data (limit to top 10 for clarity)
-        for idx, row in competitors.head(10).iterrows():
-            chart_data.append({
-                'Property': f"{row['property_type']} ({row['bedrooms']}BR)",
-                'Price': row['nightly_rate'],
-                'Type': 'Competitor',
-                'Details': f"{row['location']}"
-            })
-        
-        # Add your property
-        chart_data.append({
-            'Property': f"YOUR {property_details['property_type']} ({property_details['bedrooms']}BR)",
-            'Price': recommended_price,
-            'Type': 'Your Property',
-            'Details': property_details['location']
-        })
-    
-    return pd.DataFrame(chart_data)
+    if summary['rows'] == 0:
+        summary['points'] = pd.DataFrame()
+        return summary
+    
+    sample = competitors.iloc[summary['sample']]
+    points = pd.DataFrame({
+        'Property': (sample['property_type'].astype(str) + ' (' + sample['bedrooms'].astype(str) + 'BR)').to_numpy(),
+        'Price': sample['nightly_rate'].to_numpy(),
+        'Type': 'Competitor',
+        'Details': sample['location'].astype(str).to_numpy()
+    })
+    
+    # Add your property
+    points.loc[len(points)] = {
+        'Property': f"YOUR {property_details['property_type']} ({property_details['bedrooms']}BR)",
+        'Price': recommended_price,
+        'Type': 'Your Property',
+        'Details': property_details['location']
+    }
+    
+    summary['points'] = points
+    return summary
+
+def prepare_chart_data(exact_matches, similar, recommended_price, property_details,
+                       sample_size=CHART_SAMPLE_SIZE):
+    """
+    Prepare data for price comparison visualization - a representative
+    spread of competitors (one from each price band, cheapest first) and
+    your property
+    """
+    return prepare_chart_summary(
+        exact_matches, similar, recommended_price, property_details, sample_size=sample_size
+    )['points']
@@ -0,0 +1,349 @@
+"""
+Headless HTTP/JSON pricing service, for systems that need prices without
+the Streamlit UI (e.g. a channel manager).
+
+    python3 -m src.pricing_service --port 8000
+
+Endpoints:
+    GET  /health         - liveness check
+    GET  /metrics        - stage timings and Claude usage, Prometheus text format
+    POST /price          - one property: {"location", "property_type", "bedrooms",
+                           optional amenities, optional "with_ai": true,
+                           optional "comparables": true}
+    POST /price/batch    - {"properties": [...], optional "with_ai": true,
+                           optional "comparables": true}
+
+"comparables": true adds the listings most like each property, amenities
+included, and their price stats. bedrooms must be a JSON whole number and
+the amenities JSON true/false. Bodies over MAX_BODY_BYTES, and batches of
+more than MAX_BATCH_SIZE properties, get a 413.
+
+Built on asyncio streams so it has no extra dependencies. The competitor
+data and stats cube are loaded at start-up and kept warm; AI requests share
+one pooled AsyncAnthropic client.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.data_handler import AMENITY_COLUMNS
+from src.llm_analyzer import get_ai_pricing_insights_async
+from src.metrics import render_prometheus, span
+from src.pricing_engine import (calculate_price_stats, generate_base_recommendation, get_comparable_competitors,
+                                get_segment_stats)
+from src.segment_stats import get_stats_cube
+from src.similarity import get_similarity_index
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ['location', 'property_type', 'bedrooms']
+AMENITY_DEFAULTS = {'has_parking': False, 'has_wifi': True, 'pet_friendly': False}
+
+# Largest request body accepted, and most properties in one batch
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 1000
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    """
+    A client error that should be returned as a 400 response (or `status`)
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def to_jsonable(value):
+    """
+    Convert NumPy scalars, tuples and NaN into plain JSON values
+    """
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def parse_content_length(headers):
+    """
+    Body length from the request headers (0 if there's no body)
+    """
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise RequestError("Content-Length must be a whole number")
+    if length < 0:
+        raise RequestError("Content-Length can't be negative")
+    if length > MAX_BODY_BYTES:
+        raise RequestError(f"Body can't be more than {MAX_BODY_BYTES} bytes", status=413)
+    return length
+
+
+def parse_flag(payload, name):
+    """
+    An optional flag (with_ai, comparables), which must be a JSON true or false
+    """
+    value = payload.get(name, False)
+    if not isinstance(value, bool):
+        raise RequestError(f"{name} must be true or false")
+    return value
+
+
+def parse_property(payload):
+    """
+    Validate a property from a request body and fill in amenity defaults
+    """
+    if not isinstance(payload, dict):
+        raise RequestError("Each property must be a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if field not in payload]
+    if missing:
+        raise RequestError(f"Missing fields: {', '.join(missing)}")
+    for field in ['location', 'property_type']:
+        if not isinstance(payload[field], str):
+            raise RequestError(f"{field} must be a string")
+    # bool is an int in Python, but true isn't a number of bedrooms
+    bedrooms = payload['bedrooms']
+    if not isinstance(bedrooms, int) or isinstance(bedrooms, bool):
+        raise RequestError("bedrooms must be a whole number")
+
+    details = {}
+    for field, default in AMENITY_DEFAULTS.items():
+        value = payload.get(field, default)
+        if not isinstance(value, bool):
+            raise RequestError(f"{field} must be true or false")
+        details[field] = value
+    details.update(location=payload['location'], property_type=payload['property_type'], bedrooms=bedrooms)
+    return details
+
+
+class PricingService:
+    """
+    Request handling and shared state (warm data, pooled Claude client)
+    """
+
+    def __init__(self, ai_concurrency=8, api_key=None, base_url=None):
+        self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+        self.base_url = base_url
+        self.ai_concurrency = ai_concurrency
+        self._client = None
+        self._ai_semaphore = None
+        # The pricing engine runs on this one thread. Its shared state (the
+        # competitor index, stats cube and similarity index) is reloaded in
+        # place when the data changes, so two requests must never be in it
+        # at once.
+        self._engine = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pricing')
+
+    def warm_up(self):
+        """
+        Load the competitor data and build the stats cube and similarity
+        index before taking requests
+        """
+        get_stats_cube()
+        get_similarity_index()
+
+    def _get_ai_client(self):
+        if self._client is None:
+            from anthropic import AsyncAnthropic
+
+            kwargs = {'api_key': self.api_key}
+            if self.base_url:
+                kwargs['base_url'] = self.base_url
+            self._client = AsyncAnthropic(**kwargs)
+            self._ai_semaphore = asyncio.Semaphore(self.ai_concurrency)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+        self._engine.shutdown(wait=False)
+
+    @staticmethod
+    def _base_price(details):
+        stats = get_segment_stats(details['location'], details['property_type'], details['bedrooms'])
+        return stats, generate_base_recommendation(stats)
+
+    @staticmethod
+    def _comparables(details):
+        nearest, similar = get_comparable_competitors(details)
+        stats = calculate_price_stats(nearest, similar)
+        return {
+            'count': stats['exact_count'],
+            'avg': stats['exact_avg'],
+            'min': stats.get('exact_min'),
+            'max': stats.get('exact_max'),
+            'listings': nearest[['property_type', 'bedrooms', 'nightly_rate', *AMENITY_COLUMNS, 'distance']]
+            .to_dict('records')
+        }
+
+    async def price_one(self, details, with_ai=False, comparables=False):
+        # Off the event loop, so a slow lookup (or a stats rebuild after the
+        # data changed) doesn't hold up every other connection
+        loop = asyncio.get_running_loop()
+        stats, recommendation = await loop.run_in_executor(self._engine, self._base_price, details)
+        result = {'property': details, 'stats': stats, 'recommendation': recommendation}
+        if comparables:
+            result['comparables'] = await loop.run_in_executor(self._engine, self._comparables, details)
+
+        if with_ai:
+            insights = None
+            if self.api_key and recommendation['price'] is not None:
+                client = self._get_ai_client()
+                async with self._ai_semaphore:
+                    insights = await get_ai_pricing_insights_async(details, stats, recommendation, client=client)
+            result['ai_insights'] = insights
+
+        return result
+
+    async def route(self, method, path, body):
+        """
+        Dispatch a request. Returns (status, payload) - payload is sent as
+        JSON, or as plain text if it is a string.
+        """
+        path = path.split('?')[0]
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, render_prometheus()
+
+        if path not in ('/price', '/price/batch'):
+            return 404, {'error': f"Unknown path {path}"}
+        if method != 'POST':
+            return 405, {'error': "Use POST"}
+
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': "Body must be JSON"}
+        if not isinstance(payload, dict):
+            return 400, {'error': "Body must be a JSON object"}
+
+        try:
+            with_ai = parse_flag(payload, 'with_ai')
+            comparables = parse_flag(payload, 'comparables')
+            if path == '/price':
+                return 200, await self.price_one(parse_property(payload), with_ai, comparables)
+
+            properties = payload.get('properties')
+            if not isinstance(properties, list):
+                raise RequestError("properties must be a list")
+            if len(properties) > MAX_BATCH_SIZE:
+                raise RequestError(f"A batch can't have more than {MAX_BATCH_SIZE} properties", status=413)
+            details = [parse_property(item) for item in properties]
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+
+        results = await asyncio.gather(*(self.price_one(item, with_ai, comparables) for item in details))
+        return 200, {'results': results}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve HTTP/1.1 requests on one (keep-alive) connection
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = parse_content_length(headers)
+                except RequestError as e:
+                    # The body isn't read, so the connection ends here
+                    await self.respond(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length)
+
+                try:
+                    with span('http_request'):
+                        status, payload = await self.route(method, path, body)
+                except Exception:
+                    logger.exception("Error handling %s %s", method, path)
+                    status, payload = 500, {'error': "Internal error"}
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        """
+        Write a response - payload is sent as JSON, or as plain text if it is a string
+        """
+        if isinstance(payload, str):
+            content_type = 'text/plain; version=0.0.4'
+            response = payload.encode('utf-8')
+        else:
+            content_type = 'application/json'
+            response = json.dumps(to_jsonable(payload)).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(response)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+            + response
+        )
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8000, **kwargs):
+    """
+    Run the pricing service until cancelled
+    """
+    service = PricingService(**kwargs)
+
+    started = time.perf_counter()
+    service.warm_up()
+    print(f"🔥 Data loaded in {time.perf_counter() - started:.2f}s")
+
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"💰 Pricing service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless pricing HTTP service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--ai-concurrency', type=int, default=8, help='Max Claude calls in flight')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, ai_concurrency=args.ai_concurrency))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+
+# Quantiles are accurate to within 1% of the true value by default
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative error guarantee (DDSketch).
+
+    Values are counted in logarithmic buckets, so any quantile it returns
+    is within `relative_accuracy` of the true value (1% by default means
+    a true median of £200 is reported as £198-£202). Sketches built on
+    different shards or files can be merged exactly, values can be removed
+    again, and memory grows with the log of the price range, not the
+    number of values.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def bucket_indexes(self, values):
+        """
+        Bucket index for each (positive) value
+        """
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def add_counts(self, indexes, counts, zero_count=0):
+        """
+        Add pre-bucketed counts (see bucket_indexes), negative to remove
+        """
+        for index, count in zip(np.asarray(indexes).tolist(), np.asarray(counts).tolist()):
+            total = self.buckets.get(index, 0) + count
+            if total > 0:
+                self.buckets[index] = total
+            else:
+                self.buckets.pop(index, None)
+        self.zero_count = max(self.zero_count + zero_count, 0)
+        self.count = self.zero_count + sum(self.buckets.values())
+
+    def add(self, values):
+        """
+        Add an array of values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        indexes, counts = np.unique(self.bucket_indexes(positive), return_counts=True)
+        self.add_counts(indexes, counts, zero_count=len(values) - len(positive))
+
+    def remove(self, values):
+        """
+        Remove values that were previously added
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        indexes, counts = np.unique(self.bucket_indexes(positive), return_counts=True)
+        self.add_counts(indexes, -counts, zero_count=-(len(values) - len(positive)))
+
+    def merge(self, other):
+        """
+        Fold another sketch (with the same accuracy) into this one
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can only merge sketches with the same relative accuracy")
+        self.add_counts(list(other.buckets), list(other.buckets.values()), zero_count=other.zero_count)
+
+    def quantiles(self, qs):
+        """
+        Estimated values at quantiles qs (each between 0 and 1)
+        """
+        if self.count == 0:
+            return [None for _ in qs]
+
+        indexes = np.array(sorted(self.buckets), dtype=np.int64)
+        cumulative = self.zero_count + np.cumsum([self.buckets[index] for index in indexes])
+
+        results = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            index = indexes[np.searchsorted(cumulative, rank, side='right')]
+            # Middle of the bucket, in relative terms
+            results.append(float(2 * self.gamma ** index / (self.gamma + 1)))
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'buckets': [[index, count] for index, count in self.buckets.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        indexes = [index for index, _ in data['buckets']]
+        counts = [count for _, count in data['buckets']]
+        sketch.add_counts(indexes, counts, zero_count=data['zero_count'])
+        return sketch
@@ -0,0 +1,531 @@
+import json
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from src.data_handler import (
+    EXACT_KEYS, SIMILAR_KEYS, STORE_PATH, ColumnarStore, build_columnar_store, file_hash, get_competitor_source,
+    open_columnar_store
+)
+from src.metrics import span
+from src.quantile_sketch import DEFAULT_RELATIVE_ACCURACY, QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+STATS_PATH = 'data/segment_stats.json'
+
+# Cube levels - the exact segment and the (location, bedrooms) rollup
+# used for the "similar" fallback
+LEVELS = {'exact': EXACT_KEYS, 'similar': SIMILAR_KEYS}
+
+# Positions in each cell
+SUM, COUNT, MIN, MAX = range(4)
+
+# Percentiles reported from the quantile sketches
+PERCENTILES = {'p25': 0.25, 'p50': 0.5, 'p75': 0.75}
+
+# Datasets at least this big are aggregated on a process pool - unless
+# this is already a worker process (e.g. one of reprice's), which would
+# otherwise start a pool of its own for every worker
+PARALLEL_MIN_ROWS = 1_000_000
+
+# Bucket used for zero (or negative) rates in the sketches
+ZERO_BUCKET = np.iinfo(np.int64).min
+
+
+def aggregate_rates(rows, keys):
+    """
+    Sum, count, min and max of nightly rates for each segment in rows
+    """
+    rates = rows.dropna(subset=['nightly_rate'])
+    grouped = rates.groupby(keys, sort=False, observed=True)['nightly_rate'].agg(['sum', 'size', 'min', 'max'])
+
+    cells = {}
+    for key, total, count, low, high in zip(grouped.index, grouped['sum'], grouped['size'],
+                                            grouped['min'], grouped['max']):
+        cells[key] = [float(total), int(count), float(low), float(high)]
+    return cells
+
+
+def aggregate_sketch_counts(rows, keys, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    """
+    Quantile sketch bucket counts for each segment in rows, as
+    {segment: (bucket indexes, counts, zero count)}
+    """
+    rates = rows.dropna(subset=['nightly_rate'])
+    values = rates['nightly_rate'].to_numpy(dtype=np.float64)
+
+    # Bucket every rate in one go, then count (segment, bucket) pairs
+    buckets = np.full(len(values), ZERO_BUCKET, dtype=np.int64)
+    positive = values > 0
+    buckets[positive] = QuantileSketch(relative_accuracy).bucket_indexes(values[positive])
+    counts = rates[keys].assign(_bucket=buckets).groupby(keys + ['_bucket'], sort=False, observed=True).size()
+
+    segments = {}
+    for index, count in zip(counts.index, counts.to_numpy()):
+        key, bucket = index[:-1], index[-1]
+        if len(key) == 1:
+            key = key[0]
+        indexes, bucket_counts, zero_count = segments.setdefault(key, ([], [], [0]))
+        if bucket == ZERO_BUCKET:
+            zero_count[0] += count
+        else:
+            indexes.append(bucket)
+            bucket_counts.append(count)
+
+    return {key: (indexes, bucket_counts, zero[0]) for key, (indexes, bucket_counts, zero) in segments.items()}
+
+
+class SegmentStatsCube:
+    """
+    Precomputed sum/count/min/max of nightly rates for every segment,
+    plus a quantile sketch per segment for percentiles.
+
+    Appends are folded in without touching history. Removals subtract from
+    sum and count (and the sketch buckets); if a removed rate was a
+    segment's min or max, that segment is marked stale and rebuilt from
+    `source` (a function returning the current competitor frame) the next
+    time it is read.
+    """
+
+    def __init__(self, source=None, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.source = source
+        self.relative_accuracy = relative_accuracy
+        self.version = None
+        self.cells = {level: {} for level in LEVELS}
+        self.sketches = {level: {} for level in LEVELS}
+        self._stale = {level: set() for level in LEVELS}
+
+    def build(self, competitors):
+        """
+        Build every cell from scratch
+        """
+        for level in LEVELS:
+            self.cells[level] = {}
+            self.sketches[level] = {}
+            self._stale[level] = set()
+        self.add(competitors)
+
+    def _update_sketches(self, rows, sign):
+        for level, keys in LEVELS.items():
+            sketches = self.sketches[level]
+            for key, (indexes, counts, zero_count) in aggregate_sketch_counts(
+                    rows, keys, self.relative_accuracy).items():
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = QuantileSketch(self.relative_accuracy)
+                sketch.add_counts(indexes, [sign * count for count in counts], zero_count=sign * zero_count)
+                if sketch.count == 0:
+                    del sketches[key]
+
+    def add(self, rows):
+        """
+        Fold newly added listings into the cube
+        """
+        self._update_sketches(rows, 1)
+        for level, keys in LEVELS.items():
+            cells = self.cells[level]
+            for key, (total, count, low, high) in aggregate_rates(rows, keys).items():
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = [total, count, low, high]
+                    continue
+                cell[SUM] += total
+                cell[COUNT] += count
+                cell[MIN] = min(cell[MIN], low)
+                cell[MAX] = max(cell[MAX], high)
+
+    def remove(self, rows):
+        """
+        Take deleted listings out of the cube
+        """
+        self._update_sketches(rows, -1)
+        for level, keys in LEVELS.items():
+            cells = self.cells[level]
+            for key, (total, count, low, high) in aggregate_rates(rows, keys).items():
+                cell = cells.get(key)
+                if cell is None:
+                    continue
+                cell[SUM] -= total
+                cell[COUNT] -= count
+                if cell[COUNT] <= 0:
+                    del cells[key]
+                    self._stale[level].discard(key)
+                elif low <= cell[MIN] or high >= cell[MAX]:
+                    # Can't know the new min/max without looking at the rows
+                    self._stale[level].add(key)
+
+    def merge(self, other):
+        """
+        Fold in a cube built from a different shard of the data
+        """
+        other._rebuild_stale()
+        for level in LEVELS:
+            cells = self.cells[level]
+            for key, (total, count, low, high) in other.cells[level].items():
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = [total, count, low, high]
+                    continue
+                cell[SUM] += total
+                cell[COUNT] += count
+                cell[MIN] = min(cell[MIN], low)
+                cell[MAX] = max(cell[MAX], high)
+
+            sketches = self.sketches[level]
+            for key, sketch in other.sketches[level].items():
+                if key not in sketches:
+                    sketches[key] = QuantileSketch(self.relative_accuracy)
+                sketches[key].merge(sketch)
+
+    def update_prices(self, old_rows, new_rows):
+        """
+        Apply price changes, given the listings before and after
+        """
+        self.remove(old_rows)
+        self.add(new_rows)
+
+    def apply_delta(self, delta):
+        """
+        Apply a market delta - {'added', 'removed', 'before', 'after'}
+        frames of listings, as returned by MarketLog.ingest and diff
+        """
+        self.remove(delta['removed'])
+        self.add(delta['added'])
+        self.update_prices(delta['before'], delta['after'])
+
+    def _rebuild_stale(self):
+        if not any(self._stale.values()):
+            return
+        if self.source is None:
+            raise ValueError("Stats cube has stale segments but no source to rebuild them from")
+
+        competitors = self.source()
+        for level, keys in LEVELS.items():
+            stale = self._stale[level]
+            if not stale:
+                continue
+
+            segment_keys = pd.MultiIndex.from_frame(competitors[keys])
+            rebuilt = aggregate_rates(competitors[segment_keys.isin(list(stale))], keys)
+            for key in stale:
+                if key in rebuilt:
+                    self.cells[level][key] = rebuilt[key]
+                else:
+                    self.cells[level].pop(key, None)
+            self._stale[level] = set()
+
+    def save(self, path=STATS_PATH):
+        """
+        Write the cube to a JSON file
+        """
+        self._rebuild_stale()
+        payload = {'version': self.version, 'relative_accuracy': self.relative_accuracy}
+        for level in LEVELS:
+            payload[level] = [
+                [key.item() if hasattr(key, 'item') else key for key in segment] + cell
+                for segment, cell in self.cells[level].items()
+            ]
+            payload[f'{level}_sketches'] = [
+                [[key.item() if hasattr(key, 'item') else key for key in segment], sketch.to_dict()]
+                for segment, sketch in self.sketches[level].items()
+            ]
+
+        # Per process, so two processes saving at once don't share a temporary file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=STATS_PATH, source=None):
+        """
+        Read a cube saved with save()
+        """
+        with open(path) as f:
+            payload = json.load(f)
+
+        cube = cls(source=source, relative_accuracy=payload.get('relative_accuracy', DEFAULT_RELATIVE_ACCURACY))
+        cube.version = payload.get('version')
+        for level, keys in LEVELS.items():
+            width = len(keys)
+            cube.cells[level] = {tuple(row[:width]): row[width:] for row in payload[level]}
+            cube.sketches[level] = {
+                tuple(segment): QuantileSketch.from_dict(sketch)
+                for segment, sketch in payload.get(f'{level}_sketches', [])
+            }
+        return cube
+
+    def stats(self, location, property_type, bedrooms):
+        """
+        Pricing statistics for a segment, in the same shape as calculate_price_stats.
+
+        Also includes p25/p50/p75 percentiles from the quantile sketches,
+        each within `quantile_error` (relative) of the true value and never
+        outside the segment's min and max.
+        """
+        self._rebuild_stale()
+
+        stats = {'quantile_error': self.relative_accuracy}
+        lookups = {
+            'exact': (location, property_type, bedrooms),
+            'similar': (location, bedrooms)
+        }
+        for level, key in lookups.items():
+            cell = self.cells[level].get(key)
+            if cell:
+                stats[f'{level}_avg'] = cell[SUM] / cell[COUNT]
+                stats[f'{level}_min'] = cell[MIN]
+                stats[f'{level}_max'] = cell[MAX]
+                stats[f'{level}_count'] = cell[COUNT]
+
+                sketch = self.sketches[level].get(key)
+                if sketch is not None:
+                    for name, value in zip(PERCENTILES, sketch.quantiles(list(PERCENTILES.values()))):
+                        # A bucket's midpoint can be past the data at either end
+                        stats[f'{level}_{name}'] = min(max(value, cell[MIN]), cell[MAX])
+            else:
+                stats[f'{level}_avg'] = None
+                stats[f'{level}_count'] = 0
+
+        return stats
+
+
+def _iter_chunks(source, chunksize):
+    """
+    Yield DataFrame chunks from a CSV path or an iterable of records
+    """
+    if isinstance(source, str):
+        yield from pd.read_csv(source, usecols=EXACT_KEYS + ['nightly_rate'], chunksize=chunksize)
+        return
+
+    batch = []
+    for record in source:
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def stream_segment_stats(source, chunksize=500_000, cube=None, progress=None, save_path=None):
+    """
+    Build segment stats from a competitor dump too big to load at once.
+
+    `source` is a CSV path or an iterable of record dicts. Only one chunk
+    is held in memory at a time, so memory use depends on chunksize and
+    the number of segments, not the size of the input. `progress` is
+    called after each chunk with the metrics so far. Returns the cube and
+    the final metrics (rows, chunks, seconds, rows_per_sec).
+
+    A cube streamed from a CSV is versioned with the file's hash, so once
+    saved to STATS_PATH, get_stats_cube uses it instead of building its own.
+    """
+    if cube is None:
+        cube = SegmentStatsCube()
+        if isinstance(source, str):
+            cube.version = file_hash(source)
+
+    metrics = {'rows': 0, 'chunks': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    started = time.perf_counter()
+
+    for chunk in _iter_chunks(source, chunksize):
+        cube.add(chunk)
+
+        metrics['rows'] += len(chunk)
+        metrics['chunks'] += 1
+        metrics['seconds'] = time.perf_counter() - started
+        metrics['rows_per_sec'] = metrics['rows'] / metrics['seconds'] if metrics['seconds'] else 0.0
+        if progress:
+            progress(dict(metrics))
+
+    if save_path:
+        cube.save(save_path)
+
+    return cube, metrics
+
+
+def _shard_stats(store_path, start, stop, relative_accuracy):
+    """
+    Stats for one shard of the columnar store (runs in a worker process)
+    """
+    rows = ColumnarStore(store_path).read_slice(start, stop, columns=EXACT_KEYS + ['nightly_rate'])
+    cube = SegmentStatsCube(relative_accuracy=relative_accuracy)
+    cube.add(rows)
+    return cube
+
+
+# Worker pools by size, started once and reused
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """
+    The shared process pool with this many workers
+    """
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            # Spawned rather than forked: this runs on the service's and
+            # Streamlit's threads, and forking a threaded process can leave
+            # the child holding another thread's locks
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            if not _pools:
+                # Run on exit in worker processes too (which skip the
+                # threading exit hooks that would otherwise stop the pool),
+                # before the process waits for its children
+                multiprocessing.util.Finalize(None, shutdown_pools, exitpriority=100)
+            _pools[workers] = pool
+        return pool
+
+
+def shutdown_pools():
+    """
+    Stop the shared worker processes
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+def parallel_segment_stats(store_path=STORE_PATH, workers=None, shards=None,
+                           relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    """
+    Build the stats cube on several cores.
+
+    The columnar store is split into row ranges; each worker memory-maps
+    the column files itself (nothing but the range is sent to it), builds
+    a partial cube with sums, counts, min/max and sketches, and the
+    partials are merged. Builds the columnar store first if needed.
+
+    The worker processes are started on the first call and kept for the
+    next. Whether they beat one process depends on the machine - see the
+    parallel_segment_stats cases in benchmark.py.
+    """
+    store = open_columnar_store(store_path)
+    if store is None:
+        store = build_columnar_store(store_path=store_path)
+
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    bounds = np.linspace(0, len(store), shards + 1).astype(np.int64)
+    ranges = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    cube = SegmentStatsCube(relative_accuracy=relative_accuracy)
+    cube.version = store.version
+
+    if workers == 1:
+        partials = (_shard_stats(store_path, start, stop, relative_accuracy) for start, stop in ranges)
+        for partial in partials:
+            cube.merge(partial)
+        return cube
+
+    pool = _get_pool(workers)
+    try:
+        futures = [
+            pool.submit(_shard_stats, store_path, start, stop, relative_accuracy)
+            for start, stop in ranges
+        ]
+        for future in futures:
+            cube.merge(future.result())
+    except BrokenProcessPool:
+        # A worker died - start a new pool next time
+        with _pools_lock:
+            if _pools.get(workers) is pool:
+                del _pools[workers]
+        raise
+
+    return cube
+
+
+def _read_competitors():
+    return get_competitor_source().read(columns=EXACT_KEYS + ['nightly_rate'])
+
+
+# Shared cube for the current competitor data
+_cube = None
+
+
+def load_saved_cube(version, path=STATS_PATH):
+    """
+    The cube saved at `path` if it was built from the data at `version`,
+    otherwise None
+    """
+    try:
+        cube = SegmentStatsCube.load(path, source=_read_competitors)
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing, half-written or from an older format
+        return None
+    return cube if cube.version == version else None
+
+
+def get_stats_cube():
+    """
+    Get the shared stats cube, rebuilding it if the competitor data changed.
+
+    A cube saved to STATS_PATH for the current data (by stream_segment_stats
+    or an earlier build) is loaded instead of being rebuilt, and a rebuilt
+    one is saved there for the next process.
+    """
+    global _cube
+
+    source = get_competitor_source()
+    version = source.version
+    if _cube is None or _cube.version != version:
+        cube = load_saved_cube(version)
+        if cube is None:
+            with span('build_stats'):
+                if (isinstance(source, ColumnarStore) and len(source) >= PARALLEL_MIN_ROWS
+                        and multiprocessing.parent_process() is None):
+                    # Big enough that spreading it over the cores can pay off
+                    cube = parallel_segment_stats(source.path)
+                    cube.source = _read_competitors
+                else:
+                    cube = SegmentStatsCube(source=_read_competitors)
+                    cube.build(_read_competitors())
+            cube.version = version
+            try:
+                cube.save(STATS_PATH)
+            except OSError as e:
+                logger.warning("Could not save the stats cube: %s", e)
+        _cube = cube
+
+    return _cube
+
+
+def use_stats_cube(cube, version):
+    """
+    Make `cube` the shared stats cube for the competitor data at `version`
+    (e.g. one a MarketLog has kept up to date), instead of building one
+    """
+    global _cube
+
+    cube.source = _read_competitors
+    cube.version = version
+    _cube = cube
+
+
+if __name__ == '__main__':
+    import sys
+
+    dump_path = sys.argv[1] if len(sys.argv) > 1 else 'data/competitors.csv'
+
+    def show_progress(metrics):
+        print(f"  {metrics['rows']:,} rows ({metrics['rows_per_sec']:,.0f} rows/sec)")
+
+    print(f"📥 Aggregating {dump_path}...")
+    cube, metrics = stream_segment_stats(dump_path, progress=show_progress, save_path=STATS_PATH)
+    print(f"✅ Wrote stats for {len(cube.cells['exact'])} segments to {STATS_PATH} "
+          f"in {metrics['seconds']:.1f}s")
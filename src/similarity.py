@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from src.data_handler import AMENITY_COLUMNS, as_flags, get_competitor_source, is_flag_set
+
+# How much each feature counts towards the distance between two listings.
+# One bedroom of difference is the unit; a different property type costs
+# a bit less, a missing amenity a quarter of that.
+FEATURE_WEIGHTS = {
+    'bedrooms': 1.0,
+    'property_type': 0.75,
+    'has_parking': 0.25,
+    'has_wifi': 0.25,
+    'pet_friendly': 0.25,
+}
+
+
+class CompetitorSimilarityIndex:
+    """
+    Nearest-neighbour search over competitor listings.
+
+    Listings are encoded as weighted numeric vectors (bedrooms, property
+    type one-hot, amenity flags). Most listings share one of a small number
+    of distinct vectors, so rows are grouped by (location, vector): a
+    query computes distances to the distinct vectors in its own location in
+    one vectorized step, then takes rows from the closest groups. Query
+    cost depends on the number of distinct listing profiles, not rows.
+    """
+
+    def __init__(self, competitors, weights=None):
+        self.weights = dict(FEATURE_WEIGHTS, **(weights or {}))
+        self.competitors = competitors
+        self.property_types = list(pd.Categorical(competitors['property_type']).categories)
+
+        locations = pd.Categorical(competitors['location'])
+        features = self._encode(competitors)
+
+        # Distinct (location, vector) groups, numbered in sorted order so
+        # each location is a contiguous block of groups
+        keyed = pd.DataFrame(features)
+        keyed.insert(0, 'location', locations.codes)
+        group_of_row = keyed.groupby(list(keyed.columns), sort=True).ngroup().to_numpy()
+
+        # Row positions for each group, in file order
+        self._rows = np.argsort(group_of_row, kind='stable')
+        self._offsets = np.searchsorted(group_of_row[self._rows], np.arange(group_of_row.max(initial=-1) + 2))
+
+        first_rows = self._rows[self._offsets[:-1]]
+        self.vectors = np.ascontiguousarray(features[first_rows])
+        self._norms = (self.vectors ** 2).sum(axis=1)
+
+        self._blocks = {}
+        group_locations = locations.codes[first_rows]
+        for code, location in enumerate(locations.categories):
+            start, stop = np.searchsorted(group_locations, [code, code + 1])
+            if stop > start:
+                self._blocks[location] = (int(start), int(stop))
+
+    def _encode(self, rows):
+        """
+        Weighted feature vectors for a frame of listings
+        """
+        # The last column is for types not in the data, so they differ from every known type
+        type_codes = pd.Categorical(rows['property_type'], categories=self.property_types).codes
+        one_hot = np.zeros((len(rows), len(self.property_types) + 1), dtype=np.float32)
+        one_hot[np.arange(len(rows)), np.where(type_codes >= 0, type_codes, len(self.property_types))] = 1.0
+        # A type mismatch differs in two one-hot columns - scale so it costs the full weight
+        one_hot *= self.weights['property_type'] / np.sqrt(2)
+
+        columns = [np.asarray(rows['bedrooms'], dtype=np.float32)[:, None] * self.weights['bedrooms'], one_hot]
+        for amenity in AMENITY_COLUMNS:
+            columns.append(as_flags(rows[amenity]).astype(np.float32)[:, None] * self.weights[amenity])
+
+        return np.ascontiguousarray(np.hstack(columns))
+
+    def _encode_one(self, property_details):
+        """
+        Feature vector for a single property (no pandas overhead)
+        """
+        vector = np.zeros(2 + len(self.property_types) + len(AMENITY_COLUMNS), dtype=np.float32)
+        vector[0] = float(property_details['bedrooms']) * self.weights['bedrooms']
+        if property_details['property_type'] in self.property_types:
+            position = 1 + self.property_types.index(property_details['property_type'])
+        else:
+            position = 1 + len(self.property_types)
+        vector[position] = self.weights['property_type'] / np.sqrt(2)
+        for position, amenity in enumerate(AMENITY_COLUMNS, start=2 + len(self.property_types)):
+            if is_flag_set(property_details.get(amenity, False)):
+                vector[position] = self.weights[amenity]
+        return vector
+
+    def query(self, property_details, k=10, max_distance=None):
+        """
+        The k competitors in the same location most like the property,
+        closest first (ties in file order), with a 'distance' column
+        """
+        block = self._blocks.get(property_details['location'])
+        if block is None or k <= 0:
+            return self.competitors.iloc[0:0].assign(distance=np.array([], dtype=np.float32))
+
+        start, stop = block
+        query = self._encode_one(property_details)
+
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, for every distinct vector in the location
+        squared = self._norms[start:stop] - 2 * (self.vectors[start:stop] @ query) + query @ query
+        np.maximum(squared, 0, out=squared)
+
+        # Closest groups until we have k rows, plus any tied with the last one
+        order = np.argsort(squared, kind='stable')
+        groups = start + order
+        sizes = self._offsets[groups + 1] - self._offsets[groups]
+        enough = min(np.searchsorted(np.cumsum(sizes), k), len(order) - 1)
+        used = squared[order] <= squared[order[enough]]
+
+        # At most k rows from each group are ever needed
+        positions = []
+        distances = []
+        for group, group_squared in zip(groups[used], squared[order[used]]):
+            rows = self._rows[self._offsets[group]:min(self._offsets[group + 1], self._offsets[group] + k)]
+            positions.append(rows)
+            distances.append(np.full(len(rows), group_squared, dtype=np.float32))
+        positions = np.concatenate(positions)
+        distances = np.concatenate(distances)
+
+        nearest = np.lexsort((positions, distances))[:k]
+        positions = positions[nearest]
+        distances = np.sqrt(distances[nearest])
+
+        if max_distance is not None:
+            keep = distances <= max_distance
+            positions, distances = positions[keep], distances[keep]
+
+        return self.competitors.iloc[positions].assign(distance=distances)
+
+
+def _read_competitors():
+    return get_competitor_source().read(
+        columns=['location', 'property_type', 'bedrooms', 'nightly_rate'] + AMENITY_COLUMNS
+    )
+
+
+# Shared index for the current competitor data
+_index = None
+
+
+def get_similarity_index():
+    """
+    Get the shared similarity index, rebuilding it if the competitor data changed
+    """
+    global _index
+
+    version = get_competitor_source().version
+    if _index is None or _index.version != version:
+        index = CompetitorSimilarityIndex(_read_competitors())
+        index.version = version
+        _index = index
+
+    return _index
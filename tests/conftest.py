@@ -0,0 +1,29 @@
+import os
+import sys
+
+# Run from anywhere, importing src and the scripts from the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pytest  # noqa: E402
+
+from mock_claude_server import start_mock_server  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """
+    Starts mock Claude servers - mock_server(**kwargs) returns (server, base_url) -
+    and shuts them down after the test
+    """
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = start_mock_server(**kwargs)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
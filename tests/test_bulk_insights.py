@@ -0,0 +1,104 @@
+"""
+Bulk async insights against the mock Claude server
+"""
+import time
+
+import pytest
+
+from mock_claude_server import FaultInjector, fake_reply
+from src import llm_analyzer
+from src.llm_analyzer import TokenRateLimiter, build_pricing_prompt, get_bulk_ai_pricing_insights
+from src.llm_resilience import ResilientCaller
+from src.pricing_engine import generate_base_recommendation, get_segment_stats
+
+pytest.importorskip('anthropic')
+
+
+class ArrivalTimes(FaultInjector):
+    """
+    Records when each request reached the server
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.arrivals = []
+
+    def pick(self, request_number):
+        self.arrivals.append(time.monotonic())
+        return None
+
+
+class SpentLimiter(TokenRateLimiter):
+    """
+    A limiter whose budget for the minute is already spent, so every
+    request waits for its tokens
+    """
+
+    def __init__(self, tokens_per_minute):
+        super().__init__(tokens_per_minute)
+        self.tokens = 0
+
+
+@pytest.fixture
+def bulk_requests():
+    stats = get_segment_stats('London', 'Flat', 2)
+    base = generate_base_recommendation(stats)
+    details = {'location': 'London', 'property_type': 'Flat', 'bedrooms': 2,
+               'has_parking': False, 'has_wifi': True, 'pet_friendly': False}
+    # A different baseline each, which the mock's price follows, to tell the replies apart
+    return [(details, stats, dict(base, price=100.0 + n)) for n in range(8)]
+
+
+@pytest.fixture(autouse=True)
+def fresh_caller(monkeypatch):
+    monkeypatch.setattr(llm_analyzer, '_caller', ResilientCaller(deadline=10))
+
+
+def test_results_come_back_in_input_order(mock_server, bulk_requests):
+    server, base_url = mock_server()
+
+    results = get_bulk_ai_pricing_insights(bulk_requests, concurrency=4, api_key='test', base_url=base_url,
+                                           use_cache=False)
+
+    assert [result['recommended_price'] for result in results] == [
+        round(base['price'] * 1.05, 2) for _, _, base in bulk_requests
+    ]
+    assert server.request_count == len(bulk_requests)
+
+
+def test_semaphore_caps_concurrency(mock_server, bulk_requests):
+    server, base_url = mock_server(latency=0.2)
+
+    started = time.monotonic()
+    results = get_bulk_ai_pricing_insights(bulk_requests, concurrency=3, api_key='test', base_url=base_url,
+                                           use_cache=False)
+
+    assert all(result is not None for result in results)
+    assert server.peak_in_flight == 3
+    # 8 requests, 3 at a time
+    assert time.monotonic() - started >= 3 * 0.2
+
+
+def test_token_bucket_limits_the_rate(mock_server, bulk_requests, monkeypatch):
+    faults = ArrivalTimes()
+    server, base_url = mock_server(faults=faults)
+
+    # Estimate exactly what the mock will charge, so settling leaves the bucket alone
+    def estimate_tokens(prompt):
+        return len(prompt) // 4 + len(fake_reply(prompt)) // 4
+
+    monkeypatch.setattr(llm_analyzer, 'estimate_tokens', estimate_tokens)
+    monkeypatch.setattr(llm_analyzer, 'TokenRateLimiter', SpentLimiter)
+    cost = estimate_tokens(build_pricing_prompt(*bulk_requests[0]))
+    # One request's worth of tokens every 0.1s
+    tokens_per_minute = cost * 60 / 0.1
+
+    requests = bulk_requests[:5]
+    started = time.monotonic()
+    results = get_bulk_ai_pricing_insights(requests, concurrency=8, tokens_per_minute=tokens_per_minute,
+                                           api_key='test', base_url=base_url, use_cache=False)
+
+    assert all(result is not None for result in results)
+    gaps = [later - earlier for earlier, later in zip([started] + faults.arrivals, faults.arrivals)]
+    assert len(gaps) == len(requests)
+    assert min(gaps) >= 0.08
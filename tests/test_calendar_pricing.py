@@ -0,0 +1,92 @@
+"""
+Calendar model fitting and revenue-maximising price calendars
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from create_sample_data import LOCATIONS, night_multipliers, sample_config, write_csv, year_dates
+from src.calendar_pricing import (DEFAULT_ELASTICITY, DEFAULT_OCCUPANCY, PRICE_STEPS, CalendarModel,
+                                  expected_occupancy, price_calendar)
+
+PROPERTIES = pd.DataFrame([
+    {'location': location, 'property_type': 'Flat', 'bedrooms': 2} for location in LOCATIONS
+])
+
+
+def fit_sample(tmp_path, **options):
+    config = sample_config(rows=200_000, **options)
+    path = str(tmp_path / 'competitors.csv')
+    write_csv(config, path)
+    return config, CalendarModel().fit(pd.read_csv(path))
+
+
+@pytest.fixture(scope='module')
+def dated(tmp_path_factory):
+    return fit_sample(tmp_path_factory.mktemp('dated'), dated=True, seasonality=0.3)
+
+
+def test_learns_season_weekdays_and_events_from_dated_rates(dated):
+    config, model = dated
+    truth = night_multipliers(config)
+    learned = model.multipliers(year_dates())[model.location_rows(list(LOCATIONS))]
+    # Only the shape of each location's year is learned, not its level
+    truth /= truth.mean(axis=1, keepdims=True)
+    learned /= learned.mean(axis=1, keepdims=True)
+
+    assert model.learned == ['season', 'weekday', 'events']
+    assert np.abs(learned / truth - 1).mean(axis=1) == pytest.approx([0, 0, 0], abs=0.03)
+    # New Year's Eve in London, and Edinburgh in festival week
+    for location, date in [('London', '2025-12-31'), ('Edinburgh', '2025-08-10')]:
+        night = (list(LOCATIONS).index(location), year_dates().get_loc(pd.Timestamp(date)))
+        assert learned[night] == pytest.approx(truth[night], rel=0.1)
+
+
+def test_months_alone_give_only_a_season(tmp_path):
+    _, model = fit_sample(tmp_path, seasonality=0.3)
+    season = model.season[model.location_rows(['London'])[0]]
+
+    assert model.learned == ['season']
+    assert np.argmax(season) == 7 and np.argmin(season) == 1
+    assert (model.weekday == 1).all() and (model.events == 1).all()
+
+
+def test_undated_rates_leave_every_multiplier_at_one(tmp_path):
+    _, model = fit_sample(tmp_path)
+    assert model.learned == []
+    assert (model.multipliers(year_dates()) == 1).all()
+
+
+def test_picks_the_revenue_maximising_candidate(dated):
+    _, model = dated
+    # Occupancy 0.5 x (1 - 2 (p/m - 1)) earns most at three quarters of the market rate
+    curves = PROPERTIES.assign(occupancy=0.5, elasticity=-2.0)
+    calendar = price_calendar(PROPERTIES, start='2026-01-01', nights=60, curves=curves, prices=[100, 120, 80],
+                              model=model)
+
+    market = calendar['market_rate'][:, :, None]
+    candidates = np.rint(market * PRICE_STEPS)
+    best = np.take_along_axis(candidates, np.argmax(candidates * expected_occupancy(candidates, market, 0.5, -2.0),
+                                                    axis=2)[:, :, None], axis=2)[:, :, 0]
+    np.testing.assert_array_equal(calendar['price'], best)
+    np.testing.assert_allclose(calendar['price'], 0.75 * calendar['market_rate'], atol=1)
+    np.testing.assert_allclose(calendar['occupancy'], expected_occupancy(calendar['price'], calendar['market_rate'],
+                                                                         0.5, -2.0))
+
+
+def test_prices_stay_within_each_propertys_limits(dated):
+    _, model = dated
+    limited = PROPERTIES.assign(min_price=[None, 150, None], max_price=[80, None, None])
+    calendar = price_calendar(limited, start='2026-01-01', prices=[100, 100, 100], model=model)
+    unlimited = price_calendar(PROPERTIES, start='2026-01-01', prices=[100, 100, 100], model=model)
+
+    price = calendar['price']
+    assert price[0].max() == 80 and price[1].min() == 150
+    # Limits bite on some nights only, and leave other properties alone
+    assert (unlimited['price'][0] < 80).any() and (unlimited['price'][0] > 80).any()
+    np.testing.assert_array_equal(np.minimum(unlimited['price'][0], 80), price[0])
+    np.testing.assert_array_equal(unlimited['price'][2], price[2])
+    # The flat base price comparison is held to the same limits
+    assert calendar['summary']['max_price'].iloc[0] == 80
+    flat = 150 * expected_occupancy(150, calendar['market_rate'][1], DEFAULT_OCCUPANCY, DEFAULT_ELASTICITY)
+    assert calendar['summary']['flat_revenue'].iloc[1] == pytest.approx(flat.sum())
@@ -0,0 +1,77 @@
+"""
+The in-memory competitor index and the columnar store
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from create_sample_data import sample_config, write_csv
+from src import data_handler
+from src.data_handler import (CompetitorIndex, build_columnar_store, file_hash, get_competitor_source,
+                              write_columnar_store)
+
+
+def test_index_hash_matches_the_rows_it_loaded(tmp_path, monkeypatch):
+    path = tmp_path / 'competitors.csv'
+    write_csv(sample_config(rows=500), str(path))
+    frame = pd.read_csv(path)
+    original = file_hash(str(path))
+    read_csv = pd.read_csv
+
+    def replaced_mid_load(source, *args, **kwargs):
+        # The file changes between the read and the parse
+        frame.head(10).to_csv(path, index=False)
+        return read_csv(source, *args, **kwargs)
+
+    monkeypatch.setattr(data_handler.pd, 'read_csv', replaced_mid_load)
+    index = CompetitorIndex(str(path))
+
+    assert index.version == original
+    assert len(index.data) == len(frame)
+
+
+def test_store_hash_matches_the_rows_it_holds(tmp_path, monkeypatch):
+    path = tmp_path / 'competitors.csv'
+    write_csv(sample_config(rows=500), str(path))
+    frame = pd.read_csv(path)
+    original = file_hash(str(path))
+    read_csv = pd.read_csv
+
+    def replaced_mid_build(source, *args, **kwargs):
+        frame.head(10).to_csv(path, index=False)
+        return read_csv(source, *args, **kwargs)
+
+    monkeypatch.setattr(data_handler.pd, 'read_csv', replaced_mid_build)
+    store = build_columnar_store(str(path), str(tmp_path / 'store'))
+
+    assert store.version == original
+    assert len(store) == len(frame)
+
+
+@pytest.mark.parametrize('source', ['stale', 'unstamped'])
+def test_store_hashes_the_csv_once_per_change(tmp_path, monkeypatch, source):
+    path = tmp_path / 'competitors.csv'
+    write_csv(sample_config(rows=500), str(path))
+    frame = pd.read_csv(path)
+    if source == 'stale':
+        write_columnar_store(frame, str(tmp_path / 'store'), 'an older version', [0, 0])
+    else:
+        write_columnar_store(frame, str(tmp_path / 'store'), file_hash(str(path)))
+
+    hashes = []
+
+    def counted_hash(csv_path):
+        hashes.append(csv_path)
+        return file_hash(csv_path)
+
+    monkeypatch.setattr(data_handler, 'file_hash', counted_hash)
+    monkeypatch.setattr(data_handler, '_indexes', {})
+    sources = [get_competitor_source(str(path), str(tmp_path / 'store')) for _ in range(5)]
+    assert len(hashes) == 1
+    assert isinstance(sources[-1], CompetitorIndex) == (source == 'stale')
+
+    # Touching the file means checking it again
+    os.utime(path, ns=(1, 1))
+    get_competitor_source(str(path), str(tmp_path / 'store'))
+    assert len(hashes) == 2
@@ -0,0 +1,81 @@
+"""
+The on-disk AI insight cache
+"""
+import numpy as np
+import pytest
+
+from src import insight_cache
+from src.insight_cache import InsightCache, insight_cache_key
+
+PROPERTY = {'location': 'London', 'property_type': 'Flat', 'bedrooms': 2,
+            'has_parking': True, 'has_wifi': True, 'pet_friendly': False}
+STATS = {'exact_avg': 180.123, 'exact_min': 120.0, 'exact_max': 260.0, 'exact_count': 12}
+BASE = {'price': 175.0, 'reasoning': 'Matched to 12 similar properties'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(insight_cache.time, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = InsightCache(str(tmp_path / 'cache.sqlite'), ttl=60)
+    cache.set('key', {'recommended_price': 150})
+
+    clock.now += 60
+    assert cache.get('key') == {'recommended_price': 150}
+    clock.now += 1
+    assert cache.get('key') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 0}
+
+
+def test_evicts_the_least_recently_used(tmp_path, clock):
+    cache = InsightCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('a') == 1
+    clock.now += 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['entries'] == 2
+
+
+def test_entries_survive_reopening(tmp_path, clock):
+    InsightCache(str(tmp_path / 'cache.sqlite')).set('key', {'tips': ['Tip 1']})
+    assert InsightCache(str(tmp_path / 'cache.sqlite')).get('key') == {'tips': ['Tip 1']}
+
+
+def test_key_ignores_representation_differences():
+    key = insight_cache_key(PROPERTY, STATS, BASE, 'model')
+
+    # NumPy scalars, sub-penny float noise, extra fields and key order
+    same = {**{field: PROPERTY[field] for field in reversed(list(PROPERTY))},
+            'bedrooms': np.int64(2), 'has_parking': np.bool_(True), 'name': 'My flat'}
+    stats = {**STATS, 'exact_avg': np.float64(180.1249999), 'exact_count': np.int64(12)}
+    assert insight_cache_key(same, stats, dict(BASE), 'model') == key
+
+
+@pytest.mark.parametrize('change', [
+    lambda details, stats, base: ({**details, 'bedrooms': 3}, stats, base, 'model'),
+    lambda details, stats, base: ({**details, 'pet_friendly': True}, stats, base, 'model'),
+    lambda details, stats, base: (details, {**stats, 'exact_avg': 180.13}, base, 'model'),
+    lambda details, stats, base: (details, stats, {**base, 'price': 176.0}, 'model'),
+    lambda details, stats, base: (details, stats, base, 'another-model'),
+])
+def test_key_changes_with_the_request(change):
+    assert insight_cache_key(*change(PROPERTY, STATS, BASE)) != insight_cache_key(PROPERTY, STATS, BASE, 'model')
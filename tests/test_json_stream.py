@@ -0,0 +1,94 @@
+"""
+The incremental JSON parser behind streamed AI insights
+"""
+import json
+
+import pytest
+
+from src import json_stream
+from src.json_stream import IncrementalJSONParser
+
+INSIGHTS = {
+    'recommended_price': 182.5,
+    'positioning': 'mid-range',
+    'reasoning': 'Cosy "hideaway" \\ near the Tube.\nPets welcome – \U0001F436 été',
+    'tips': ['Offer weekly discounts', {'weekend': [1.1, 1.2], 'note': 'Fri {and} Sat'}],
+    'extras': {'nested': {'deeper': [True, False, None]}, 'empty': {}},
+    'minimum_stay': 2,
+}
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    completed = []
+    partials = []
+    for start in range(0, len(text), size):
+        completed += parser.feed(text[start:start + size])
+        partials.append(parser.partial_string())
+    return parser, completed, partials
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_fields_complete_in_order_whatever_the_chunking(size, ensure_ascii):
+    text = json.dumps(INSIGHTS, ensure_ascii=ensure_ascii)
+    parser, completed, _ = feed_in_chunks(text, size)
+
+    assert parser.done
+    assert completed == list(INSIGHTS.items())
+    assert parser.fields == INSIGHTS
+
+
+def test_ignores_a_fence_and_trailing_text():
+    text = 'Here you go:\n```json\n' + json.dumps(INSIGHTS, indent=2) + '\n```\nAnything else?'
+    parser, completed, _ = feed_in_chunks(text, 5)
+    assert parser.fields == INSIGHTS
+    assert [key for key, _ in completed] == list(INSIGHTS)
+
+
+def test_each_field_is_ready_as_soon_as_it_ends():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"recommended_price": 182.5, "positioning": "mid') == [('recommended_price', 182.5)]
+    assert parser.feed('-range",') == [('positioning', 'mid-range')]
+    assert parser.feed(' "tips": ["a", "b"]}') == [('tips', ['a', 'b'])]
+    assert parser.done
+
+
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_partial_strings_grow_to_the_final_text(ensure_ascii):
+    # Char by char, so escapes (and surrogate pairs) are cut at every point
+    text = json.dumps({'reasoning': INSIGHTS['reasoning'], 'tips': []}, ensure_ascii=ensure_ascii)
+    _, _, partials = feed_in_chunks(text, 1)
+
+    reasoning = [partial[1] for partial in partials if partial]
+    assert reasoning[-1] == INSIGHTS['reasoning']
+    for before, after in zip(reasoning, reasoning[1:]):
+        assert after.startswith(before)
+    # Only while the string is arriving
+    assert partials[0] is None and partials[-1] is None
+
+
+def test_partial_string_decodes_each_character_once(monkeypatch):
+    decoded = []
+    loads = json.loads
+
+    def counting_loads(text, *args, **kwargs):
+        decoded.append(len(text))
+        return loads(text, *args, **kwargs)
+
+    monkeypatch.setattr(json_stream.json, 'loads', counting_loads)
+    reasoning = 'A long, carefully argued explanation \\u00e9 \\" ' * 500
+    text = '{"reasoning": "' + reasoning + '"}'
+    _, _, partials = feed_in_chunks(text, 4)
+
+    expected = loads('"' + reasoning + '"')
+    last = [partial[1] for partial in partials if partial][-1]
+    assert expected.startswith(last) and len(expected) - len(last) < 4
+    # Linear in the reply, not quadratic: a few passes over it at most
+    assert sum(decoded) < 3 * len(text)
+
+
+def test_invalid_value_raises():
+    parser = IncrementalJSONParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"recommended_price": 18x2, "positioning": "budget"}')
@@ -0,0 +1,217 @@
+"""
+ResilientCaller against the mock Claude server, with faults injected
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mock_claude_server import FaultInjector, fake_reply
+from src.llm_analyzer import MODEL, get_packed_ai_pricing_insights
+from src.llm_resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientCaller
+from src.metrics import LLM_HEDGES, LLM_RETRIES
+from src.pricing_engine import generate_base_recommendation, get_segment_stats
+
+anthropic = pytest.importorskip('anthropic')
+
+
+class SlowFirst(FaultInjector):
+    """
+    Only the first request is slow
+    """
+
+    def pick(self, request_number):
+        return 'slow' if request_number == 1 else None
+
+
+@pytest.fixture
+def mock_client(mock_server):
+    def start(**kwargs):
+        server, base_url = mock_server(**kwargs)
+        return server, anthropic.Anthropic(api_key='test', base_url=base_url, max_retries=0)
+    return start
+
+
+def messages_request(client):
+    def request(timeout):
+        return client.messages.create(
+            model=MODEL,
+            max_tokens=100,
+            messages=[{"role": "user", "content": "Price a 2 bedroom Flat in London"}],
+            timeout=timeout
+        )
+    return request
+
+
+def test_deadline_cuts_off_a_slow_reply(mock_client):
+    server, client = mock_client(faults=FaultInjector(slow_rate=1.0, slow_latency=3.0))
+    caller = ResilientCaller(deadline=0.5)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(messages_request(client))
+    assert time.monotonic() - started < 1.5
+
+
+def test_retries_overloaded_errors(mock_client):
+    server, client = mock_client(faults=FaultInjector(fail_first=2, error_status=529))
+    caller = ResilientCaller(deadline=5, backoff_base=0.01)
+    retries = LLM_RETRIES.value(operation='single')
+
+    message = caller.call(messages_request(client))
+
+    assert message.content[0].text
+    assert server.request_count == 3
+    assert LLM_RETRIES.value(operation='single') == retries + 2
+
+
+def test_does_not_retry_client_errors(mock_client):
+    server, client = mock_client(faults=FaultInjector(error_rate=1.0, error_status=400))
+    caller = ResilientCaller(deadline=5, backoff_base=0.01)
+
+    with pytest.raises(anthropic.BadRequestError):
+        caller.call(messages_request(client))
+    assert server.request_count == 1
+    assert caller.breaker.state == 'closed'
+
+
+def test_circuit_opens_after_repeated_failures(mock_client):
+    server, client = mock_client(faults=FaultInjector(error_rate=1.0, error_status=500))
+    caller = ResilientCaller(deadline=5, max_attempts=2, backoff_base=0.01,
+                             breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+    with pytest.raises(anthropic.InternalServerError):
+        caller.call(messages_request(client))
+    # The third failure opens the circuit part-way through the retries
+    with pytest.raises(CircuitOpen):
+        caller.call(messages_request(client))
+    assert caller.breaker.state == 'open'
+    sent = server.request_count
+    assert sent == 3
+
+    with pytest.raises(CircuitOpen):
+        caller.call(messages_request(client))
+    assert server.request_count == sent
+
+
+def test_circuit_lets_a_trial_call_through(mock_client):
+    server, client = mock_client(faults=FaultInjector(fail_first=3, error_status=503))
+    caller = ResilientCaller(deadline=5, max_attempts=3, backoff_base=0.01,
+                             breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+
+    with pytest.raises(anthropic.InternalServerError):
+        caller.call(messages_request(client))
+    assert caller.breaker.state == 'open'
+
+    time.sleep(0.3)
+    assert caller.call(messages_request(client)).content[0].text
+    assert caller.breaker.state == 'closed'
+
+
+def test_hedge_wins_over_a_slow_request(mock_client):
+    server, client = mock_client(faults=SlowFirst(slow_latency=3.0))
+    caller = ResilientCaller(deadline=5, hedge=True, hedge_after=0.1)
+    hedge_wins = LLM_HEDGES.value(operation='single', winner='hedge')
+
+    started = time.monotonic()
+    message = caller.call(messages_request(client))
+
+    assert message.content[0].text
+    assert time.monotonic() - started < 1.5
+    assert server.request_count == 2
+    assert LLM_HEDGES.value(operation='single', winner='hedge') == hedge_wins + 1
+
+
+def test_packed_insights_retry_through_the_caller(mock_server, monkeypatch):
+    server, base_url = mock_server(faults=FaultInjector(fail_first=1, error_status=529))
+    monkeypatch.setattr('src.llm_analyzer._caller', ResilientCaller(deadline=5, backoff_base=0.01))
+
+    stats = get_segment_stats('London', 'Flat', 2)
+    base = generate_base_recommendation(stats)
+    requests = [({'location': 'London', 'property_type': 'Flat', 'bedrooms': 2, 'has_parking': n % 2 == 0,
+                  'has_wifi': True, 'pet_friendly': False}, stats, base)
+                for n in range(3)]
+
+    results, report = get_packed_ai_pricing_insights(requests, api_key='test', base_url=base_url, use_cache=False)
+
+    assert all(result is not None for result in results)
+    assert report['failed'] == 0
+    assert server.request_count == 2
+    # The overloaded attempt was a call too
+    assert report['calls'] == 2
+    assert report['failed_calls'] == 1
+    assert report['calls_saved'] == 1
+
+
+class EmptyFirstClient:
+    """
+    Replies with no content blocks the first time, then like the mock server
+    """
+
+    def __init__(self):
+        self.messages = self
+        self.calls = 0
+
+    def with_options(self, **options):
+        return self
+
+    def create(self, model, max_tokens, messages, **options):
+        self.calls += 1
+        content = [] if self.calls == 1 else [SimpleNamespace(text=fake_reply(messages[0]['content']))]
+        return SimpleNamespace(content=content, usage=SimpleNamespace(input_tokens=100, output_tokens=50))
+
+
+def test_packed_insights_retry_an_empty_reply(monkeypatch):
+    client = EmptyFirstClient()
+    monkeypatch.setattr('src.llm_analyzer.get_client', lambda *args: client)
+    monkeypatch.setattr('src.llm_analyzer._caller', ResilientCaller(deadline=5, backoff_base=0.01))
+
+    stats = get_segment_stats('London', 'Flat', 2)
+    base = generate_base_recommendation(stats)
+    requests = [({'location': 'London', 'property_type': 'Flat', 'bedrooms': 2, 'has_parking': True,
+                  'has_wifi': True, 'pet_friendly': False}, stats, base)]
+
+    results, report = get_packed_ai_pricing_insights(requests, api_key='test', use_cache=False)
+
+    assert results[0] is not None
+    assert (client.calls, report['retried'], report['failed']) == (2, 1, 0)
+
+
+class Opened:
+    """
+    Stands in for an open stream
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+def test_attempt_finishing_after_the_deadline_is_discarded():
+    def request(timeout):
+        time.sleep(0.3)
+        return Opened('late')
+
+    discarded = []
+    caller = ResilientCaller(deadline=0.1)
+    with pytest.raises(DeadlineExceeded):
+        caller.call(request, hedge=False, discard=discarded.append)
+
+    time.sleep(0.5)
+    assert [result.name for result in discarded] == ['late']
+
+
+def test_losing_hedge_is_discarded():
+    def request(timeout):
+        first = not requests
+        requests.append(None)
+        if first:
+            time.sleep(0.3)
+        return Opened('first' if first else 'hedge')
+
+    requests, discarded = [], []
+    caller = ResilientCaller(deadline=5, hedge=True, hedge_after=0.05)
+    winner = caller.call(request, discard=discarded.append)
+
+    time.sleep(0.5)
+    assert winner.name == 'hedge'
+    assert [result.name for result in discarded] == ['first']
@@ -0,0 +1,107 @@
+"""
+The market change log - ingest, replay, diff, compaction and publishing
+"""
+import pandas as pd
+import pytest
+
+from src import segment_stats
+from src.data_handler import DATA_PATH, file_hash
+from src.market_log import LISTING_ID, MarketLog
+from src.segment_stats import SegmentStatsCube, load_saved_cube
+
+LEVELS = {'exact': ['location', 'property_type', 'bedrooms'], 'similar': ['location', 'bedrooms']}
+
+
+@pytest.fixture
+def market(tmp_path):
+    market = MarketLog.create(pd.read_csv(DATA_PATH), str(tmp_path / 'market'), as_of='2026-10-01')
+    # Day one: a price rise, a new listing and a delisting
+    market.ingest([
+        {LISTING_ID: '0', 'nightly_rate': 999.0},
+        {LISTING_ID: 'new-1', 'location': 'Leeds', 'property_type': 'Flat', 'bedrooms': 2,
+         'nightly_rate': 120.0, 'has_parking': True, 'has_wifi': True, 'pet_friendly': False},
+        {LISTING_ID: '1', 'op': 'delete'},
+    ], as_of='2026-10-02')
+    # Day two: the rise is reversed and another listing goes
+    market.ingest([
+        {LISTING_ID: '0', 'nightly_rate': 50.0},
+        {LISTING_ID: '2', 'op': 'delete'},
+    ], as_of='2026-10-03')
+    return market
+
+
+def rates(frame):
+    return frame.set_index(LISTING_ID)['nightly_rate'].to_dict()
+
+
+def test_snapshots_replay_each_day(market):
+    original = rates(market.snapshot('2026-10-01'))
+    day_one = rates(market.snapshot('2026-10-02'))
+    now = rates(market.snapshot())
+
+    assert original == rates(pd.read_csv(DATA_PATH).rename_axis(LISTING_ID).reset_index().astype({LISTING_ID: str}))
+    assert (day_one['0'], day_one['new-1'], '1' in day_one, '2' in day_one) == (999.0, 120.0, False, True)
+    assert (now['0'], '2' in now) == (50.0, False)
+    assert len(now) == len(original) - 1
+
+
+def test_reopening_replays_the_log(market):
+    reopened = MarketLog(market.path)
+    pd.testing.assert_frame_equal(reopened.current, market.current)
+    pd.testing.assert_frame_equal(reopened.snapshot('2026-10-02'), market.snapshot('2026-10-02'))
+
+
+def test_diff_between_days(market):
+    delta = market.diff('2026-10-01', '2026-10-03')
+    assert list(delta['added'].index) == ['new-1']
+    assert sorted(delta['removed'].index) == ['1', '2']
+    assert delta['before']['nightly_rate'].to_dict() == {'0': rates(market.snapshot('2026-10-01'))['0']}
+    assert delta['after']['nightly_rate'].to_dict() == {'0': 50.0}
+
+    # A listing that changed and changed back isn't in the diff
+    market.ingest([{LISTING_ID: '0', 'nightly_rate': delta['before'].loc['0', 'nightly_rate']}], as_of='2026-10-04')
+    assert len(market.diff('2026-10-01')['after']) == 0
+
+
+def test_compaction_keeps_the_market_but_not_old_history(market):
+    now = market.snapshot()
+    day_two = market.snapshot('2026-10-02')
+
+    assert market.compact(before='2026-10-02') == 3
+    reopened = MarketLog(market.path)
+    for log in (market, reopened):
+        pd.testing.assert_frame_equal(log.snapshot(), now)
+        pd.testing.assert_frame_equal(log.snapshot('2026-10-02'), day_two)
+        with pytest.raises(ValueError):
+            log.snapshot('2026-10-01')
+
+
+def test_ingest_keeps_the_cube_up_to_date(market):
+    cube = market.stats_cube()
+    market.ingest([{LISTING_ID: '3', 'nightly_rate': 10.0}, {LISTING_ID: '4', 'op': 'delete'}], as_of='2026-10-05')
+
+    fresh = SegmentStatsCube()
+    fresh.build(market.current)
+    assert market.stats_cube() is cube
+    for location, property_type, bedrooms in market.current.groupby(LEVELS['exact']).groups:
+        assert cube.stats(location, property_type, bedrooms) == pytest.approx(fresh.stats(location, property_type,
+                                                                                           bedrooms))
+
+
+def test_published_cube_is_saved_for_other_processes(market, tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_stats, '_cube', None)
+    csv_path, stats_path = str(tmp_path / 'competitors.csv'), str(tmp_path / 'segment_stats.json')
+
+    assert market.publish(csv_path, stats_path) == len(market.current)
+
+    # What another process finds on disk for the published CSV
+    saved = load_saved_cube(file_hash(csv_path), stats_path)
+    assert saved is not None
+    fresh = SegmentStatsCube()
+    fresh.build(pd.read_csv(csv_path))
+    for level in LEVELS:
+        assert saved.cells[level].keys() == fresh.cells[level].keys()
+        for key, (total, count, low, high) in fresh.cells[level].items():
+            assert saved.cells[level][key] == [pytest.approx(total), count, low, high]
+        for key, sketch in fresh.sketches[level].items():
+            assert saved.sketches[level][key].buckets == sketch.buckets
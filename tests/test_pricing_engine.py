@@ -0,0 +1,76 @@
+"""
+The vectorized portfolio pricer against the single-property path
+"""
+import pandas as pd
+import pytest
+
+from create_sample_data import sample_config, write_csv
+from src import pricing_engine
+from src.data_handler import CompetitorIndex
+from src.pricing_engine import (calculate_price_stats, generate_base_recommendation, get_competitor_data,
+                                price_portfolio)
+
+LOCATIONS = ['London', 'Edinburgh', 'Cornwall', 'Leeds']
+PROPERTY_TYPES = ['Flat', 'House', 'Cottage', 'Castle']
+
+PORTFOLIO = pd.DataFrame([
+    {'location': location, 'property_type': property_type, 'bedrooms': bedrooms}
+    for location in LOCATIONS for property_type in PROPERTY_TYPES for bedrooms in range(1, 5)
+])
+
+
+def single_property(row, source=None):
+    if source is None:
+        exact, similar = get_competitor_data(row['location'], row['property_type'], row['bedrooms'])
+    else:
+        exact, similar = source.lookup(row['location'], row['property_type'], row['bedrooms'])
+    stats = calculate_price_stats(exact, similar)
+    recommendation = generate_base_recommendation(stats)
+    recommendation.update(exact_count=stats['exact_count'], similar_count=stats['similar_count'])
+    return recommendation
+
+
+def assert_same(priced, expected):
+    for (_, row), recommendation in zip(priced.iterrows(), expected):
+        if recommendation['price'] is None:
+            assert pd.isna(row['price'])
+        else:
+            # Exactly equal, not just close
+            assert row['price'] == recommendation['price']
+        for field in ['confidence', 'reasoning', 'exact_count', 'similar_count']:
+            assert row[field] == recommendation[field]
+
+
+def test_matches_the_single_property_path():
+    priced = price_portfolio(PORTFOLIO)
+    assert_same(priced, [single_property(row) for _, row in PORTFOLIO.iterrows()])
+
+
+@pytest.mark.parametrize('seasonality', [0.0, 0.3])
+def test_averages_identical_on_large_segments(tmp_path, seasonality):
+    # Segments of thousands of listings, where summation order shows in the last bits
+    path = str(tmp_path / 'competitors.csv')
+    write_csv(sample_config(rows=200_000, seasonality=seasonality, outlier_rate=0.01), path)
+    index = CompetitorIndex(path)
+
+    priced = price_portfolio(PORTFOLIO, competitors=index.read())
+    assert_same(priced, [single_property(row, index) for _, row in PORTFOLIO.iterrows()])
+
+
+def test_shared_stats_follow_the_data(monkeypatch):
+    monkeypatch.setattr(pricing_engine, '_portfolio_stats', None)
+    version, exact, _ = pricing_engine.get_portfolio_stats()
+    assert pricing_engine.get_portfolio_stats()[1] is exact
+
+    class Changed:
+        version = 'changed'
+
+        def __init__(self, source):
+            self.source = source
+
+        def read(self, columns=None):
+            return self.source.read(columns=columns)
+
+    source = pricing_engine.get_competitor_source()
+    monkeypatch.setattr(pricing_engine, 'get_competitor_source', lambda: Changed(source))
+    assert pricing_engine.get_portfolio_stats()[0] == 'changed'
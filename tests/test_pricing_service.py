@@ -0,0 +1,177 @@
+"""
+The HTTP pricing service, over a real socket
+"""
+import asyncio
+import itertools
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from create_sample_data import LOCATIONS, PROPERTY_TYPES, sample_config, write_csv
+from src.data_handler import AMENITY_COLUMNS, as_flags
+from src.pricing_service import MAX_BATCH_SIZE, MAX_BODY_BYTES, PricingService
+from src.similarity import FEATURE_WEIGHTS, CompetitorSimilarityIndex
+
+PROPERTY = {'location': 'London', 'property_type': 'Flat', 'bedrooms': 2}
+
+
+async def exchange(raw_request):
+    """
+    Send raw bytes to a fresh service and return (status, body) of the reply
+    """
+    service = PricingService(api_key='')
+    server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(raw_request)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def post(path, body, content_length=None):
+    body = json.dumps(body).encode('utf-8') if not isinstance(body, bytes) else body
+    length = len(body) if content_length is None else content_length
+    return (f"POST {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n"
+            f"Connection: close\r\n\r\n").encode('latin-1') + body
+
+
+def test_prices_a_property():
+    status, body = asyncio.run(exchange(post('/price', PROPERTY)))
+    assert status == 200
+    assert body['recommendation']['price'] > 0
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_malformed_content_length_is_a_bad_request(length):
+    status, body = asyncio.run(exchange(post('/price', PROPERTY, content_length=length)))
+    assert status == 400
+    assert 'Content-Length' in body['error']
+
+
+@pytest.mark.parametrize('with_ai', ['false', 1, None])
+def test_with_ai_must_be_a_bool(with_ai):
+    status, body = asyncio.run(exchange(post('/price', dict(PROPERTY, with_ai=with_ai))))
+    assert status == 400
+    assert 'with_ai' in body['error']
+
+
+@pytest.mark.parametrize('field, value', [
+    ('bedrooms', 2.7), ('bedrooms', '2'), ('bedrooms', True),
+    ('has_parking', 'false'), ('pet_friendly', 0), ('location', 5),
+])
+def test_property_fields_must_have_the_right_type(field, value):
+    status, body = asyncio.run(exchange(post('/price', dict(PROPERTY, **{field: value}))))
+    assert status == 400
+    assert field in body['error']
+
+
+def test_body_over_the_limit_is_refused_unread():
+    # Only the headers are sent - the service mustn't wait for the body
+    status, body = asyncio.run(exchange(post('/price', b'', content_length=MAX_BODY_BYTES + 1)))
+    assert status == 413
+
+
+def test_batch_over_the_limit_is_refused():
+    status, body = asyncio.run(exchange(post('/price/batch', {'properties': [PROPERTY] * (MAX_BATCH_SIZE + 1)})))
+    assert status == 413
+    assert str(MAX_BATCH_SIZE) in body['error']
+
+
+def test_batch_keeps_input_order():
+    properties = [dict(PROPERTY, bedrooms=bedrooms) for bedrooms in (3, 1, 2)]
+    status, body = asyncio.run(exchange(post('/price/batch', {'properties': properties})))
+    assert status == 200
+    assert [result['property']['bedrooms'] for result in body['results']] == [3, 1, 2]
+
+
+def test_engine_runs_one_request_at_a_time(monkeypatch):
+    active = []
+    peak = []
+    base_price, comparables = PricingService._base_price, PricingService._comparables
+
+    def one_at_a_time(engine_call):
+        def call(details):
+            active.append(details)
+            peak.append(len(active))
+            time.sleep(0.01)
+            try:
+                return engine_call(details)
+            finally:
+                active.remove(details)
+        return staticmethod(call)
+
+    monkeypatch.setattr(PricingService, '_base_price', one_at_a_time(base_price))
+    monkeypatch.setattr(PricingService, '_comparables', one_at_a_time(comparables))
+    properties = [dict(PROPERTY, bedrooms=bedrooms) for bedrooms in (1, 2, 3, 1, 2, 3)]
+    status, body = asyncio.run(exchange(post('/price/batch', {'properties': properties, 'comparables': True})))
+
+    assert status == 200
+    assert len(peak) == 12
+    assert max(peak) == 1
+
+
+def test_comparables_rank_amenities():
+    property_details = dict(PROPERTY, has_parking=True, pet_friendly=True, comparables=True)
+    status, body = asyncio.run(exchange(post('/price', property_details)))
+    assert status == 200
+    comparables = body['comparables']
+    assert comparables['count'] == len(comparables['listings']) > 0
+    distances = [listing['distance'] for listing in comparables['listings']]
+    assert distances == sorted(distances)
+    assert comparables['min'] <= comparables['avg'] <= comparables['max']
+
+
+def brute_force(competitors, property_details, k):
+    """
+    Positions and distances of the k closest listings, measured one by one
+    """
+    distances = []
+    for position, row in enumerate(competitors.itertuples(index=False)):
+        if row.location != property_details['location']:
+            continue
+        squared = (FEATURE_WEIGHTS['bedrooms'] * (row.bedrooms - property_details['bedrooms'])) ** 2
+        if row.property_type != property_details['property_type']:
+            squared += FEATURE_WEIGHTS['property_type'] ** 2
+        for amenity in AMENITY_COLUMNS:
+            if bool(getattr(row, amenity)) != property_details[amenity]:
+                squared += FEATURE_WEIGHTS[amenity] ** 2
+        distances.append((squared, position))
+    nearest = sorted(distances)[:k]
+    return [position for _, position in nearest], [np.sqrt(squared) for squared, _ in nearest]
+
+
+@pytest.fixture(scope='module')
+def generated_competitors(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('similarity') / 'competitors.csv')
+    write_csv(sample_config(rows=3000), path)
+    competitors = pd.read_csv(path)
+    for amenity in AMENITY_COLUMNS:
+        competitors[amenity] = as_flags(competitors[amenity])
+    return competitors
+
+
+@pytest.mark.parametrize('k', [1, 10, 250])
+def test_comparables_match_a_brute_force_scan(generated_competitors, k):
+    index = CompetitorSimilarityIndex(generated_competitors)
+    for location, property_type, bedrooms, parking, pets in itertools.product(
+            list(LOCATIONS)[:3], list(PROPERTY_TYPES) + ['Yurt'], [1, 3, 6], [False, True], [False, True]):
+        property_details = {'location': location, 'property_type': property_type, 'bedrooms': bedrooms,
+                            'has_parking': parking, 'has_wifi': True, 'pet_friendly': pets}
+        positions, distances = brute_force(generated_competitors, property_details, k)
+
+        nearest = index.query(property_details, k=k)
+        assert list(generated_competitors.index.get_indexer(nearest.index)) == positions
+        assert nearest['distance'].to_numpy() == pytest.approx(distances, abs=1e-5)
+
+
+def test_comparables_must_be_a_bool():
+    status, body = asyncio.run(exchange(post('/price', dict(PROPERTY, comparables='yes'))))
+    assert status == 400
+    assert 'comparables' in body['error']
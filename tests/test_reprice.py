@@ -0,0 +1,41 @@
+"""
+The batch repricer
+"""
+import csv
+
+import pytest
+
+from reprice import reprice
+from src.pricing_engine import calculate_price_stats, generate_base_recommendation, get_competitor_data
+
+ROWS = [
+    {'location': 'London', 'property_type': 'Flat', 'bedrooms': '2', 'has_parking': 'true'},
+    {'location': 'Edinburgh', 'property_type': 'Cottage', 'bedrooms': '1', 'has_parking': ''},
+    {'location': 'London', 'property_type': 'Castle', 'bedrooms': '3', 'has_parking': 'no'},
+    {'location': 'Leeds', 'property_type': 'Flat', 'bedrooms': '2', 'has_parking': 'yes'},
+    {'location': 'Cornwall', 'property_type': 'House', 'bedrooms': 'x', 'has_parking': ''},
+]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_prices_like_the_single_property_path(tmp_path, workers):
+    input_path = tmp_path / 'properties.csv'
+    with open(input_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(ROWS[0]))
+        writer.writeheader()
+        writer.writerows(ROWS)
+
+    output_path = tmp_path / 'priced.csv'
+    assert reprice(str(input_path), str(output_path), workers=workers, chunk_size=2) == len(ROWS)
+    with open(output_path, newline='') as f:
+        priced = list(csv.DictReader(f))
+
+    assert [row['location'] for row in priced] == [row['location'] for row in ROWS]
+    for row in priced[:-1]:
+        stats = calculate_price_stats(*get_competitor_data(row['location'], row['property_type'],
+                                                           int(row['bedrooms'])))
+        expected = generate_base_recommendation(stats)
+        assert row['price'] == ('' if expected['price'] is None else str(expected['price']))
+        assert row['confidence'] == expected['confidence']
+        assert row['reasoning'] == expected['reasoning']
+    assert priced[-1]['reasoning'].startswith('Invalid input')
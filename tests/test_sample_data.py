@@ -0,0 +1,39 @@
+"""
+Generated columnar stores match what the CSV path would give
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import create_sample_data
+from create_sample_data import chunk_to_frame, generate_chunks, sample_config, write_columnar
+from src.data_handler import ColumnarStore, write_columnar_store
+
+
+@pytest.mark.parametrize('config', [
+    sample_config(),
+    sample_config(rows=10_007, seasonality=0.3, outlier_rate=0.01),
+    sample_config(rows=9_001, dated=True, bedrooms=(1, 5)),
+    # Fewer rows than segments, and locations out of alphabetical order
+    sample_config(rows=10, locations={'Zed': 90, 'Alpha': 100, 'Mid': 120}),
+])
+def test_written_in_place_like_a_sorted_frame(config, tmp_path, monkeypatch):
+    # Small chunks, so segments span chunk boundaries
+    monkeypatch.setattr(create_sample_data, 'CHUNK_ROWS', 1000)
+
+    frame = pd.concat([chunk_to_frame(columns, config) for columns in generate_chunks(config)], ignore_index=True)
+    expected = write_columnar_store(frame, str(tmp_path / 'expected'))
+    rows = write_columnar(config, str(tmp_path / 'store'))
+    store = ColumnarStore(str(tmp_path / 'store'))
+
+    assert rows == len(frame)
+    assert {key: value for key, value in store.meta.items() if key != 'source_hash'} == \
+        {key: value for key, value in expected.meta.items() if key != 'source_hash'}
+    for name in sorted(os.listdir(expected.path)):
+        if name.endswith('.npy'):
+            actual, wanted = np.load(os.path.join(store.path, name)), np.load(os.path.join(expected.path, name))
+            assert actual.dtype == wanted.dtype
+            assert np.array_equal(actual, wanted), name
+
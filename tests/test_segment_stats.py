@@ -0,0 +1,120 @@
+"""
+The segment stats cube
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import segment_stats
+from src.data_handler import DATA_PATH, build_columnar_store, file_hash
+from src.segment_stats import PERCENTILES, SegmentStatsCube, parallel_segment_stats, stream_segment_stats
+
+LEVELS = {'exact': ['location', 'property_type', 'bedrooms'], 'similar': ['location', 'bedrooms']}
+
+
+@pytest.fixture(scope='module')
+def competitors():
+    return pd.read_csv(DATA_PATH)
+
+
+@pytest.fixture(scope='module')
+def cube(competitors):
+    cube = SegmentStatsCube()
+    cube.build(competitors)
+    return cube
+
+
+def test_percentiles_stay_inside_each_segment(cube, competitors):
+    for (location, property_type, bedrooms), rows in competitors.groupby(LEVELS['exact']):
+        stats = cube.stats(location, property_type, bedrooms)
+        for level in LEVELS:
+            for name in PERCENTILES:
+                assert stats[f'{level}_min'] <= stats[f'{level}_{name}'] <= stats[f'{level}_max']
+
+
+def test_percentiles_within_the_stated_error(cube, competitors):
+    for (location, property_type, bedrooms), rows in competitors.groupby(LEVELS['exact']):
+        stats = cube.stats(location, property_type, bedrooms)
+        for name, q in PERCENTILES.items():
+            true = rows['nightly_rate'].sort_values().iloc[int(q * (len(rows) - 1))]
+            assert stats[f'exact_{name}'] == pytest.approx(true, rel=stats['quantile_error'] * 2)
+
+
+def test_clamps_a_single_listing_segment():
+    cube = SegmentStatsCube()
+    cube.build(pd.DataFrame({'location': ['Leeds'], 'property_type': ['Flat'], 'bedrooms': [1],
+                             'nightly_rate': [176.0]}))
+    stats = cube.stats('Leeds', 'Flat', 1)
+    assert [stats[f'exact_{name}'] for name in PERCENTILES] == [176.0] * len(PERCENTILES)
+
+
+def assert_same_cube(cube, expected):
+    cube._rebuild_stale()
+    for level in LEVELS:
+        assert cube.cells[level].keys() == expected.cells[level].keys()
+        for key, (total, count, low, high) in expected.cells[level].items():
+            assert cube.cells[level][key] == [pytest.approx(total), count, low, high], key
+        assert cube.sketches[level].keys() == expected.sketches[level].keys()
+        for key, sketch in expected.sketches[level].items():
+            assert cube.sketches[level][key].buckets == sketch.buckets, key
+            assert cube.sketches[level][key].zero_count == sketch.zero_count, key
+
+
+def fresh_cube(competitors):
+    cube = SegmentStatsCube()
+    cube.build(competitors)
+    return cube
+
+
+def test_removals_and_price_changes_match_a_fresh_build(competitors):
+    current = competitors.copy()
+    cube = SegmentStatsCube(source=lambda: current)
+    cube.build(competitors)
+
+    # Every segment loses its cheapest listing, and one whole segment goes
+    segments = current.groupby(LEVELS['exact'])['nightly_rate']
+    removed = current.loc[segments.idxmin()]
+    last = current.groupby(LEVELS['exact']).ngroup() == 0
+    removed = pd.concat([removed, current[last]]).drop_duplicates()
+    current = current.drop(removed.index)
+    cube.remove(removed)
+    assert any(cube._stale.values())
+    assert_same_cube(cube, fresh_cube(current))
+
+    # The dearest listing in each segment gets cheaper, and some others dearer
+    changed = current.loc[current.groupby(LEVELS['exact'])['nightly_rate'].idxmax()]
+    changed = pd.concat([changed, current.iloc[::7]]).drop_duplicates()
+    before = changed.copy()
+    after = changed.assign(nightly_rate=changed['nightly_rate'] * np.where(np.arange(len(changed)) % 2, 1.3, 0.5))
+    current.loc[after.index, 'nightly_rate'] = after['nightly_rate']
+    cube.update_prices(before, after)
+    assert_same_cube(cube, fresh_cube(current))
+
+
+def test_streamed_stats_match_a_fresh_build(competitors, tmp_path):
+    path = str(tmp_path / 'competitors.csv')
+    competitors.to_csv(path, index=False)
+    progress = []
+
+    cube, metrics = stream_segment_stats(path, chunksize=20, progress=progress.append)
+
+    assert_same_cube(cube, fresh_cube(competitors))
+    assert metrics['rows'] == len(competitors)
+    assert metrics['chunks'] == len(progress) == -(-len(competitors) // 20)
+    assert cube.version == file_hash(path)
+
+    records = competitors[LEVELS['exact'] + ['nightly_rate']].to_dict('records')
+    assert_same_cube(stream_segment_stats(iter(records), chunksize=33)[0], fresh_cube(competitors))
+
+
+def test_parallel_stats_reuse_a_spawned_pool(competitors, tmp_path):
+    store_path = str(tmp_path / 'store')
+    build_columnar_store(DATA_PATH, store_path)
+
+    cube = parallel_segment_stats(store_path, workers=2, shards=5)
+    pool = segment_stats._pools[2]
+    assert_same_cube(cube, fresh_cube(competitors))
+    assert pool._mp_context.get_start_method() == 'spawn'
+
+    parallel_segment_stats(store_path, workers=2)
+    assert segment_stats._pools[2] is pool